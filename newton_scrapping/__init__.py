@@ -1,2 +1,13 @@
+"""Crawlers are imported on first use, so that importing the package does not load Scrapy and Twisted"""
+
+import importlib
+
 # TODO: Update the path below
-from crwsueddeutsche.main import Crawler  # noqa: F401
+_MAIN_MODULE = "crwsueddeutsche.main"
+__all__ = ["AsyncCrawler", "Crawler", "CrawlerError", "CrawlerPool", "CrawlScheduler"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return getattr(importlib.import_module(_MAIN_MODULE), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,106 @@
+"""Concurrency budget shared by the crawls of one reactor"""
+
+import heapq
+import itertools
+
+from twisted.internet import defer
+
+_budgets = {}
+
+
+class DomainBudget:
+    """
+    A global number of download slots, split fairly between domains.
+    ...
+
+    A request waits in `acquire()` until:
+    - fewer than `concurrency` requests are downloading in total
+    - fewer than `per_domain` requests of its domain are downloading
+    - `delay` seconds have passed since the last request of its domain started
+
+    When a slot frees up, it goes to the ready domain with the fewest
+    requests downloading, so a domain with a long backlog cannot starve the
+    others, and spare slots still go to the busy domains. Inside a domain,
+    requests with the highest priority start first.
+    """
+
+    def __init__(self, concurrency: int, per_domain: int, delay: float, clock=None):
+        """
+        Args:
+            concurrency (int): maximum number of requests downloading in total
+            per_domain (int): maximum number of requests downloading per domain
+            delay (float): minimum seconds between two request starts of a domain
+            clock (IReactorTime, optional): for tests. Defaults to the reactor.
+        """
+        if clock is None:
+            from twisted.internet import reactor as clock
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.delay = delay
+        self.clock = clock
+        self.total = 0
+        self.active = {}
+        self.waiting = {}
+        self.last_start = {}
+        self.served = itertools.count()
+        self.last_served = {}
+        self.sequence = itertools.count()
+        self.timer = None
+
+    @classmethod
+    def shared(cls, concurrency: int, per_domain: int, delay: float) -> "DomainBudget":
+        """Return the budget shared by every crawl of this process with the same limits"""
+        key = (concurrency, per_domain, delay)
+        if key not in _budgets:
+            _budgets[key] = cls(concurrency, per_domain, delay)
+        return _budgets[key]
+
+    def acquire(self, domain: str, priority: int = 0) -> defer.Deferred:
+        """Return a Deferred fired when a request of `domain` may start, release() it when done"""
+        d = defer.Deferred()
+        heapq.heappush(self.waiting.setdefault(domain, []), (-priority, next(self.sequence), d))
+        self.dispatch()
+        return d
+
+    def release(self, domain: str):
+        self.total -= 1
+        self.active[domain] -= 1
+        if not self.active[domain]:
+            del self.active[domain]
+        self.dispatch()
+
+    def dispatch(self):
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        started = []
+        while self.total < self.concurrency:
+            now = self.clock.seconds()
+            ready = [
+                domain for domain in self.waiting
+                if self.active.get(domain, 0) < self.per_domain
+                and now >= self.last_start.get(domain, float("-inf")) + self.delay
+            ]
+            if not ready:
+                break
+            domain = min(ready, key=lambda d: (self.active.get(d, 0), self.last_served.get(d, -1)))
+            waiters = self.waiting[domain]
+            _, _, d = heapq.heappop(waiters)
+            if not waiters:
+                del self.waiting[domain]
+            self.total += 1
+            self.active[domain] = self.active.get(domain, 0) + 1
+            self.last_start[domain] = now
+            self.last_served[domain] = next(self.served)
+            started.append(d)
+
+        delayed = [
+            self.last_start[domain] + self.delay for domain in self.waiting
+            if domain in self.last_start and self.active.get(domain, 0) < self.per_domain
+        ]
+        if delayed and self.total < self.concurrency:
+            wait = max(0.0, min(delayed) - self.clock.seconds())
+            self.timer = self.clock.callLater(wait, self.dispatch)
+        # fired last, their callbacks may acquire or release again
+        for d in started:
+            d.callback(None)
@@ -0,0 +1,127 @@
+"""Resumable crawl jobs"""
+
+import json
+import os
+import shutil
+
+# files and directories of scrapy's own JOBDIR state
+SCRAPY_JOB_FILES = ("requests.seen", "requests.queue", "spider.state")
+
+RUNNING = "running"
+CLOSED = "closed"
+FINISHED = "finished"
+
+
+class JobCheckpoint:
+    """
+    The checkpoint of one crawl job, kept in its scrapy JOBDIR.
+    ...
+
+    Next to scrapy's pending request queue, seen request fingerprints and
+    spider state, the directory holds:
+    - items.jsonl: every record handed over by the crawl, appended as it is scraped
+    - job.json: the query and the status of the last run, "running" until the
+      spider is closed, then "closed" (stopped early, e.g. on timeout) or "finished"
+
+    A job still "running" when it is opened again was killed: the records
+    written so far are kept, but scrapy's state may list requests whose
+    output was never written, so the job restarts from its start requests.
+    A job opened with another query than the one of its last run starts over,
+    without the records and scrapy's state of that query.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): job directory, created when the job is opened
+        """
+        self.path = path
+        self.items_path = os.path.join(path, "items.jsonl")
+        self.job_path = os.path.join(path, "job.json")
+        self.records = []
+        self.file = None
+
+    def _job(self) -> dict:
+        if not os.path.exists(self.job_path):
+            return {}
+        with open(self.job_path) as f:
+            return json.load(f)
+
+    @property
+    def status(self) -> str:
+        """Status of the last run, None for a new job"""
+        return self._job().get("status")
+
+    def has_query(self, query: dict) -> bool:
+        """Whether the last run of the job crawled `query`"""
+        # compared as stored in job.json
+        return self._job().get("query") == json.loads(json.dumps(query, default=str))
+
+    def set_status(self, status: str, query: dict = None):
+        with open(self.job_path + ".tmp", "w") as f:
+            json.dump({"query": query, "status": status}, f, default=str)
+        os.replace(self.job_path + ".tmp", self.job_path)
+
+    def load(self) -> list:
+        """Return the records written by the previous runs"""
+        records = []
+        if os.path.exists(self.items_path):
+            with open(self.items_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # last line cut short by a killed run
+                        break
+        return records
+
+    def open(self, query: dict):
+        """Load the records of the previous runs and start a new run of the job"""
+        os.makedirs(self.path, exist_ok=True)
+        job = self._job()
+        restart = bool(job) and not self.has_query(query)
+        if restart or job.get("status") == RUNNING:
+            for name in SCRAPY_JOB_FILES:
+                path = os.path.join(self.path, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+        self.records = [] if restart else self.load()
+        # rewritten so that a partial last line is dropped
+        with open(self.items_path, "w", encoding="utf-8") as f:
+            f.write("".join(self._line(record) for record in self.records))
+        self.file = open(self.items_path, "a", encoding="utf-8")
+        self.set_status(RUNNING, query)
+
+    def clear(self):
+        """Forget the records of the previous runs"""
+        self.records = []
+        self.file.truncate(0)
+
+    def add(self, record: dict):
+        self.file.write(self._line(record))
+        self.file.flush()
+
+    def close(self, reason: str, query: dict = None):
+        self.file.close()
+        self.set_status(FINISHED if reason == "finished" else CLOSED, query)
+
+    def results(self, query: dict) -> list:
+        """Return the records written so far in the shape of the query's crawl() output
+
+        For "articles" queries, the last result of every link in the order of the
+        links, and an error result for the links without one.
+        """
+        records = self.load()
+        if query.get("type") != "articles":
+            return records
+        results = {record["link"]: record for record in records}
+        return [
+            results.get(link) or {"link": link, "data": [], "error": "Link was not crawled, crawl did not finish"}
+            for link in query.get("links", [])
+        ]
+
+    @staticmethod
+    def _line(record: dict) -> str:
+        return json.dumps(record, ensure_ascii=False, default=str) + "\n"
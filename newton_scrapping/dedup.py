@@ -0,0 +1,273 @@
+"""Duplicate articles: URL normalisation, SimHash fingerprints and their on-disk index"""
+
+import hashlib
+import os
+import re
+import sqlite3
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from scrapy.dupefilters import RFPDupeFilter
+from w3lib.url import canonicalize_url
+
+from newton_scrapping.sitemap import url_fingerprint
+from newton_scrapping.utils import ARTICLE_TYPES
+
+# query parameters that never change the page, besides the utm_* ones
+STRIP_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid", "yclid",
+    "_ga", "ref", "ref_src", "cmpid", "icid", "ito", "wt_mc", "wt.mc_id", "amp", "outputtype",
+})
+HOST_PREFIXES = ("www.", "amp.", "m.")
+
+SIMHASH_BITS = 64
+SIMHASH_BANDS = 4
+SIMHASH_SHINGLE = 3
+# shorter texts (teasers, paywalls) are too alike to be told apart by their fingerprint
+SIMHASH_MIN_WORDS = 50
+
+_WORD = re.compile(r"\w+")
+_LINK_TAG = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+_CANONICAL = re.compile(r"""\brel\s*=\s*["']?canonical\b""", re.IGNORECASE)
+_HREF = re.compile(r"""\bhref\s*=\s*["']?([^"'\s>]+)""", re.IGNORECASE)
+
+
+def normalize_url(url: str, strip_params=STRIP_PARAMS) -> str:
+    """Return the URL under which the variants of an article page are considered equal
+
+    The scheme becomes https, the "www.", "amp." and "m." host prefixes, the
+    AMP path parts, the fragment, trailing slash and the tracking query
+    parameters (utm_* and `strip_params`) are removed, the other parameters
+    are sorted.
+
+    Args:
+        url (str): article link
+        strip_params (iterable, optional): lowercased query parameter names to remove
+
+    Returns:
+        str: normalized URL, only meant to be compared or fingerprinted
+    """
+    parts = urlsplit(canonicalize_url(url))
+    host = (parts.hostname or "").lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+
+    path = re.sub(r"\.amp(?=\.html?$|$)", "", parts.path)
+    path = "/".join(segment for segment in path.split("/") if segment != "amp").rstrip("/")
+    query = urlencode([
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not name.lower().startswith("utm_") and name.lower() not in strip_params
+    ])
+    return urlunsplit(("https", host, path or "/", query, ""))
+
+
+def simhash(text: str) -> int:
+    """Return the 64 bit SimHash of the word shingles of a text
+
+    Texts that differ by a few words (e.g. a changed teaser or byline) get
+    fingerprints that differ by a few bits, see hamming_distance.
+
+    Returns:
+        int: unsigned fingerprint, None if the text has fewer than SIMHASH_MIN_WORDS words
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < SIMHASH_MIN_WORDS:
+        return None
+    shingles = {
+        " ".join(words[index:index + SIMHASH_SHINGLE])
+        for index in range(len(words) - SIMHASH_SHINGLE + 1)
+    }
+    # one "0"/"1" string per shingle hash, counted column by column
+    bits = [
+        format(int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+        for shingle in shingles
+    ]
+    half = len(bits) / 2
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*bits)), 2)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _signed(value: int) -> int:
+    # SQLite integers are signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else [value]
+
+
+def item_url(item) -> str:
+    """Return the URL an article item declares for itself
+
+    From the first article object of parsed_json "main" ("url", else
+    "mainEntityOfPage"), else from the canonical <link> of the raw_response HTML.
+
+    Args:
+        item (dict | ItemAdapter): article with "parsed_json" and/or "raw_response"
+
+    Returns:
+        str: absolute URL, None if the item has none
+    """
+    main = (item.get("parsed_json") or {}).get("main")
+    for value in _as_list(main):
+        if not isinstance(value, dict) or not ARTICLE_TYPES & set(_as_list(value.get("@type"))):
+            continue
+        entity = value.get("mainEntityOfPage")
+        for url in (value.get("url"), entity.get("@id") if isinstance(entity, dict) else entity):
+            if isinstance(url, str) and url.startswith("http"):
+                return url
+    content = (item.get("raw_response") or {}).get("content")
+    if isinstance(content, str):
+        for tag in _LINK_TAG.findall(content):
+            if _CANONICAL.search(tag):
+                href = _HREF.search(tag)
+                if href and href.group(1).startswith("http"):
+                    return href.group(1)
+    return None
+
+
+class DedupIndex:
+    """
+    Bounded on-disk index of the articles already emitted, shared by all runs.
+    ...
+
+    Stored in one SQLite file with:
+    - the SimHash of every article text, split into SIMHASH_BANDS bands
+    - the fingerprints of the normalized URLs of every article and of its duplicates
+
+    Two fingerprints within SIMHASH_BANDS - 1 bits have at least one equal
+    band, so near duplicates are looked up by band instead of comparing every
+    stored fingerprint. Once more than `max_entries` articles are stored, the
+    oldest ones and their URLs are removed.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000000):
+        """
+        Args:
+            path (str): SQLite file, created with its parent directory if missing
+            max_entries (int, optional): number of articles kept. Defaults to 1000000.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.band_bits = SIMHASH_BITS // SIMHASH_BANDS
+        # the pipeline and the request filter of a crawl share the file
+        self.connection = sqlite3.connect(path, timeout=30)
+        bands = range(SIMHASH_BANDS)
+        self.connection.executescript(
+            f"""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY, simhash INTEGER,
+                {", ".join(f"band{band} INTEGER" for band in bands)}
+            );
+            CREATE TABLE IF NOT EXISTS urls (
+                fingerprint INTEGER PRIMARY KEY, document INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS urls_document ON urls (document);
+            {"".join(f"CREATE INDEX IF NOT EXISTS documents_band{band} ON documents (band{band});" for band in bands)}
+            """
+        )
+
+    def bands(self, fingerprint: int) -> list:
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (band * self.band_bits)) & mask for band in range(SIMHASH_BANDS)]
+
+    def find_url(self, url: str) -> int:
+        """Return the id of the indexed article of a normalized URL, else None"""
+        row = self.connection.execute(
+            "SELECT document FROM urls WHERE fingerprint = ?", (url_fingerprint(url),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def has_url(self, url: str) -> bool:
+        return self.find_url(url) is not None
+
+    def find_similar(self, fingerprint: int, distance: int = SIMHASH_BANDS - 1) -> int:
+        """Return the id of an indexed article whose SimHash is within `distance` bits, else None"""
+        conditions = " OR ".join(f"band{band} = ?" for band in range(SIMHASH_BANDS))
+        rows = self.connection.execute(
+            f"SELECT id, simhash FROM documents WHERE {conditions}", self.bands(fingerprint)
+        )
+        for document, stored in rows:
+            if hamming_distance(fingerprint, stored % (1 << 64)) <= distance:
+                return document
+        return None
+
+    def add(self, urls: list, fingerprint: int = None) -> int:
+        """Index an article by its normalized URLs and its SimHash, return its id"""
+        bands = self.bands(fingerprint) if fingerprint is not None else [None] * SIMHASH_BANDS
+        with self.connection:
+            document = self.connection.execute(
+                f"INSERT INTO documents VALUES (NULL, ?{', ?' * SIMHASH_BANDS})",
+                [_signed(fingerprint) if fingerprint is not None else None, *bands],
+            ).lastrowid
+            self._add_urls(document, urls)
+            if document > self.max_entries:
+                oldest = document - self.max_entries
+                self.connection.execute("DELETE FROM urls WHERE document <= ?", (oldest,))
+                self.connection.execute("DELETE FROM documents WHERE id <= ?", (oldest,))
+        return document
+
+    def add_urls(self, document: int, urls: list):
+        """Record `urls` as duplicates of an indexed article"""
+        with self.connection:
+            self._add_urls(document, urls)
+
+    def _add_urls(self, document, urls):
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO urls (fingerprint, document) VALUES (?, ?)",
+            [(url_fingerprint(url), document) for url in urls],
+        )
+
+    def close(self):
+        self.connection.close()
+
+
+class CanonicalDupeFilter(RFPDupeFilter):
+    """Scrapy's request filter, comparing normalized URLs and skipping the indexed articles
+
+    Requests are filtered by the fingerprint of their normalize_url(), so
+    the AMP and tracking parameter variants of a page are only downloaded
+    once per crawl (and once per job with JOBDIR). With DEDUP_INDEX_PATH, the
+    requests of articles emitted by a previous run are filtered as well.
+    Requests with dont_filter=True, e.g. the start URLs, are never filtered.
+    """
+
+    index = None
+    stats = None
+    strip_params = STRIP_PARAMS
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        dupefilter = super().from_crawler(crawler)
+        settings = crawler.settings
+        dupefilter.stats = crawler.stats
+        dupefilter.strip_params = STRIP_PARAMS | {
+            name.lower() for name in settings.getlist("DEDUP_STRIP_PARAMS")
+        }
+        if settings.get("DEDUP_INDEX_PATH"):
+            dupefilter.index = DedupIndex(
+                settings.get("DEDUP_INDEX_PATH"), settings.getint("DEDUP_INDEX_MAX_ENTRIES", 1000000)
+            )
+        return dupefilter
+
+    def request_seen(self, request) -> bool:
+        url = normalize_url(request.url, self.strip_params)
+        if self.index is not None and self.index.has_url(url):
+            if self.stats:
+                self.stats.inc_value("dedup/indexed_requests")
+            return True
+        return super().request_seen(request.replace(url=url))
+
+    def close(self, reason):
+        if self.index is not None:
+            self.index.close()
+        return super().close(reason)
@@ -0,0 +1,155 @@
+"""Parsing of article pages in worker processes"""
+
+import multiprocessing
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from scrapy import signals
+from scrapy.http import HtmlResponse
+from twisted.internet import defer
+
+from newton_scrapping.items import NewtonScrappingItem
+from newton_scrapping.metrics import metrics_for
+from newton_scrapping.utils import get_parsed_data, get_parsed_json
+
+_executors = weakref.WeakKeyDictionary()
+
+
+def build_article(response, mappers: dict = None, finish=None) -> NewtonScrappingItem:
+    """Build the record of an article page: raw_response, parsed_json and parsed_data
+
+    Args:
+        response (TextResponse): article page
+        mappers (dict, optional): {field: mapper} passed to utils.get_parsed_data. Defaults to None.
+        finish (callable, optional): called with the response and the record to complete it\n
+            (text, country, language, ...), returns the final record or None to keep it. Defaults to None.
+
+    Returns:
+        NewtonScrappingItem: the article record
+    """
+    record = NewtonScrappingItem(
+        raw_response={"content_type": "text/html", "content": response.text},
+        parsed_json=get_parsed_json(response),
+        parsed_data=get_parsed_data(response, mappers),
+    )
+    if finish is not None:
+        record = finish(response, record) or record
+    return record
+
+
+def _parse_page(url: str, body: bytes, content_type: bytes, mappers: dict, finish) -> tuple:
+    # runs in a worker process, the page is parsed from its bytes again there
+    started = time.process_time()
+    headers = {"Content-Type": content_type} if content_type else {}
+    record = build_article(HtmlResponse(url, body=body, headers=headers), mappers, finish)
+    return record, time.process_time() - started
+
+
+class ParseExecutor:
+    """
+    Builds article records in a pool of worker processes, off the reactor thread.
+    ...
+
+    The downloaded body bytes are sent to a worker, which parses the page and
+    returns the finished record, so a slow parse no longer holds up the other
+    downloads and parsing uses every core. The mappers and the `finish`
+    callable are sent to the workers too and must be module level functions.
+
+    While its record is being built, a response stays in scrapy's scraper
+    slot, so SCRAPER_SLOT_MAX_ACTIVE_SIZE still bounds the pages held in
+    memory. With workers=0 the records are built inline on the reactor
+    thread, so spiders run the same code whether the executor is enabled or not.
+    """
+
+    def __init__(self, workers: int = None, stats=None, metrics=None, spider_name: str = None):
+        """
+        Args:
+            workers (int, optional): worker processes, 0 to parse inline. Defaults to the number of CPUs.
+            stats (StatsCollector, optional): receives the parse_executor/* stats. Defaults to None.
+            metrics (MetricsRegistry, optional): receives the worker_parse_seconds histogram. Defaults to None.
+            spider_name (str, optional): label of the histogram. Defaults to None.
+        """
+        self.workers = workers
+        self.stats = stats
+        self.metrics = metrics
+        self.spider_name = spider_name or "spider"
+        self.pool = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        executor = cls(
+            crawler.settings.getint("PARSE_EXECUTOR_WORKERS", 0),
+            crawler.stats,
+            metrics_for(crawler),
+            crawler.spidercls.name,
+        )
+        crawler.signals.connect(executor.shutdown, signal=signals.engine_stopped)
+        return executor
+
+    def submit(self, response, mappers: dict = None, finish=None):
+        """Send a response to a worker
+
+        Returns:
+            concurrent.futures.Future: of (record, CPU seconds of the worker)
+        """
+        if self.pool is None:
+            # spawned: forking a process that runs the reactor and its threads is not safe
+            self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool.submit(
+            _parse_page, response.url, response.body, response.headers.get("Content-Type"), mappers, finish
+        )
+
+    def parse(self, response, mappers: dict = None, finish=None) -> defer.Deferred:
+        """Build the record of an article page, see build_article
+
+        Spider callbacks wait for it with
+        `record = await maybe_deferred_to_future(executor.parse(response))`.
+
+        Returns:
+            Deferred: fired with the record on the reactor thread
+        """
+        if self.workers == 0:
+            return defer.maybeDeferred(build_article, response, mappers, finish)
+
+        from twisted.internet import reactor
+
+        deferred = defer.Deferred()
+        future = self.submit(response, mappers, finish)
+        future.add_done_callback(lambda future: reactor.callFromThread(self._done, deferred, future))
+        return deferred
+
+    def _done(self, deferred, future):
+        try:
+            record, seconds = future.result()
+        except BrokenProcessPool as exception:
+            # a worker died (e.g. out of memory), the next pages get a new pool
+            self.pool = None
+            self._inc_stat("parse_executor/errors")
+            deferred.errback(exception)
+            return
+        except Exception as exception:
+            self._inc_stat("parse_executor/errors")
+            deferred.errback(exception)
+            return
+        self._inc_stat("parse_executor/pages")
+        if self.metrics is not None:
+            self.metrics.observe("worker_parse_seconds", self.spider_name, seconds)
+        deferred.callback(record)
+
+    def _inc_stat(self, name):
+        if self.stats is not None:
+            self.stats.inc_value(name)
+
+    def shutdown(self, wait: bool = True):
+        if self.pool is not None:
+            self.pool.shutdown(wait=wait, cancel_futures=True)
+            self.pool = None
+
+
+def parse_executor_for(crawler) -> ParseExecutor:
+    """Return the ParseExecutor of a scrapy crawler, created on first use from PARSE_EXECUTOR_WORKERS"""
+    if crawler not in _executors:
+        _executors[crawler] = ParseExecutor.from_crawler(crawler)
+    return _executors[crawler]
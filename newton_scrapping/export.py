@@ -0,0 +1,263 @@
+"""Columnar Parquet / Arrow IPC export of scraped articles"""
+
+import json
+import os
+
+from newton_scrapping.dedup import item_url
+from newton_scrapping.sitemap import parse_date
+from newton_scrapping.utils import load_raw_content
+
+EXPORT_FORMATS = ("parquet", "arrow")
+RAW_HTML_MODES = ("column", "file", "omit")
+# a row group holds the raw HTML of its rows, 1000 pages of ~150 KB is ~150 MB
+DEFAULT_ROW_GROUP_SIZE = 1000
+
+# column: (kind, parsed_data fields in order of preference)
+#   text:- first value, "texts":- values joined by newlines, "list":- every value,
+#   "category":- first value, dictionary encoded, "path":- values joined by " > ", dictionary encoded
+#   (pyarrow cannot read lists of dictionary values back from several row groups),
+#   "timestamp":- first value parsed as a UTC timestamp
+COLUMNS = {
+    "title": ("text", ("title",)),
+    "description": ("text", ("description",)),
+    "text": ("texts", ("text",)),
+    "author": ("list", ("author",)),
+    "publisher": ("category", ("publisher",)),
+    "section": ("path", ("section",)),
+    "tags": ("list", ("tags",)),
+    "source_country": ("category", ("source_country", "country")),
+    "source_language": ("category", ("source_language", "language")),
+    "published_at": ("timestamp", ("published_at",)),
+    "modified_at": ("timestamp", ("modified_at",)),
+    "thumbnail_image": ("text", ("thumbnail_image",)),
+    "images": ("list", ("images",)),
+    "embed_video_link": ("list", ("embed_video_link",)),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise Exception("Parquet/Arrow export needs the pyarrow package") from None
+    return pyarrow
+
+
+def article_schema(raw_html: bool = True):
+    """Return the pyarrow schema of the exported articles
+
+    Args:
+        raw_html (bool, optional): with the "raw_html" column. Defaults to True.
+    """
+    pa = _pyarrow()
+    category = pa.dictionary(pa.int32(), pa.string())
+    types = {
+        "text": pa.string(),
+        "texts": pa.string(),
+        "list": pa.list_(pa.string()),
+        "category": category,
+        "path": category,
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    fields = [pa.field("url", pa.string())]
+    fields += [pa.field(name, types[kind]) for name, (kind, _) in COLUMNS.items()]
+    if raw_html:
+        fields.append(pa.field("raw_html", pa.string()))
+    return pa.schema(fields)
+
+
+def raw_html_schema():
+    """Return the pyarrow schema of the separate raw HTML file"""
+    pa = _pyarrow()
+    return pa.schema([pa.field("url", pa.string()), pa.field("raw_html", pa.string())])
+
+
+def _string(value):
+    # entities (author, publisher, images) are reduced to their name or link
+    if isinstance(value, dict):
+        for key in ("name", "link", "url", "@id"):
+            if isinstance(value.get(key), str):
+                return value[key]
+        return json.dumps(value, ensure_ascii=False, default=str)
+    if value is None:
+        return None
+    return str(value).strip()
+
+
+def parse_timestamp(value):
+    """Return a UTC datetime from an ISO 8601 or RFC 2822 date, None when it is neither
+
+    Dates without a timezone are taken as UTC.
+    """
+    return parse_date(_string(value))
+
+
+def article_row(record: dict, blob_dir: str = "raw_blobs", raw_html: bool = True) -> dict:
+    """Flatten an article record (or a sitemap entry) into one row of article_schema
+
+    Args:
+        record (dict): article record, its raw_response possibly compacted by utils.compact_raw_response
+        blob_dir (str, optional): directory of the raw_response="blob" files. Defaults to "raw_blobs".
+        raw_html (bool, optional): load the page HTML into "raw_html". Defaults to True.
+    """
+    parsed_data = record.get("parsed_data") or {}
+    row = {"url": record.get("link") or item_url(record)}
+    for name, (kind, fields) in COLUMNS.items():
+        values = next((parsed_data[field] for field in fields if parsed_data.get(field)), [])
+        values = [value for value in map(_string, values if isinstance(values, list) else [values]) if value]
+        if kind in ("text", "category"):
+            row[name] = values[0] if values else None
+        elif kind == "texts":
+            row[name] = "\n".join(values) if values else None
+        elif kind == "path":
+            row[name] = " > ".join(values) if values else None
+        elif kind == "timestamp":
+            row[name] = parse_timestamp(values[0]) if values else None
+        else:
+            row[name] = values
+    if not parsed_data:
+        # sitemap entry: {"link", "title", "lastmod"}
+        row["title"] = _string(record.get("title")) or None
+        row["modified_at"] = parse_timestamp(record.get("lastmod"))
+    raw_response = record.get("raw_response")
+    if raw_html and isinstance(raw_response, dict):
+        row["raw_html"] = load_raw_content(raw_response, blob_dir)
+    return row
+
+
+class ArticleTableWriter:
+    """
+    Writes article records to a Parquet or Arrow IPC file in row groups.
+    ...
+
+    Records are flattened with article_row, buffered and written as
+    one row group (Parquet) or record batch (Arrow IPC) every `row_group_size`
+    records, so the file grows while the crawl runs and memory stays bounded.
+    The schema is fixed, see article_schema. The page HTML goes to the
+    "raw_html" column, to a separate `<name>.raw.<ext>` file of url and
+    raw_html columns, or is left out.
+    """
+
+    def __init__(
+        self, path: str, format: str = None, row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        raw_html: str = "column", blob_dir: str = "raw_blobs",
+    ):
+        """
+        Args:
+            path (str): output file, overwritten
+            format (str, optional): "parquet" or "arrow". Defaults to the extension of `path`,\n
+                ".arrow", ".feather" and ".ipc" being Arrow IPC files.
+            row_group_size (int, optional): records per row group. Defaults to DEFAULT_ROW_GROUP_SIZE.
+            raw_html (str, optional): "column", "file" or "omit". Defaults to "column".
+            blob_dir (str, optional): directory of the raw_response="blob" files. Defaults to "raw_blobs".
+
+        Raises:
+            Exception: Raised exception for unknown format or raw_html mode
+        """
+        if format is None:
+            format = "arrow" if os.path.splitext(path)[1] in (".arrow", ".feather", ".ipc") else "parquet"
+        if format not in EXPORT_FORMATS:
+            raise Exception(f"Invalid Export format: {format}")
+        if raw_html not in RAW_HTML_MODES:
+            raise Exception(f"Invalid raw_html mode: {raw_html}")
+        self.pa = _pyarrow()
+        self.path = path
+        self.format = format
+        self.row_group_size = row_group_size
+        self.raw_html = raw_html
+        self.blob_dir = blob_dir
+        self.schema = article_schema(raw_html == "column")
+        self.rows = []
+        self.count = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.writer = self._open(path, self.schema)
+        self.raw_writer = None
+        if raw_html == "file":
+            stem, extension = os.path.splitext(path)
+            self.raw_path = f"{stem}.raw{extension}"
+            self.raw_writer = self._open(self.raw_path, raw_html_schema())
+
+    def _open(self, path, schema):
+        if self.format == "parquet":
+            return self.pa.parquet.ParquetWriter(path, schema, compression="zstd")
+        return self.pa.ipc.new_file(path, schema)
+
+    def write(self, records: list):
+        for record in records:
+            self.rows.append(article_row(record, self.blob_dir, self.raw_html != "omit"))
+            if len(self.rows) >= self.row_group_size:
+                self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        rows, self.rows = self.rows, []
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        self._write(self.writer, table)
+        if self.raw_writer is not None:
+            raw = self.pa.Table.from_pylist(rows, schema=raw_html_schema())
+            self._write(self.raw_writer, raw)
+        self.count += len(rows)
+
+    def _write(self, writer, table):
+        if self.format == "parquet":
+            writer.write_table(table, row_group_size=len(table))
+        else:
+            for batch in table.to_batches(max_chunksize=len(table)):
+                writer.write_batch(batch)
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        if self.raw_writer is not None:
+            self.raw_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParquetSink(ArticleTableWriter):
+    """ITEM_SINK "parquet:<path>", see ArticleTableWriter"""
+
+    def __init__(self, path, **options):
+        super().__init__(path, "parquet", **options)
+
+
+class ArrowSink(ArticleTableWriter):
+    """ITEM_SINK "arrow:<path>", an Arrow IPC file, see ArticleTableWriter"""
+
+    def __init__(self, path, **options):
+        super().__init__(path, "arrow", **options)
+
+
+def iter_records(results: list):
+    """Yield the article records of a crawl() result, the "data" of "articles" query results included"""
+    for result in results:
+        if isinstance(result.get("data"), list) and "link" in result and "parsed_data" not in result:
+            for record in result["data"]:
+                yield {"link": result["link"], **record}
+        else:
+            yield result
+
+
+def export_articles(results: list, path: str, **options) -> int:
+    """Write the output of Crawler.crawl() to a Parquet or Arrow IPC file
+
+    Args:
+        results (list): crawl() output of an "article", "articles" or "sitemap" query
+        path (str): output file, e.g. "output/articles.parquet" or "output/articles.arrow"
+        **options: format, row_group_size, raw_html and blob_dir of ArticleTableWriter
+
+    Returns:
+        int: number of rows written
+    """
+    with ArticleTableWriter(path, **options) as writer:
+        writer.write(iter_records(results))
+    return writer.count
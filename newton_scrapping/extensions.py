@@ -0,0 +1,79 @@
+# Define here your scrapy extensions
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import logging
+from statistics import median
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyFeedbackThrottle:
+    """Adjusts the concurrency of every download slot from its response latency
+
+    Works like AutoThrottle but on concurrency instead of delay. Every
+    LATENCY_THROTTLE_WINDOW responses of a slot, the median download latency
+    is compared with the lowest median seen so far for that slot:
+
+    - within LATENCY_THROTTLE_TOLERANCE of it, the server is keeping up and
+      the concurrency is raised by one, up to LATENCY_THROTTLE_MAX_CONCURRENCY
+    - more than twice the tolerance above it, or any 429/5xx response in the
+      window, the concurrency is halved, down to LATENCY_THROTTLE_MIN_CONCURRENCY
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("LATENCY_THROTTLE_ENABLED"):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.min_concurrency = settings.getint("LATENCY_THROTTLE_MIN_CONCURRENCY", 1)
+        self.max_concurrency = settings.getint("LATENCY_THROTTLE_MAX_CONCURRENCY", 32)
+        self.tolerance = settings.getfloat("LATENCY_THROTTLE_TOLERANCE", 0.25)
+        self.window = settings.getint("LATENCY_THROTTLE_WINDOW", 8)
+        self.debug = settings.getbool("LATENCY_THROTTLE_DEBUG")
+        self.windows = {}
+        crawler.signals.connect(self.response_downloaded, signal=signals.response_downloaded)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def response_downloaded(self, response, request, spider):
+        key = request.meta.get("download_slot")
+        slot = self.crawler.engine.downloader.slots.get(key)
+        latency = request.meta.get("download_latency")
+        if slot is None or latency is None:
+            return
+
+        window = self.windows.setdefault(key, {"latencies": [], "errors": 0, "baseline": None})
+        window["latencies"].append(latency)
+        if response.status == 429 or response.status >= 500:
+            window["errors"] += 1
+        if len(window["latencies"]) < self.window:
+            return
+
+        current = median(window["latencies"])
+        baseline = window["baseline"]
+        old_concurrency = slot.concurrency
+        if baseline is None:
+            baseline = current
+        if window["errors"] or current > baseline * (1 + 2 * self.tolerance):
+            slot.concurrency = max(self.min_concurrency, slot.concurrency // 2)
+        elif current <= baseline * (1 + self.tolerance):
+            slot.concurrency = min(self.max_concurrency, slot.concurrency + 1)
+        # Let the baseline follow a slower network instead of holding the
+        # concurrency down forever after one fast window.
+        window["baseline"] = min(current, baseline * 1.05)
+        window["latencies"] = []
+        window["errors"] = 0
+
+        if self.debug and slot.concurrency != old_concurrency:
+            logger.info(
+                "slot: %s | concurrency: %d -> %d | latency: %.3fs (baseline %.3fs)",
+                key, old_concurrency, slot.concurrency, current, baseline,
+            )
@@ -0,0 +1,722 @@
+"""Crawl frontier shared by the worker nodes of a distributed crawl
+
+The article links of a crawl are queued once in a shared store. Every node
+leases batches of them, crawls each batch as an "articles" query and acks or
+fails its links, see crawl_frontier:
+- links are deduplicated across nodes and runs by the fingerprint of their
+  normalize_url(), and FrontierDupeFilter shares scrapy's request filter
+  between the crawls of a seed, see seed_frontier
+- a lease is given to another node once `lease_seconds` have passed, so the
+  links of a crashed node are still crawled (links are crawled at least once)
+- a failed link is leased again after `retry_delay` seconds, at most
+  `max_attempts` times in total
+- at most `rate` links per second (or `rates[domain]`) are leased per domain,
+  counted in the shared store over windows of `rate_window` seconds, so the
+  limit holds however many nodes are running
+
+Backends:
+- SQLiteFrontier, "sqlite:<path>": one SQLite file on a volume shared by the
+  nodes, whose filesystem must support POSIX file locks
+- RedisFrontier, "redis://host:port/db": a server speaking the Redis protocol,
+  through the RespClient below, with its keys under `name`
+
+Lease deadlines and rate windows are in wall clock time, the clocks of the
+nodes are expected to be in sync.
+"""
+
+import math
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from urllib.parse import parse_qs, unquote, urlparse
+
+from scrapy.dupefilters import RFPDupeFilter
+
+from newton_scrapping.dedup import normalize_url
+from newton_scrapping.main import Crawler
+from newton_scrapping.profiles import get_profile
+from newton_scrapping.sitemap import url_fingerprint
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class FrontierError(Exception):
+    """Raised for an error reply of the frontier server"""
+
+
+class Lease:
+    """Links leased by one node until `deadline` (time.time())"""
+
+    def __init__(self, id: str, links: list, deadline: float):
+        self.id = id
+        self.links = links
+        self.deadline = deadline
+
+    def __len__(self):
+        return len(self.links)
+
+    def __repr__(self):
+        return f"<Lease {self.id} of {len(self.links)} links>"
+
+
+class Frontier:
+    """
+    Options and rate limits shared by the frontier backends.
+    ...
+
+    Methods
+    -------
+    add(links)
+        Queue the links not seen before, return their number
+    lease(size)
+        Lease up to `size` links, None when none is available now
+    ack(lease, links=None)
+        Mark the crawled links of a lease as done
+    fail(lease, errors)
+        Lease the failed links again later, or mark them as failed
+    mark_seen(namespace, fingerprints)
+        Record fingerprints, return for each whether it was already seen
+    seed()
+        Number of the current seed, 0 before the first one
+    new_seed()
+        Start a new seed and forget the requests seen during the previous one
+    counts()
+        Number of links queued, leased, done and failed
+    failures()
+        Error of every failed link
+    """
+
+    def __init__(
+        self, rate: float = 1.0, rates: dict = None, rate_window: float = 10.0,
+        lease_seconds: float = 600.0, max_attempts: int = 3, retry_delay: float = 60.0,
+    ):
+        """
+        Args:
+            rate (float, optional): links leased per second and domain, None for no limit. Defaults to 1.0.
+            rates (dict, optional): {domain: links per second} of the domains with another limit. Defaults to None.
+            rate_window (float, optional): seconds over which the leased links are counted. Defaults to 10.0.
+            lease_seconds (float, optional): seconds a node has to ack or fail its links. Defaults to 600.0.
+            max_attempts (int, optional): leases of a link before it is failed. Defaults to 3.
+            retry_delay (float, optional): seconds before a failed link is leased again. Defaults to 60.0.
+        """
+        self.rate = rate
+        self.rates = rates or {}
+        self.rate_window = rate_window
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    @staticmethod
+    def domain(link: str) -> str:
+        return urlparse(link).hostname or ""
+
+    @staticmethod
+    def fingerprint(link: str) -> int:
+        return url_fingerprint(normalize_url(link))
+
+    def period(self, now: float) -> int:
+        return int(now // self.rate_window)
+
+    def quota(self, domain: str) -> int:
+        """Links of `domain` leased at most per rate window, None for no limit"""
+        rate = self.rates.get(domain, self.rate)
+        if rate is None:
+            return None
+        return max(1, int(rate * self.rate_window))
+
+    @staticmethod
+    def allocate(domains, size: int, take):
+        """Split `size` links evenly between the domains, in random order
+
+        Args:
+            domains (iterable): domains with links ready to be leased
+            size (int): links to lease
+            take (callable): take(domain, count) leases up to count links of domain
+                and returns how many it got
+        """
+        domains = list(domains)
+        random.shuffle(domains)
+        remaining = size
+        for index, domain in enumerate(domains):
+            if remaining <= 0:
+                break
+            remaining -= take(domain, math.ceil(remaining / (len(domains) - index)))
+
+    def new_lease(self, now: float) -> Lease:
+        return Lease(uuid.uuid4().hex, [], now + self.lease_seconds)
+
+    @staticmethod
+    def requests_namespace(seed: int) -> str:
+        """mark_seen namespace of the requests filtered by FrontierDupeFilter during a seed"""
+        return f"requests:{seed}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SQLiteFrontier(Frontier):
+    """Frontier in one SQLite file, every operation is one write transaction"""
+
+    def __init__(self, path: str, **options):
+        """
+        Args:
+            path (str): SQLite file, created with its parent directory if missing
+            **options: rate, rates, rate_window, lease_seconds, max_attempts and retry_delay of Frontier
+        """
+        super().__init__(**options)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        # transactions are opened by _transaction(), BEGIN IMMEDIATE takes the write lock first
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS links (
+                link TEXT PRIMARY KEY, domain TEXT NOT NULL, state TEXT NOT NULL,
+                available_at REAL NOT NULL, lease_id TEXT, attempts INTEGER NOT NULL DEFAULT 0, error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS links_ready ON links (state, domain, available_at);
+            CREATE TABLE IF NOT EXISTS seen (
+                namespace TEXT NOT NULL, fingerprint INTEGER NOT NULL, PRIMARY KEY (namespace, fingerprint)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS rates (
+                domain TEXT NOT NULL, period INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (domain, period)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def add(self, links) -> int:
+        added = 0
+        now = time.time()
+        with self._transaction() as connection:
+            for link in links:
+                if connection.execute(
+                    "INSERT OR IGNORE INTO seen VALUES ('links', ?)", (self.fingerprint(link),)
+                ).rowcount:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO links (link, domain, state, available_at) VALUES (?, ?, ?, ?)",
+                        (link, self.domain(link), QUEUED, now),
+                    )
+                    added += 1
+        return added
+
+    def lease(self, size: int) -> Lease:
+        now = time.time()
+        lease = self.new_lease(now)
+        period = self.period(now)
+        with self._transaction() as connection:
+            self._requeue(
+                connection, "state = ? AND available_at <= ?", (LEASED, now), "Lease expired", now,
+            )
+            connection.execute("DELETE FROM rates WHERE period < ?", (period,))
+            ready = [
+                domain for domain, in connection.execute(
+                    "SELECT DISTINCT domain FROM links WHERE state = ? AND available_at <= ?", (QUEUED, now)
+                )
+            ]
+
+            def take(domain, count):
+                quota = self.quota(domain)
+                if quota is not None:
+                    row = connection.execute(
+                        "SELECT count FROM rates WHERE domain = ? AND period = ?", (domain, period)
+                    ).fetchone()
+                    count = min(count, quota - (row[0] if row else 0))
+                    if count <= 0:
+                        return 0
+                links = [
+                    link for link, in connection.execute(
+                        "SELECT link FROM links WHERE state = ? AND domain = ? AND available_at <= ?"
+                        " ORDER BY available_at LIMIT ?",
+                        (QUEUED, domain, now, count),
+                    )
+                ]
+                connection.executemany(
+                    "UPDATE links SET state = ?, lease_id = ?, available_at = ? WHERE link = ?",
+                    [(LEASED, lease.id, lease.deadline, link) for link in links],
+                )
+                if quota is not None:
+                    connection.execute(
+                        "INSERT INTO rates VALUES (?, ?, ?)"
+                        " ON CONFLICT (domain, period) DO UPDATE SET count = count + excluded.count",
+                        (domain, period, len(links)),
+                    )
+                lease.links += links
+                return len(links)
+
+            self.allocate(ready, size, take)
+        return lease if lease.links else None
+
+    def ack(self, lease: Lease, links: list = None):
+        links = lease.links if links is None else links
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE links SET state = ?, lease_id = NULL, error = NULL WHERE link = ? AND lease_id = ?",
+                [(DONE, link, lease.id) for link in links],
+            )
+
+    def fail(self, lease: Lease, errors: dict):
+        now = time.time()
+        with self._transaction() as connection:
+            for link, error in errors.items():
+                self._requeue(
+                    connection, "link = ? AND lease_id = ?", (link, lease.id), error, now + self.retry_delay,
+                )
+
+    def _requeue(self, connection, where, parameters, error, available_at):
+        # links leased for the last time are failed
+        connection.execute(
+            "UPDATE links SET attempts = attempts + 1, lease_id = NULL, error = ?, available_at = ?,"
+            f" state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END WHERE {where}",
+            (error, available_at, self.max_attempts, FAILED, QUEUED, *parameters),
+        )
+
+    def mark_seen(self, namespace: str, fingerprints: list) -> list:
+        with self._transaction() as connection:
+            return [
+                not connection.execute(
+                    "INSERT OR IGNORE INTO seen VALUES (?, ?)", (namespace, fingerprint)
+                ).rowcount
+                for fingerprint in fingerprints
+            ]
+
+    def seed(self) -> int:
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'seed'").fetchone()
+        return row[0] if row else 0
+
+    def new_seed(self) -> int:
+        with self._transaction() as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = 'seed'").fetchone()
+            seed = (row[0] if row else 0) + 1
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('seed', ?)", (seed,))
+            connection.execute("DELETE FROM seen WHERE namespace = ?", (self.requests_namespace(seed - 1),))
+        return seed
+
+    def counts(self) -> dict:
+        with self.lock:
+            rows = dict(self.connection.execute("SELECT state, COUNT(*) FROM links GROUP BY state"))
+        return {state: rows.get(state, 0) for state in (QUEUED, LEASED, DONE, FAILED)}
+
+    def failures(self) -> dict:
+        with self.lock:
+            return dict(self.connection.execute("SELECT link, error FROM links WHERE state = ?", (FAILED,)))
+
+    def close(self):
+        self.connection.close()
+
+
+class RespClient:
+    """Minimal client of the Redis protocol (RESP2) over one connection, thread safe"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0, password: str = None,
+                 timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sock = None
+        self.file = None
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        self.file = self.sock.makefile("rb")
+        if self.password:
+            self._call([("AUTH", self.password)])
+        if self.db:
+            self._call([("SELECT", self.db)])
+
+    def execute(self, *command):
+        return self.pipeline([command])[0]
+
+    def pipeline(self, commands: list) -> list:
+        """Send the commands at once and return their replies
+
+        Raises:
+            FrontierError: one of the commands got an error reply
+        """
+        if not commands:
+            return []
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.connect()
+                return self._call(commands)
+            except OSError:
+                # reconnected by the next command
+                self.close()
+                raise
+
+    def _call(self, commands):
+        self.sock.sendall(b"".join(self._encode(command) for command in commands))
+        replies = [self._read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, FrontierError):
+                raise reply
+        return replies
+
+    @staticmethod
+    def _encode(command) -> bytes:
+        parts = [b"*%d\r\n" % len(command)]
+        for argument in command:
+            if not isinstance(argument, bytes):
+                argument = str(argument).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(argument), argument))
+        return b"".join(parts)
+
+    def _read(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError(f"Connection to {self.host}:{self.port} closed")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode("utf-8")
+        if kind == b"-":
+            return FrontierError(value.decode("utf-8"))
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            if int(value) < 0:
+                return None
+            return self.file.read(int(value) + 2)[:-2].decode("utf-8")
+        if kind == b"*":
+            if int(value) < 0:
+                return None
+            return [self._read() for _ in range(int(value))]
+        raise FrontierError(f"Invalid reply: {line!r}")
+
+    def close(self):
+        if self.sock is not None:
+            self.file.close()
+            self.sock.close()
+        self.sock = None
+        self.file = None
+
+
+class RedisFrontier(Frontier):
+    """
+    Frontier on a Redis protocol server, with the keys:
+    ...
+
+    - <name>:seen:<namespace>: set of the fingerprints seen
+    - <name>:seed: number of the current seed
+    - <name>:domains: set of the domains with links
+    - <name>:queue:<domain>: sorted set of the queued links, by the time they are available
+    - <name>:leases: sorted set of the leased links, by lease deadline
+    - <name>:owners: hash of the lease id of every leased link
+    - <name>:attempts, <name>:failed: hashes of the leases and of the error of links
+    - <name>:counts: hash of the number of links done and failed
+    - <name>:rate:<domain>:<period>: links of the domain leased in a rate window
+
+    A link is claimed by the node that adds it to the leases (ZADD NX) and
+    then removes it from its queue, so two nodes never lease it at once.
+    """
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", name: str = None, **options):
+        """
+        Args:
+            url (str, optional): "redis://[:password@]host:port/db[?name=...]".\n
+                Defaults to "redis://127.0.0.1:6379/0".
+            name (str, optional): prefix of the keys. Defaults to the "name" of the url, else "frontier".
+            **options: rate, rates, rate_window, lease_seconds, max_attempts and retry_delay of Frontier
+        """
+        super().__init__(**options)
+        parsed = urlparse(url)
+        self.name = name or parse_qs(parsed.query).get("name", ["frontier"])[0]
+        self.client = RespClient(
+            parsed.hostname or "127.0.0.1", parsed.port or 6379,
+            int(parsed.path.strip("/") or 0), unquote(parsed.password) if parsed.password else None,
+        )
+
+    def key(self, *parts) -> str:
+        return ":".join((self.name, *parts))
+
+    def add(self, links) -> int:
+        links = list(links)
+        added = self.client.pipeline([("SADD", self.key("seen", "links"), self.fingerprint(link)) for link in links])
+        now = time.time()
+        commands = []
+        domains = set()
+        for link, new in zip(links, added):
+            if new:
+                domains.add(self.domain(link))
+                commands.append(("ZADD", self.key("queue", self.domain(link)), now, link))
+        if domains:
+            commands.append(("SADD", self.key("domains"), *domains))
+        self.client.pipeline(commands)
+        return sum(added)
+
+    def lease(self, size: int) -> Lease:
+        client = self.client
+        leases = self.key("leases")
+        now = time.time()
+        lease = self.new_lease(now)
+        expired = client.execute("ZRANGEBYSCORE", leases, "-inf", now)
+        if expired:
+            # reaped by the node that removes them from the leases
+            removed = client.pipeline([("ZREM", leases, link) for link in expired])
+            self._requeue({link: "Lease expired" for link, done in zip(expired, removed) if done}, now)
+
+        def take(domain, count):
+            queue = self.key("queue", domain)
+            links = client.execute("ZRANGEBYSCORE", queue, "-inf", now, "LIMIT", 0, count)
+            if not links:
+                return 0
+            quota = self.quota(domain)
+            reserved = len(links)
+            if quota is not None:
+                # reserved at once, so that nodes leasing together stay within the quota
+                rate = self.key("rate", domain, str(self.period(now)))
+                used, _ = client.pipeline([("INCRBY", rate, reserved), ("EXPIRE", rate, math.ceil(self.rate_window) * 2)])
+                links = links[:max(0, quota - (used - reserved))]
+            claimed = client.pipeline([("ZADD", leases, "NX", lease.deadline, link) for link in links])
+            links = [link for link, new in zip(links, claimed) if new]
+            removed = client.pipeline([("ZREM", queue, link) for link in links])
+            # not in the queue anymore: leased and acked by another node in the meantime
+            client.pipeline([
+                ("HSET", self.key("owners"), link, lease.id) if done else ("ZREM", leases, link)
+                for link, done in zip(links, removed)
+            ])
+            links = [link for link, done in zip(links, removed) if done]
+            if quota is not None and len(links) < reserved:
+                # only the leased links count against the quota
+                client.execute("INCRBY", rate, len(links) - reserved)
+            lease.links += links
+            return len(links)
+
+        self.allocate(client.execute("SMEMBERS", self.key("domains")), size, take)
+        return lease if lease.links else None
+
+    def _held(self, lease, links) -> list:
+        owners = self.client.pipeline([("HGET", self.key("owners"), link) for link in links])
+        return [link for link, owner in zip(links, owners) if owner == lease.id]
+
+    def ack(self, lease: Lease, links: list = None):
+        links = self._held(lease, lease.links if links is None else links)
+        if not links:
+            return
+        commands = []
+        for link in links:
+            commands += [
+                ("ZREM", self.key("leases"), link), ("HDEL", self.key("owners"), link),
+                ("HDEL", self.key("attempts"), link),
+            ]
+        commands.append(("HINCRBY", self.key("counts"), DONE, len(links)))
+        self.client.pipeline(commands)
+
+    def fail(self, lease: Lease, errors: dict):
+        links = self._held(lease, list(errors))
+        self.client.pipeline([("ZREM", self.key("leases"), link) for link in links])
+        self._requeue({link: errors[link] for link in links}, time.time() + self.retry_delay)
+
+    def _requeue(self, errors, available_at):
+        links = list(errors)
+        attempts = self.client.pipeline([("HINCRBY", self.key("attempts"), link, 1) for link in links])
+        commands = []
+        for link, attempt in zip(links, attempts):
+            commands.append(("HDEL", self.key("owners"), link))
+            if attempt >= self.max_attempts:
+                commands += [
+                    ("HSET", self.key("failed"), link, errors[link] or ""), ("HDEL", self.key("attempts"), link),
+                    ("HINCRBY", self.key("counts"), FAILED, 1),
+                ]
+            else:
+                commands.append(("ZADD", self.key("queue", self.domain(link)), available_at, link))
+        self.client.pipeline(commands)
+
+    def mark_seen(self, namespace: str, fingerprints: list) -> list:
+        added = self.client.pipeline([("SADD", self.key("seen", namespace), fingerprint) for fingerprint in fingerprints])
+        return [not new for new in added]
+
+    def seed(self) -> int:
+        return int(self.client.execute("GET", self.key("seed")) or 0)
+
+    def new_seed(self) -> int:
+        seed = self.client.execute("INCRBY", self.key("seed"), 1)
+        self.client.execute("DEL", self.key("seen", self.requests_namespace(seed - 1)))
+        return seed
+
+    def counts(self) -> dict:
+        domains = self.client.execute("SMEMBERS", self.key("domains"))
+        replies = self.client.pipeline(
+            [("ZCARD", self.key("queue", domain)) for domain in domains]
+            + [("ZCARD", self.key("leases")), ("HGET", self.key("counts"), DONE), ("HGET", self.key("counts"), FAILED)]
+        )
+        leased, done, failed = replies[len(domains):]
+        return {QUEUED: sum(replies[:len(domains)]), LEASED: leased, DONE: int(done or 0), FAILED: int(failed or 0)}
+
+    def failures(self) -> dict:
+        values = self.client.execute("HGETALL", self.key("failed"))
+        return dict(zip(values[::2], values[1::2]))
+
+    def close(self):
+        self.client.close()
+
+
+FRONTIERS = {
+    "sqlite": SQLiteFrontier,
+    "redis": RedisFrontier,
+}
+
+
+def open_frontier(uri: str, **options) -> Frontier:
+    """Open the frontier of a FRONTIER_URI
+
+    Args:
+        uri (str): "sqlite:<path>", e.g. "sqlite:/mnt/shared/frontier.sqlite3", or
+            "redis://host:port/db", e.g. "redis://10.0.0.5:6379/0?name=news"
+        **options: rate, rates, rate_window, lease_seconds, max_attempts and retry_delay of Frontier
+
+    Raises:
+        Exception: Raised exception for unknown frontier kind
+    """
+    kind, _, path = uri.partition(":")
+    if kind not in FRONTIERS or not path:
+        raise Exception(f"Invalid Frontier: {uri}")
+    return FRONTIERS[kind](uri if kind == "redis" else path, **options)
+
+
+class FrontierDupeFilter(RFPDupeFilter):
+    """Scrapy's request filter, shared by the crawls of every node through the frontier of FRONTIER_URI
+
+    A request is downloaded by one node only during a seed of the frontier,
+    e.g. a child sitemap or a followed link; the next seed downloads it again.
+    Requests with dont_filter=True, like the leased links, are never filtered.
+    """
+
+    frontier = None
+    namespace = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        dupefilter = super().from_crawler(crawler)
+        if crawler.settings.get("FRONTIER_URI"):
+            dupefilter.frontier = open_frontier(crawler.settings.get("FRONTIER_URI"))
+            dupefilter.namespace = dupefilter.frontier.requests_namespace(dupefilter.frontier.seed())
+        return dupefilter
+
+    def request_seen(self, request) -> bool:
+        # seen by this crawl, else by the crawls of any node
+        if super().request_seen(request):
+            return True
+        if self.frontier is None:
+            return False
+        fingerprint = int.from_bytes(bytes.fromhex(self.request_fingerprint(request))[:8], "big", signed=True)
+        return self.frontier.mark_seen(self.namespace, [fingerprint])[0]
+
+    def close(self, reason):
+        if self.frontier is not None:
+            self.frontier.close()
+        return super().close(reason)
+
+
+def seed_frontier(uri: str, query: dict, frontier_options: dict = None, **options) -> int:
+    """Crawl a sitemap query and queue its links in the frontier
+
+    Links queued before, by this or another node, are not queued again. The
+    seed of the frontier is renewed, so the requests filtered by the
+    FrontierDupeFilter of the previous seed are downloaded again.
+
+    Args:
+        uri (str): frontier, see open_frontier
+        query (dict): "sitemap" query of the Crawler
+        frontier_options (dict, optional): keyword arguments of the frontier. Defaults to None.
+        **options: other Crawler keyword arguments
+
+    Returns:
+        int: number of links queued
+    """
+    crawler = Crawler(query, **options)
+    entries = crawler.crawl()
+    if crawler.error:
+        raise Exception(f"Sitemap crawl failed: {crawler.error}")
+    with open_frontier(uri, **(frontier_options or {})) as frontier:
+        frontier.new_seed()
+        return frontier.add(entry["link"] for entry in entries if entry.get("link"))
+
+
+def crawl_frontier(
+    uri: str, batch_size: int = 50, poll_interval: float = 5.0, max_batches: int = None,
+    on_results=None, frontier_options: dict = None, profile="default", **options,
+) -> dict:
+    """Lease batches of links from the frontier and crawl them until it is empty
+
+    Run by every worker node. Each batch is crawled as an "articles" query,
+    its crawled links are acked and its failed ones (and those the crawl did
+    not reach) failed, to be leased again later. The crawl times out before
+    the lease does, unless `timeout` is given.
+
+    Args:
+        uri (str): frontier, see open_frontier
+        batch_size (int, optional): links leased at once. Defaults to 50.
+        poll_interval (float, optional): seconds to wait when no link can be leased yet,\n
+            e.g. because of the rate limits. Defaults to 5.0.
+        max_batches (int, optional): stop after this many batches. Defaults to None.
+        on_results (callable, optional): called with the crawl() output of every batch,\n
+            [{"link", "data", "error"}, ...]. Defaults to None.
+        frontier_options (dict, optional): keyword arguments of the frontier. Defaults to None.
+        profile (str | dict, optional): Crawler profile, FRONTIER_URI and the FrontierDupeFilter\n
+            are added to it. Defaults to "default".
+        **options: other Crawler keyword arguments, e.g. sink="jsonl:output/node-1.jsonl"
+
+    Returns:
+        dict: {"batches", "done", "failed"} of this node
+    """
+    profile = {
+        **get_profile(profile), "FRONTIER_URI": uri,
+        "DUPEFILTER_CLASS": "newton_scrapping.frontier.FrontierDupeFilter",
+    }
+    totals = {"batches": 0, DONE: 0, FAILED: 0}
+    with open_frontier(uri, **(frontier_options or {})) as frontier:
+        options.setdefault("timeout", frontier.lease_seconds * 0.9)
+        while max_batches is None or totals["batches"] < max_batches:
+            lease = frontier.lease(batch_size)
+            if lease is None:
+                counts = frontier.counts()
+                if not counts[QUEUED] and not counts[LEASED]:
+                    break
+                time.sleep(poll_interval)
+                continue
+            crawler = Crawler({"type": "articles", "links": lease.links}, profile=profile, **options)
+            results = crawler.crawl()
+            crawled = {result["link"]: result for result in results}
+            errors = {
+                link: crawled[link]["error"] if link in crawled else crawler.error or "Link was not crawled"
+                for link in lease.links if link not in crawled or crawled[link].get("error")
+            }
+            frontier.ack(lease, [link for link in lease.links if link not in errors])
+            if errors:
+                frontier.fail(lease, errors)
+            if on_results:
+                on_results(results)
+            totals["batches"] += 1
+            totals[DONE] += len(lease.links) - len(errors)
+            totals[FAILED] += len(errors)
+    return totals
@@ -2,11 +2,26 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
+#
+# The records are dicts with a fixed set of keys and no __dict__ of their own,
+# so they cost no more than a dict: millions of sitemap links are built per
+# crawl, and records are pickled through the output queue, written as JSON
+# and passed to the sinks as they are.
+
+
+class NewtonScrappingItem(dict):
+    # article data, as per test/data/test_article_*.json
+    __slots__ = ()
+    fields = ("raw_response", "parsed_json", "parsed_data")
+
+    def __init__(self, raw_response: dict = None, parsed_json: dict = None, parsed_data: dict = None):
+        super().__init__(raw_response=raw_response, parsed_json=parsed_json, parsed_data=parsed_data)
 
-import scrapy
 
+class NewtonScrappingLinkItem(dict):
+    # article link found in a sitemap
+    __slots__ = ()
+    fields = ("link", "title", "lastmod")
 
-class NewtonScrappingItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+    def __init__(self, link: str, title: str = None, lastmod: str = None):
+        super().__init__(link=link, title=title, lastmod=lastmod)
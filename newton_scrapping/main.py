@@ -1,7 +1,68 @@
-from scrapy.crawler import CrawlerProcess
+import asyncio
+import inspect
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import Future, TimeoutError, as_completed
+from datetime import date, timedelta
 from multiprocessing import Process, Queue
-# TODO: Change path and spider name here
-from crwsueddeutsche.spiders.sueddeutsche import SueddeutscheSpider
+from queue import Empty
+from urllib.parse import quote
+
+from scrapy import Request, signals
+from scrapy.crawler import CrawlerProcess, CrawlerRunner
+from scrapy.settings import Settings
+from scrapy.utils.asyncgen import as_async_generator
+from scrapy.utils.reactor import install_reactor
+from scrapy.utils.spider import iterate_spider_output
+from twisted.internet import asyncioreactor
+from twisted.python.failure import Failure
+
+from newton_scrapping.checkpoint import FINISHED, JobCheckpoint
+from newton_scrapping.dedup import DedupIndex, normalize_url
+from newton_scrapping.metrics import metrics_for
+from newton_scrapping.middlewares import CIRCUIT_DEAD
+from newton_scrapping.pipelines import open_sink
+from newton_scrapping.profiles import get_profile
+from newton_scrapping.registry import get_spider
+from newton_scrapping.sitemap import SitemapState
+from newton_scrapping.utils import compact_raw_response
+
+
+STREAM_ITEM = "item"
+STREAM_END = "end"
+STREAM_ERROR = "error"
+
+# messages of the process of Crawler.crawl(), the data is only sent once the spider hands it over
+CRAWL_DATA = "data"
+CRAWL_STATS = "stats"
+
+# seconds a timed out crawl has to close its spider before its process is killed
+SHUTDOWN_GRACE = 30
+
+# days of the named "partition" sizes of a sitemap query
+PARTITION_DAYS = {"day": 1, "week": 7}
+
+# settings.py of the project, the base of the settings of every crawl
+SETTINGS_MODULE = "newton_scrapping.settings"
+
+
+class CrawlerError(Exception):
+    """Raised when a crawl fails inside a worker process"""
+
+
+def project_settings() -> Settings:
+    """Return the scrapy settings of the project (settings.py), to which apply_settings adds those of a query
+
+    robots.txt is not obeyed, as by the crawls of the bare CrawlerProcess() before; a profile
+    can still set ROBOTSTXT_OBEY.
+    """
+    settings = Settings()
+    settings.setmodule(SETTINGS_MODULE, priority="project")
+    settings.set("ROBOTSTXT_OBEY", False, priority="project")
+    return settings
 
 
 class Crawler:
@@ -13,20 +74,64 @@ class Crawler:
     ----------
     query : dict
         query dictionary that contains type, link, domain, since and until
-    proxies : str
-        dictionary that contains proxy related information
+    proxies : dict | list
+        dictionary that contains proxy related information, or a list of them
+    profile : str | dict
+        throughput profile name from profiles.PROFILES, or a dict of scrapy settings
+    state_dir : str
+        directory of the per-domain state of incremental sitemap crawls
+    raw_response : str
+        how the page HTML is returned in raw_response, see utils.compact_raw_response
+    blob_dir : str
+        directory of the page HTML files for raw_response="blob"
+    sink : str
+        where the scraped items are also written in batches, see pipelines.open_sink
+    dedup : bool
+        leave out the articles and sitemap links already emitted, see pipelines.DedupPipeline
+    job_id : str
+        name of the resumable job of this query, see checkpoint.JobCheckpoint
+    job_dir : str
+        directory of the resumable jobs
+    timeout : float
+        seconds after which crawl() stops the crawl and returns what it has
+    error : str
+        why the last crawl() returned partial data, None if it completed
+    workers : int
+        worker processes crawling the date partitions of a sitemap query
+    jobs_per_worker : int
+        date partitions crawled at the same time by one worker process
+    on_progress : callable
+        called with the progress of every crawled date partition
+    parse_workers : int
+        worker processes building the article records, see executor.ParseExecutor
+    max_body_bytes : int | dict
+        bytes downloaded at most per page, or {query type: bytes}
+    end_markers : list
+        strings after which the download of an article page is stopped
+    circuit_breaker : bool
+        hold back the requests of failing domains and limit the retries, see middlewares.CircuitBreakerMiddleware
     output : int
         Data returned by crawl method
+    stats : dict
+        scrapy stats of the last crawl() and the "histograms" of its
+        download, DNS, parse and pipeline times, see metrics.MetricsRegistry
 
     Methods
     -------
     crawl()
         Crawls the sitemap URL and article URL and return final data
+    iter_crawl()
+        Same as crawl() but yields every article or sitemap entry as soon as it is parsed
     def yield_output(data)
         set data to output attribute
     """
 
-    def __init__(self, query={'type': None}, proxies={}):
+    def __init__(
+        self, query={'type': None}, proxies={}, profile="default", state_dir="incremental_state",
+        raw_response="full", blob_dir="raw_blobs", sink=None, dedup=False,
+        job_id=None, job_dir="jobs", timeout=None, workers=None, jobs_per_worker=1, on_progress=None,
+        parse_workers=None, max_body_bytes=None, end_markers=None, circuit_breaker=True,
+    ):
         """
         Args:
             query (dict): A dict that takes input for crawling the link for one of the below type.\n
@@ -34,24 +139,237 @@ class Crawler:
                 "type": "sitemap", "domain": "https://example.com",\n
                 "since": "2022-03-01", "until": "2022-03-26"\n
                 }
+            for sitemap links of a long range, crawled concurrently by "day" or "week"\n
+            (or number of days):- {
+                "type": "sitemap", "domain": "https://example.com",\n
+                "since": "2022-01-01", "until": "2022-03-31", "partition": "week"\n
+                }
+            for new or updated sitemap links since the last run:- {
+                "type": "sitemap", "domain": "https://example.com", "incremental": True\n
+                }
             for article:- {"type": "article", "link": https://example.com/articles/test.html"}\n
+            for many articles in one run:- {
+                "type": "articles",\n
+                "links": ["https://example.com/articles/a.html", "https://example.com/articles/b.html"]\n
+                }\n
             for link_feed:- {"type": "link_feed"}. Defaults to {'type': None}.\n
             proxies (dict, optional): Use:- {
                 "proxyIp": "123.456.789.2", "proxyPort": "3199",\n
                 "proxyUsername": "IgNyTnddr5", "proxyPassword": "123466"\n
-                }. Defaults to {}.
+                }, or a list of such dicts to rotate over them by live latency and errors. Defaults to {}.
+            profile (str | dict, optional): throughput profile, one of "default", "polite",\n
+                "balanced", "bulk" or a dict of scrapy settings. Defaults to "default".
+            state_dir (str, optional): directory of the state of incremental sitemap crawls.\n
+                Defaults to "incremental_state".
+            raw_response (str, optional): "full" page HTML, "omit" it, "gzip" or "zstd"\n
+                compressed and base64 encoded, or "blob" to write it to `blob_dir` and only\n
+                return its sha256. Defaults to "full".
+            blob_dir (str, optional): directory of the raw_response="blob" files. Defaults to "raw_blobs".
+            sink (str, optional): also write the scraped items in batches to\n
+                "jsonl:<path>", "sqlite:<path>", "unix:<socket path>", "parquet:<path>"\n
+                or "arrow:<path>". Defaults to None.
+            dedup (bool, optional): leave out the duplicates of the articles emitted by this\n
+                or a previous run, by normalized URL and text SimHash, indexed in\n
+                `state_dir`/dedup.sqlite3. Defaults to False.
+            job_id (str, optional): checkpoint the crawl in `job_dir`/`job_id` (pending requests,\n
+                seen requests and emitted records), a later Crawler with the same job_id\n
+                resumes it. Defaults to None.
+            job_dir (str, optional): directory of the job checkpoints. Defaults to "jobs".
+            timeout (float, optional): seconds after which the crawl is stopped, crawl() then\n
+                returns the data collected so far and sets `error`. Defaults to None.
+            workers (int, optional): worker processes of a "partition" sitemap query.\n
+                Defaults to the number of CPUs, at most one per partition.
+            jobs_per_worker (int, optional): partitions crawled at the same time by one\n
+                worker process. Defaults to 1.
+            on_progress (callable, optional): called with {"since", "until", "entries",\n
+                "error", "done", "total"} as every partition is crawled. Defaults to None.
+            parse_workers (int, optional): build the article records in this many worker\n
+                processes instead of on the reactor thread, 0 to build them inline as\n
+                PARSE_EXECUTOR_WORKERS. Defaults to None, the PARSE_EXECUTOR_WORKERS setting.
+            max_body_bytes (int | dict, optional): bytes downloaded at most per page, or\n
+                {"article": bytes, "sitemap": bytes}. Article pages are cut and parsed,\n
+                larger sitemaps fail. Defaults to None.
+            end_markers (list[str], optional): stop downloading an article page once one of\n
+                them is received, e.g. ["</article>"]. Defaults to None.
+            circuit_breaker (bool, optional): stop requesting a domain for a while once most of\n
+                its downloads fail, give it up after repeated failures, honour Retry-After and\n
+                retry at most a share of the requests. The domains that tripped are in `stats`\n
+                and a given up domain in `error`. Defaults to True.
         """
         self.output_queue = None
+        self.stats = None
+        self.error = None
         self.query = query
         self.proxies = proxies
+        self.profile = profile
+        self.state_dir = state_dir
+        self.raw_response = raw_response
+        self.blob_dir = blob_dir
+        self.sink = sink
+        self.dedup = dedup
+        self.job_id = job_id
+        self.job_dir = job_dir
+        self.timeout = timeout
+        self.workers = workers
+        self.jobs_per_worker = jobs_per_worker
+        self.on_progress = on_progress
+        self.parse_workers = parse_workers
+        self.max_body_bytes = max_body_bytes
+        self.end_markers = end_markers
+        self.circuit_breaker = circuit_breaker
 
     def crawl(self) -> list[dict]:
+        """Crawls the sitemap URL and article URL and return final data
+
+        When the crawl times out, the spider is closed and its data returned.
+        When the crawler process dies, the data checkpointed by a `job_id`
+        crawl is returned. In both cases `error` tells what happened.
+
+        Returns:
+            list[dict]: list of dictionary of the article data or article links
+        """
+        self.error = None
+        self.stats = None
+        if self.is_partitioned():
+            return self.crawl_partitions()
+        checkpoint = JobCheckpoint(self.job_path()) if self.job_id else None
+        if checkpoint and checkpoint.status == FINISHED and checkpoint.has_query(self.query):
+            return checkpoint.results(self.query)
+
         self.output_queue = Queue()
         process = Process(
             target=self.start_crawler, args=(self.query, self.output_queue)
         )
         process.start()
-        return self.output_queue.get()
+        watcher = ProcessWatcher(process, self.output_queue, self.timeout)
+        data = None
+        try:
+            # the stats are the last message of the process
+            while self.stats is None:
+                kind, payload = watcher.get()
+                if kind == CRAWL_DATA:
+                    data = payload
+                else:
+                    self.stats = payload
+        except CrawlerError as error:
+            self.error = str(error)
+        process.join()
+        if data is None:
+            data = checkpoint.results(self.query) if checkpoint and checkpoint.has_query(self.query) else []
+        given_up = circuits_given_up(self.stats)
+        if given_up:
+            self.error = "Circuit breaker gave up on " + ", ".join(given_up)
+        if watcher.timed_out:
+            self.error = f"Crawl timed out after {self.timeout} seconds"
+        return data
+
+    def crawl_partitions(self) -> list[dict]:
+        """Crawl the since/until range of a "partition" sitemap query as concurrent date ranges
+
+        Every partition is a sitemap query of its own, crawled by a CrawlerPool
+        of `workers` processes running `jobs_per_worker` partitions each, with
+        the options of this Crawler. A `job_id` is checkpointed per partition,
+        as "<job_id>-<since>_<until>". The entries are merged in date order,
+        keeping the first entry of every normalized link, and the merged
+        entries are written to the `sink` by this process once every partition
+        is done. A failed partition is reported through `on_progress` and
+        `error`, the entries of the others are still returned. After `timeout`
+        seconds the workers are stopped and the partitions not finished yet
+        are left out.
+
+        Returns:
+            list[dict]: sitemap entries
+        """
+        query = {key: value for key, value in self.query.items() if key != "partition"}
+        partitions = date_partitions(query["since"], query["until"], self.query["partition"])
+        results = [[] for _ in partitions]
+        errors = []
+        workers = self.workers or min(os.cpu_count() or 1, len(partitions))
+        # the sink is written once with the merged entries, not by every partition
+        options = {
+            "profile": self.profile, "state_dir": self.state_dir, "raw_response": self.raw_response,
+            "blob_dir": self.blob_dir, "dedup": self.dedup, "job_dir": self.job_dir, "timeout": self.timeout,
+            "parse_workers": self.parse_workers, "max_body_bytes": self.max_body_bytes,
+            "end_markers": self.end_markers, "circuit_breaker": self.circuit_breaker,
+        }
+        with CrawlerPool(workers, self.proxies, self.jobs_per_worker, **options) as pool:
+            futures = {}
+            for index, (since, until) in enumerate(partitions):
+                job_id = f"{self.job_id}-{since}_{until}" if self.job_id else None
+                futures[pool.submit({**query, "since": since, "until": until}, job_id=job_id)] = index
+            done = not_crawled = 0
+            try:
+                for done, future in enumerate(as_completed(futures, timeout=self.timeout), 1):
+                    index = futures[future]
+                    since, until = partitions[index]
+                    error = None
+                    try:
+                        results[index] = future.result()
+                    except CrawlerError as exception:
+                        # last line of the worker traceback
+                        error = str(exception).strip().rsplit("\n", 1)[-1]
+                        errors.append(f"{since}/{until}: {error}")
+                    if self.on_progress:
+                        self.on_progress({
+                            "since": since, "until": until, "entries": len(results[index]),
+                            "error": error, "done": done, "total": len(partitions),
+                        })
+            except TimeoutError:
+                pool.terminate()
+                not_crawled = len(partitions) - done
+        if errors:
+            self.error = f"{len(errors)} of {len(partitions)} partitions failed: " + "; ".join(errors)
+        if not_crawled:
+            self.error = (
+                f"Crawl timed out after {self.timeout} seconds, {not_crawled} of {len(partitions)} partitions not crawled"
+            )
+        entries = merge_partitions(results)
+        if self.sink:
+            settings = project_settings()
+            self.apply_settings(settings)
+            sink = open_sink(self.sink, self.blob_dir, **settings.getdict("ITEM_SINK_OPTIONS"))
+            try:
+                sink.write(entries)
+            finally:
+                sink.close()
+        return entries
+
+    def iter_crawl(self):
+        """Crawls the sitemap URL and article URL and yields the data one record at a time
+
+        The crawl runs in a child process that sends each record through the
+        queue as soon as it is scraped, so the first results are available
+        before the crawl is over and the complete list is never held in memory.
+        For "articles" queries every record is the result of one link.
+
+        Raises:
+            CrawlerError: the crawl failed, timed out or the child process died
+
+        Yields:
+            dict: article data or article link
+        """
+        output_queue = Queue()
+        process = Process(
+            target=self.stream_crawler, args=(self.query, output_queue)
+        )
+        process.start()
+        watcher = ProcessWatcher(process, output_queue, self.timeout)
+        try:
+            while True:
+                kind, payload = watcher.get()
+                if kind == STREAM_END:
+                    break
+                if kind == STREAM_ERROR:
+                    raise CrawlerError(payload)
+                yield payload
+            if watcher.timed_out:
+                raise CrawlerError(f"Crawl timed out after {self.timeout} seconds")
+        finally:
+            # Stopped before the end of the stream, the remaining records are
+            # not wanted and the child could block on a full queue.
+            if process.is_alive():
+                process.kill()
+            process.join()
 
     def start_crawler(self, query, output_queue):
         """Crawls the sitemap URL and article URL and return final data
@@ -64,39 +382,1195 @@ class Crawler:
             as per expected_article.json or expected_sitemap.json
         """
 
-        process = CrawlerProcess()
-        process_settings = process.settings
-        process_settings["DOWNLOAD_DELAY"] = 0.25
-        process_settings["REFERER_ENABLED"] = False
-        process_settings["USER_AGENT"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"  # noqa: E501
-        process.settings = process_settings
+        stats = {}
+        process = CrawlerProcess(project_settings())
+        self.apply_settings(process.settings)
+        self.schedule(process, lambda data: output_queue.put((CRAWL_DATA, data)), on_stats=stats.update)
+        process.start()
+        output_queue.put((CRAWL_STATS, stats))
+
+    def stream_crawler(self, query, output_queue):
+        """Child process target of iter_crawl(), sends tagged records through `output_queue`"""
+        stream = ItemStream(output_queue)
+        try:
+            process = CrawlerProcess(project_settings())
+            self.apply_settings(process.settings)
+            deferred = self.schedule(process, stream.callback, on_item=stream.put)
+            deferred.addErrback(stream.failed)
+            process.start()
+        except Exception:
+            stream.failed(Failure())
+        stream.close()
+
+    def schedule(self, runner, callback, on_item=None, on_stats=None):
+        """Create the spider for this query on `runner` and start crawling it
+
+        Args:
+            runner (scrapy.crawler.CrawlerRunner): runner whose reactor runs the crawl
+            callback (callable): called once with the final list of data
+            on_item (callable, optional): called with every record as soon as it is
+                scraped, for "articles" queries with the result of every link.
+                Defaults to None.
+            on_stats (callable, optional): called at the end of the crawl with the scrapy
+                stats and their "histograms". Defaults to None.
+
+        Returns:
+            Deferred: fired when the crawl is finished
+        """
+        spidercls = get_spider(self.query)
+        checkpoint = None
+        if self.job_id:
+            checkpoint = JobCheckpoint(self.job_path())
+            checkpoint.open(self.query)
+            if self.query["type"] == "sitemap":
+                callback = _resume_output(checkpoint.records, callback)
+            elif self.query["type"] != "articles":
+                # a single page is simply crawled again
+                checkpoint.clear()
+            streamed = []
+            callback = _checkpoint_output(checkpoint, callback, streamed)
+            on_item = _checkpoint_output(checkpoint, on_item, streamed, single=True)
+
+        if self.raw_response != "full":
+            # before the records are pickled through the queue
+            callback = _compact_output(callback, self.raw_response, self.blob_dir)
+            if on_item:
+                on_item = _compact_output(on_item, self.raw_response, self.blob_dir, single=True)
+
+        state = None
+        if self.is_incremental():
+            state = SitemapState(self.state_path())
+            callback = _filter_new_entries(state, callback)
+            if on_item:
+                on_item = _filter_new_entries(state, on_item, single=True)
+
+        index = None
+        dropped = set()
+        if self.dedup:
+            index = DedupIndex(self.dedup_path())
+            if self.query["type"] == "sitemap":
+                callback = _filter_indexed_links(index, callback)
+                if on_item:
+                    on_item = _filter_indexed_links(index, on_item, single=True)
+            # items dropped by DedupPipeline are still in the spider's own list
+            link = self.query.get("link") if self.query["type"] == "article" else None
+            callback = _exclude_items(callback, dropped, link)
+            if on_item:
+                on_item = _exclude_items(on_item, dropped, link, single=True)
+
+        collector = None
+        if self.query["type"] == "articles":
+            collector = BatchCollector(self.query.get("links", []), callback, on_item)
+            if checkpoint:
+                collector.restore(checkpoint.records)
+            if index:
+                collector.skip_duplicates(index)
+            spidercls = collector.spider_class(spidercls)
+            callback = collector.discard
+
+        crawler = runner.create_crawler(spidercls)
+        if index:
+            def item_dropped(item, response):
+                if response is not None:
+                    dropped.add(_requested_link(response))
+
+            crawler.signals.connect(item_dropped, signal=signals.item_dropped, weak=False)
+        if collector:
+            crawler.signals.connect(collector.spider_closed, signal=signals.spider_closed)
+        elif on_item:
+            def item_scraped(item):
+                on_item(item)
+
+            crawler.signals.connect(item_scraped, signal=signals.item_scraped, weak=False)
+        deferred = runner.crawl(crawler, **self.spider_args(callback))
+        if on_stats:
+            def crawl_finished(result):
+                histograms = metrics_for(crawler).to_dict()
+                # DNS lookups are recorded by the resolver of the runner's reactor
+                histograms["dns_seconds"] = metrics_for(runner).to_dict()["dns_seconds"]
+                on_stats({**crawler.stats.get_stats(), "histograms": histograms})
+                return result
+
+            deferred.addBoth(crawl_finished)
+        if state:
+            deferred.addBoth(lambda result: state.close() or result)
+        if index:
+            deferred.addBoth(lambda result: index.close() or result)
+        if checkpoint:
+            def job_closed(result):
+                checkpoint.close(crawler.stats.get_value("finish_reason"), self.query)
+                return result
+
+            deferred.addBoth(job_closed)
+        return deferred
+
+    def is_partitioned(self) -> bool:
+        return (
+            self.query.get("type") == "sitemap" and bool(self.query.get("partition"))
+            and bool(self.query.get("since")) and bool(self.query.get("until"))
+        )
+
+    def is_article_query(self) -> bool:
+        return self.query.get("type") in ("article", "articles")
+
+    def is_incremental(self) -> bool:
+        return self.query.get("type") == "sitemap" and bool(self.query.get("incremental"))
+
+    def state_path(self) -> str:
+        return SitemapState.path_for_domain(self.state_dir, self.query.get("domain") or "")
+
+    def dedup_path(self) -> str:
+        return os.path.join(self.state_dir, "dedup.sqlite3")
+
+    def job_path(self) -> str:
+        return os.path.join(self.job_dir, self.job_id)
+
+    def apply_settings(self, settings):
+        """Apply the crawl and proxy settings of this query to scrapy settings
+
+        Args:
+            settings (scrapy.settings.Settings): settings object to update in place
+        """
+        for name, value in get_profile(self.profile).items():
+            settings[name] = value
+        settings["EXTENSIONS"]["newton_scrapping.extensions.LatencyFeedbackThrottle"] = 0
+        settings["DOWNLOADER_MIDDLEWARES"][
+            "newton_scrapping.middlewares.ConditionalCacheMiddleware"
+        ] = 580
+        settings["DOWNLOADER_MIDDLEWARES"][
+            "newton_scrapping.middlewares.EarlyAbortMiddleware"
+        ] = 950
+        settings["DOWNLOADER_MIDDLEWARES"][
+            "newton_scrapping.middlewares.NewtonScrappingDownloaderMiddleware"
+        ] = 990
+        settings["SPIDER_MIDDLEWARES"]["newton_scrapping.middlewares.NewtonScrappingSpiderMiddleware"] = 950
+        settings["TWISTED_DNS_RESOLVER"] = "newton_scrapping.metrics.InstrumentedResolver"
+        settings["REFERER_ENABLED"] = False
+        settings["USER_AGENT"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36"  # noqa: E501
+
+        if self.sink:
+            settings["ITEM_SINK"] = self.sink
+            settings["RAW_RESPONSE_MODE"] = self.raw_response
+            settings["RAW_BLOB_DIR"] = self.blob_dir
+            settings["ITEM_PIPELINES"]["newton_scrapping.pipelines.BatchingPipeline"] = 800
+
+        if self.job_id:
+            settings["JOBDIR"] = self.job_path()
+
+        max_body_bytes = self.max_body_bytes
+        if isinstance(max_body_bytes, dict):
+            max_body_bytes = max_body_bytes.get("article" if self.is_article_query() else self.query.get("type"))
+        if self.is_article_query():
+            if max_body_bytes:
+                settings["EARLY_ABORT_MAX_BYTES"] = max_body_bytes
+            if self.end_markers:
+                settings["EARLY_ABORT_END_MARKERS"] = list(self.end_markers)
+        elif max_body_bytes:
+            # a cut sitemap would silently lose links, scrapy fails it instead
+            settings["DOWNLOAD_MAXSIZE"] = max_body_bytes
+
+        if self.circuit_breaker:
+            settings["CIRCUIT_BREAKER_ENABLED"] = True
+            settings["DOWNLOADER_MIDDLEWARES"]["scrapy.downloadermiddlewares.retry.RetryMiddleware"] = None
+            settings["DOWNLOADER_MIDDLEWARES"][
+                "newton_scrapping.middlewares.CircuitBreakerMiddleware"
+            ] = 550
+
+        if self.parse_workers is not None:
+            settings["PARSE_EXECUTOR_WORKERS"] = self.parse_workers
+
+        if self.dedup:
+            settings["DEDUP_INDEX_PATH"] = self.dedup_path()
+            settings["ITEM_PIPELINES"]["newton_scrapping.pipelines.DedupPipeline"] = 700
+            settings["DUPEFILTER_CLASS"] = "newton_scrapping.dedup.CanonicalDupeFilter"
+
+        if self.query.get("type") == "sitemap":
+            settings["DOWNLOADER_MIDDLEWARES"][
+                "newton_scrapping.middlewares.StreamingSitemapMiddleware"
+            ] = 900
+
+        if self.is_incremental():
+            settings["INCREMENTAL_STATE_PATH"] = self.state_path()
+            settings["DOWNLOADER_MIDDLEWARES"][
+                "newton_scrapping.middlewares.IncrementalSitemapMiddleware"
+            ] = 560
+
+        if isinstance(self.proxies, list):
+            settings["PROXY_POOL"] = [_proxy_url(proxy) for proxy in self.proxies]
+            settings["DOWNLOADER_MIDDLEWARES"][
+                "newton_scrapping.middlewares.ProxyPoolMiddleware"
+            ] = 600
+            settings["DOWNLOADER_MIDDLEWARES"][
+                "scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware"
+            ] = 750
+        elif self.proxies:
+            settings["DOWNLOADER_MIDDLEWARES"][
+                "scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware"
+            ] = 400
+            settings["HTTPPROXY_ENABLED"] = True
+            settings["HTTP_PROXY"] = (
+                self.proxies["proxyIp"] + ":" + self.proxies["proxyPort"]
+            )
+            settings["HTTP_PROXY_USER"] = self.proxies["proxyUsername"]
+            settings["HTTP_PROXY_PASS"] = self.proxies["proxyPassword"]
+
+    def spider_args(self, callback) -> dict:
+        """Build the spider keyword arguments for this query
+
+        Args:
+            callback (callable): called by the spider with the final list of data
+
+        Raises:
+            Exception: Raised exception for unknown Type
+
+        Returns:
+            dict: keyword arguments passed to the spider
+        """
         if self.query["type"] == "article":
             spider_args = {
                 "type": "article",
                 "url": self.query.get("link"),
-                "args": {"callback": output_queue.put},
+                "args": {"callback": callback},
+            }
+        elif self.query["type"] == "articles":
+            links = self.query.get("links") or [None]
+            spider_args = {
+                "type": "article",
+                "url": links[0],
+                "args": {"callback": callback},
             }
         elif self.query["type"] == "sitemap":
-            spider_args = {"type": "sitemap", "args": {"callback": output_queue.put}}
-            if self.query.get("since") and self.query.get("until"):
-                spider_args["start_date"] = self.query["since"]
-                spider_args["end_date"] = self.query["until"]
+            spider_args = {"type": "sitemap", "args": {"callback": callback}}
+            since, until = self.query.get("since"), self.query.get("until")
+            if self.is_incremental() and not (since and until):
+                # continue from the last emitted link instead of today only
+                state = SitemapState(self.state_path())
+                watermark = state.watermark
+                state.close()
+                if watermark:
+                    since, until = watermark[:10], date.today().isoformat()
+            if since and until:
+                spider_args["start_date"] = since
+                spider_args["end_date"] = until
         else:
             raise Exception("Invalid Type")
+        return spider_args
 
-        if self.proxies:
-            process_settings = process.settings
-            process_settings["DOWNLOADER_MIDDLEWARES"][
-                "scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware"
-            ] = 400
-            process_settings["HTTPPROXY_ENABLED"] = True
-            process_settings["HTTP_PROXY"] = (
-                self.proxies["proxyIp"] + ":" + self.proxies["proxyPort"]
+
+def date_partitions(since: str, until: str, partition) -> list[tuple]:
+    """Split an inclusive date range into consecutive partitions
+
+    Args:
+        since (str): first day, "YYYY-MM-DD"
+        until (str): last day, "YYYY-MM-DD"
+        partition (str | int): "day", "week" or a number of days
+
+    Raises:
+        Exception: Raised exception for unknown partition or empty range
+
+    Returns:
+        list[tuple]: (since, until) of every partition, in date order
+    """
+    days = PARTITION_DAYS.get(partition, partition)
+    if not isinstance(days, int) or days < 1:
+        raise Exception(f"Invalid Partition: {partition}")
+    start, end = date.fromisoformat(since[:10]), date.fromisoformat(until[:10])
+    if start > end:
+        raise Exception(f"Invalid Date Range: {since} to {until}")
+    partitions = []
+    while start <= end:
+        last = min(start + timedelta(days=days - 1), end)
+        partitions.append((start.isoformat(), last.isoformat()))
+        start = last + timedelta(days=1)
+    return partitions
+
+
+def merge_partitions(results: list) -> list[dict]:
+    """Concatenate the sitemap entries of date partitions, keeping the first entry of every normalized link"""
+    seen = set()
+    merged = []
+    for entries in results:
+        for entry in entries:
+            url = normalize_url(entry["link"]) if entry.get("link") else None
+            if url in seen:
+                continue
+            if url:
+                seen.add(url)
+            merged.append(entry)
+    return merged
+
+
+def circuits_given_up(stats: dict) -> list[str]:
+    """Return the domains whose requests CircuitBreakerMiddleware dropped during a crawl"""
+    return sorted(
+        name.split("/")[1] for name, value in (stats or {}).items()
+        if name.startswith("circuit_breaker/") and name.endswith("/state") and value == CIRCUIT_DEAD
+    )
+
+
+def _proxy_url(proxy: dict) -> str:
+    """Return the "http://user:password@ip:port" URL of a proxy dict"""
+    credentials = ""
+    if proxy.get("proxyUsername"):
+        credentials = quote(proxy["proxyUsername"], safe="") + ":" + quote(
+            proxy.get("proxyPassword", ""), safe=""
+        ) + "@"
+    return f"http://{credentials}{proxy['proxyIp']}:{proxy['proxyPort']}"
+
+
+def _filter_new_entries(state, callback, single=False):
+    """Wrap a sitemap output callback so that it only receives new or updated entries"""
+    if single:
+        def filtered(entry):
+            if state.filter_new([entry]):
+                callback(entry)
+    else:
+        def filtered(entries):
+            callback(state.filter_new(entries))
+    return filtered
+
+
+def _checkpoint_output(checkpoint, callback, streamed, single=False):
+    """Wrap an output callback so that its records are also written to a job checkpoint
+
+    The final list is only written when no record was written one by one, as
+    the spider then hands over the same records again, e.g. article data.
+    `streamed` is shared by the wrappers of the final list and of the single
+    records of a crawl. `callback` may be None for records that are only
+    checkpointed.
+    """
+    if single:
+        def checkpointed(record):
+            streamed.append(True)
+            checkpoint.add(record)
+            if callback:
+                callback(record)
+    else:
+        def checkpointed(records):
+            if not streamed:
+                for record in records:
+                    checkpoint.add(record)
+            callback(records)
+    return checkpointed
+
+
+def _resume_output(records, callback):
+    """Wrap a sitemap output callback so that it also receives the entries of the previous runs of a job"""
+    def resumed(entries):
+        links = {entry.get("link") for entry in entries}
+        callback([record for record in records if record.get("link") not in links] + entries)
+    return resumed
+
+
+def _filter_indexed_links(index, callback, single=False):
+    """Wrap a sitemap output callback so that it skips the links of indexed articles
+
+    Links whose normalized URL was already seen in this run, e.g. the AMP
+    variant of a listed article, are skipped as well.
+    """
+    seen = set()
+
+    def is_new(entry):
+        url = normalize_url(entry["link"])
+        if url in seen or index.has_url(url):
+            return False
+        seen.add(url)
+        return True
+
+    if single:
+        def filtered(entry):
+            if is_new(entry):
+                callback(entry)
+    else:
+        def filtered(entries):
+            callback([entry for entry in entries if is_new(entry)])
+    return filtered
+
+
+def _requested_link(response) -> str:
+    """Return the link a response was requested for, before any redirect"""
+    return response.meta.get("batch_link") or (response.meta.get("redirect_urls") or [response.url])[0]
+
+
+def _exclude_items(callback, links, link=None, single=False):
+    """Wrap an output callback so that it leaves out the records scraped from `links`
+
+    The results of an "articles" query keep their link with an empty "data".
+    The records of an "article" query, all scraped from `link`, are left out
+    when that link is in `links`. `links` is filled while the crawl runs.
+    """
+    def exclude(record):
+        if isinstance(record.get("data"), list) and record.get("link") in links:
+            # result of one link of an "articles" query
+            return {**record, "data": []}
+        return record
+
+    if single:
+        def excluded(record):
+            if link not in links:
+                callback(exclude(record))
+    else:
+        def excluded(records):
+            callback([] if link in links else [exclude(record) for record in records])
+    return excluded
+
+
+def _compact_output(callback, mode, blob_dir, single=False):
+    """Wrap an output callback so that the raw_response of its records is compacted"""
+    def compact(record):
+        if isinstance(record.get("data"), list):
+            # result of one link of an "articles" query
+            return {
+                **record,
+                "data": [compact_raw_response(item, mode, blob_dir) for item in record["data"]],
+            }
+        return compact_raw_response(record, mode, blob_dir)
+
+    if single:
+        def compacted(record):
+            callback(compact(record))
+    else:
+        def compacted(records):
+            callback([compact(record) for record in records])
+    return compacted
+
+
+class BatchCollector:
+    """
+    Collects the per-link results of an "articles" query crawled in one spider run.
+    ...
+
+    The spider is subclassed so that every link is scheduled from
+    `start` and goes through the normal `parse` callback. The records
+    yielded for a link, or the download/parse error of that link, are grouped
+    into one result:- {"link": link, "data": [records], "error": None}
+    """
+
+    def __init__(self, links, callback, on_link=None):
+        """
+        Args:
+            links (list[str]): article links to crawl
+            callback (callable): called with the list of link results once the spider is closed
+            on_link (callable, optional): called with each link result as it completes. Defaults to None.
+        """
+        self.links = links
+        self.callback = callback
+        self.on_link = on_link
+        self.results = {}
+
+    def spider_class(self, spidercls):
+        """Return a subclass of `spidercls` that crawls every link of the batch"""
+        collector = self
+
+        class BatchSpider(spidercls):
+            async def start(self):
+                for link in collector.links:
+                    if link in collector.results:
+                        continue
+                    yield Request(
+                        link,
+                        callback=self.parse_batch_link,
+                        errback=self.batch_link_failed,
+                        meta={"batch_link": link},
+                        dont_filter=True,
+                    )
+
+            async def parse_batch_link(self, response):
+                # async so that parse can wait for records built by the ParseExecutor
+                link = response.meta["batch_link"]
+                data = []
+                try:
+                    result = self.parse(response)
+                    if inspect.isawaitable(result):
+                        result = await result
+                    if not hasattr(result, "__aiter__"):
+                        result = as_async_generator(iterate_spider_output(result))
+                    async for output in result:
+                        if not isinstance(output, Request):
+                            data.append(output)
+                        yield output
+                except Exception as exception:
+                    collector.add(link, data, f"{type(exception).__name__}: {exception}")
+                    raise
+                collector.add(link, data)
+
+            def batch_link_failed(self, failure):
+                collector.add(
+                    failure.request.meta["batch_link"], [], failure.getErrorMessage()
+                )
+
+        BatchSpider.__name__ = spidercls.__name__
+        return BatchSpider
+
+    def restore(self, results):
+        """Complete the links with a result from a previous run, without crawling them or handing them over again"""
+        for result in results:
+            if result["link"] in self.links and not result["error"]:
+                self.results[result["link"]] = result
+
+    def skip_duplicates(self, index):
+        """Complete the links of indexed articles and the repeated links without crawling them"""
+        first_links = {}
+        for link in self.links:
+            url = normalize_url(link)
+            if first_links.setdefault(url, link) != link or index.has_url(url):
+                self.add(link, [], "Duplicate article, already scraped")
+
+    def add(self, link, data, error=None):
+        if link in self.results:
+            return
+        result = {"link": link, "data": data, "error": error}
+        self.results[link] = result
+        if self.on_link:
+            self.on_link(result)
+
+    def discard(self, data):
+        """Replaces the spider output callback, the batch results are sent by spider_closed"""
+
+    def spider_closed(self, spider, reason):
+        for link in self.links:
+            self.add(link, [], f"Link was not crawled, spider closed: {reason}")
+        self.callback([self.results[link] for link in self.links])
+
+
+class ProcessWatcher:
+    """Reads the messages of a crawler process and stops it once `timeout` seconds have passed
+
+    On timeout the process is sent SIGTERM, so that scrapy closes the spider,
+    which hands over what it has collected, and killed if it is still running
+    SHUTDOWN_GRACE seconds later.
+    """
+
+    def __init__(self, process, output_queue, timeout=None):
+        self.process = process
+        self.output_queue = output_queue
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.timed_out = False
+
+    def get(self):
+        """Return the next message of the process
+
+        Raises:
+            CrawlerError: the process exited without sending it
+        """
+        while True:
+            # checked before every read, a process that keeps sending messages is stopped too
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.stop()
+            try:
+                return self.output_queue.get(timeout=1)
+            except Empty:
+                pass
+            if not self.process.is_alive():
+                try:
+                    return self.output_queue.get(timeout=1)
+                except Empty:
+                    raise CrawlerError(
+                        f"Crawler process exited with code {self.process.exitcode}"
+                    ) from None
+
+    def stop(self):
+        if not self.timed_out:
+            self.timed_out = True
+            self.process.terminate()
+            self.deadline = time.monotonic() + SHUTDOWN_GRACE
+        else:
+            self.process.kill()
+            self.deadline = None
+
+
+class ItemStream:
+    """Sends the records of a crawl one by one through a multiprocessing queue"""
+
+    def __init__(self, output_queue):
+        self.output_queue = output_queue
+        self.count = 0
+        self.error = False
+
+    def put(self, record):
+        self.count += 1
+        self.output_queue.put((STREAM_ITEM, record))
+
+    def callback(self, data):
+        # Spiders that only hand over their final list (e.g. sitemap links)
+        # are still streamed record by record.
+        if not self.count:
+            for record in data:
+                self.put(record)
+
+    def failed(self, failure):
+        self.error = True
+        self.output_queue.put((STREAM_ERROR, failure.getTraceback()))
+
+    def close(self):
+        if not self.error:
+            self.output_queue.put((STREAM_END, None))
+
+
+class CrawlerPool:
+    """
+    A pool of long-lived worker processes that crawl queries from a job queue.
+    ...
+
+    Each worker installs the Twisted reactor once and keeps it running, so a
+    query only pays for its own downloads instead of interpreter and reactor
+    start-up.
+
+    Attributes
+    ----------
+    workers : int
+        number of worker processes
+    proxies : dict
+        dictionary that contains proxy related information, shared by all jobs
+    jobs_per_worker : int
+        number of queries a single worker crawls at the same time
+    options : dict
+        other `Crawler` keyword arguments used for every job (profile, raw_response, ...)
+
+    Methods
+    -------
+    submit(query, **options)
+        Queue a query and return a Future with its data
+    crawl(query, timeout=None)
+        Crawl a query and block until its data is available
+    map(queries, timeout=None)
+        Crawl many queries and return their data in the same order
+    close(wait=True)
+        Stop the workers once the queued jobs are done
+    terminate()
+        Kill the workers, the jobs not done yet fail
+    """
+
+    def __init__(self, workers=2, proxies={}, jobs_per_worker=1, **options):
+        """
+        Args:
+            workers (int, optional): number of worker processes. Defaults to 2.
+            proxies (dict, optional): same format as `Crawler`. Defaults to {}.
+            jobs_per_worker (int, optional): concurrent queries per worker. Defaults to 1.
+            **options: other `Crawler` keyword arguments, e.g. profile="bulk".
+        """
+        self.workers = workers
+        self.proxies = proxies
+        self.jobs_per_worker = jobs_per_worker
+        self.options = options
+        self._job_queue = None
+        self._result_queue = None
+        self._processes = []
+        self._pending = {}
+        self._assigned = {}
+        self._next_job_id = 0
+        self._lock = threading.Lock()
+        self._collector = None
+        self._closing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def start(self):
+        """Start the worker processes, called automatically on first submit"""
+        if self._processes:
+            return
+        self._job_queue = Queue()
+        self._result_queue = Queue()
+        for _ in range(self.workers):
+            self._spawn_worker()
+        self._collector = threading.Thread(target=self._collect_results, daemon=True)
+        self._collector.start()
+
+    def submit(self, query, **options) -> Future:
+        """Queue a query for crawling
+
+        Args:
+            query (dict): same format as the `Crawler` query
+            **options: `Crawler` keyword arguments of this query only, over the ones\n
+                of the pool, e.g. job_id="daily-2023-03-01".
+
+        Returns:
+            Future: resolves to the list of data, or raises CrawlerError
+        """
+        if self._closing:
+            raise RuntimeError("CrawlerPool is closed")
+        self.start()
+        future = Future()
+        with self._lock:
+            job_id = self._next_job_id
+            self._next_job_id += 1
+            self._pending[job_id] = future
+        self._job_queue.put((job_id, query, options))
+        return future
+
+    def crawl(self, query, timeout=None) -> list[dict]:
+        return self.submit(query).result(timeout)
+
+    def map(self, queries, timeout=None) -> list[list[dict]]:
+        futures = [self.submit(query) for query in queries]
+        return [future.result(timeout) for future in futures]
+
+    def close(self, wait=True):
+        """Stop the workers after the already queued jobs have finished
+
+        Args:
+            wait (bool, optional): block until the workers have exited. Defaults to True.
+        """
+        if self._closing or not self._processes:
+            return
+        self._closing = True
+        for _ in self._processes:
+            self._job_queue.put(None)
+        if wait:
+            for process in self._processes:
+                process.join()
+            self._collector.join()
+
+    def terminate(self):
+        """Kill the workers at once, the jobs not done yet fail with CrawlerError"""
+        if self._closing or not self._processes:
+            return
+        self._closing = True
+        # the queued jobs are never read, they must not hold up the exit of this process
+        self._job_queue.cancel_join_thread()
+        for process in self._processes:
+            process.kill()
+        for process in self._processes:
+            process.join()
+        self._collector.join()
+        with self._lock:
+            futures = list(self._pending.values())
+            self._pending.clear()
+            self._assigned.clear()
+        for future in futures:
+            future.set_exception(CrawlerError("CrawlerPool was terminated"))
+
+    def _spawn_worker(self):
+        process = Process(
+            target=_pool_worker,
+            args=(
+                self._job_queue, self._result_queue,
+                self.proxies, self.jobs_per_worker, self.options,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self._processes.append(process)
+
+    def _collect_results(self):
+        while True:
+            try:
+                job_id, kind, payload = self._result_queue.get(timeout=0.5)
+            except Empty:
+                if self._check_workers():
+                    return
+                continue
+            with self._lock:
+                if kind == "started":
+                    self._assigned[job_id] = payload
+                    continue
+                future = self._pending.pop(job_id, None)
+                self._assigned.pop(job_id, None)
+            if future is None:
+                continue
+            if kind == "result":
+                future.set_result(payload)
+            else:
+                future.set_exception(CrawlerError(payload))
+
+    def _check_workers(self) -> bool:
+        """Fail the jobs of dead workers and replace them
+
+        Returns:
+            bool: True once every worker has exited after close()
+        """
+        for process in list(self._processes):
+            if process.is_alive():
+                continue
+            if self._closing:
+                continue
+            self._processes.remove(process)
+            with self._lock:
+                lost = [
+                    job_id for job_id, pid in self._assigned.items() if pid == process.pid
+                ]
+                futures = [self._pending.pop(job_id) for job_id in lost]
+                for job_id in lost:
+                    del self._assigned[job_id]
+            for future in futures:
+                future.set_exception(
+                    CrawlerError(f"Worker exited with code {process.exitcode}")
+                )
+            self._spawn_worker()
+        return self._closing and not any(p.is_alive() for p in self._processes)
+
+
+class AsyncCrawler:
+    """
+    A class used to crawl the sitemap and article data from asyncio code.
+    ...
+
+    The spiders run on the AsyncioSelectorReactor (see TWISTED_REACTOR in
+    settings.py) installed over the caller's event loop, so no process or
+    thread is started and many queries can be crawled concurrently on the
+    same loop.
+
+    Attributes
+    ----------
+    proxies : dict
+        dictionary that contains proxy related information, shared by all queries
+    options : dict
+        other `Crawler` keyword arguments used for every query (profile, raw_response, ...)
+
+    Methods
+    -------
+    crawl(query)
+        Coroutine that crawls a query and returns the final data
+    stream(query)
+        Async iterator over every article or sitemap entry as soon as it is parsed
+    close()
+        Coroutine that waits for the running crawls and releases the reactor threads
+    """
+
+    def __init__(self, proxies={}, **options):
+        """
+        Args:
+            proxies (dict, optional): same format as `Crawler`. Defaults to {}.
+            **options: other `Crawler` keyword arguments, e.g. profile="bulk".
+        """
+        self.proxies = proxies
+        self.options = options
+        self._running = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def crawl(self, query) -> list[dict]:
+        """Crawls a query on the running event loop
+
+        Args:
+            query (dict): same format as the `Crawler` query
+
+        Raises:
+            CrawlerError: the crawl failed
+
+        Returns:
+            list[dict]: same data as `Crawler.crawl()`
+        """
+        output = []
+        deferred = self._schedule(query, output.append)
+        await self._wait(deferred)
+        return output[0] if output else []
+
+    async def stream(self, query):
+        """Crawls a query on the running event loop and yields the data one record at a time
+
+        Args:
+            query (dict): same format as the `Crawler` query
+
+        Raises:
+            CrawlerError: the crawl failed
+
+        Yields:
+            dict: article data or article link, per link result for "articles"
+        """
+        records = asyncio.Queue()
+        streamed = []
+
+        def on_item(record):
+            streamed.append(True)
+            records.put_nowait((STREAM_ITEM, record))
+
+        def callback(data):
+            # Same as ItemStream.callback, spiders that only hand over their
+            # final list are streamed from it.
+            if not streamed:
+                for record in data:
+                    records.put_nowait((STREAM_ITEM, record))
+
+        deferred = self._schedule(query, callback, on_item)
+        deferred.addCallbacks(
+            lambda _: records.put_nowait((STREAM_END, None)),
+            lambda failure: records.put_nowait((STREAM_ERROR, failure.getTraceback())),
+        )
+        while True:
+            kind, payload = await records.get()
+            if kind == STREAM_END:
+                return
+            if kind == STREAM_ERROR:
+                raise CrawlerError(payload)
+            yield payload
+
+    async def close(self):
+        """Wait for the running crawls, then stop the reactor thread pool (used for DNS lookups)
+
+        Its threads are not daemonic and would otherwise keep the interpreter
+        alive after the event loop is closed. The pool is created again by the
+        next crawl.
+        """
+        from twisted.internet import defer, reactor
+
+        if self._running:
+            await defer.DeferredList(list(self._running)).asFuture(
+                asyncio.get_running_loop()
             )
-            process_settings["HTTP_PROXY_USER"] = self.proxies["proxyUsername"]
-            process_settings["HTTP_PROXY_PASS"] = self.proxies["proxyPassword"]
-            process.settings = process_settings
+        if reactor.threadpool is not None and not _running_async_crawls:
+            reactor._stopThreadPool()
+
+    def _schedule(self, query, callback, on_item=None):
+        _start_asyncio_reactor(asyncio.get_running_loop())
+        crawler = Crawler(query=query, proxies=self.proxies, **self.options)
+        settings = project_settings()
+        crawler.apply_settings(settings)
+        try:
+            deferred = crawler.schedule(CrawlerRunner(settings), callback, on_item)
+        except Exception as exception:
+            raise CrawlerError(f"{type(exception).__name__}: {exception}") from exception
+
+        def finished(result):
+            self._running.discard(deferred)
+            _running_async_crawls.discard(deferred)
+            return result
 
-        # TODO: Change path and spider name here
-        process.crawl(NTvSpider, **spider_args)
+        self._running.add(deferred)
+        _running_async_crawls.add(deferred)
+        deferred.addBoth(finished)
+        return deferred
+
+    async def _wait(self, deferred):
+        try:
+            await deferred.asFuture(asyncio.get_running_loop())
+        except Exception as exception:
+            raise CrawlerError(f"{type(exception).__name__}: {exception}") from exception
+
+
+class CrawlScheduler:
+    """
+    A class used to crawl many sites in one process under shared limits.
+    ...
+
+    All the jobs run at the same time on one reactor. Their requests share a
+    global concurrency budget split fairly between domains, a per-domain delay,
+    and the robots.txt of every domain (see middlewares.FairShareMiddleware).
+    Requests of pages with a recent "lastmod" meta are downloaded first.
+
+    Attributes
+    ----------
+    jobs : list[dict]
+        queries in the `Crawler` query format, e.g. {"type": "sitemap", "domain": ..., "since": ..., "until": ...}
+    concurrency : int
+        maximum number of requests downloading at the same time, all jobs together
+    per_domain : int
+        maximum number of requests downloading at the same time from one domain
+    delay : float
+        minimum seconds between two requests to the same domain
+    obey_robots : bool
+        skip the pages forbidden by the robots.txt of their domain
+    proxies : dict | list
+        dictionary that contains proxy related information, shared by all jobs
+    options : dict
+        other `Crawler` keyword arguments used for every job (raw_response, sink, ...)
+
+    Methods
+    -------
+    crawl()
+        Crawls all the jobs and returns their results in the order of the jobs
+    """
+
+    def __init__(
+        self, jobs, concurrency=16, per_domain=4, delay=0.25, obey_robots=True, proxies={}, **options
+    ):
+        """
+        Args:
+            jobs (list[dict]): queries in the `Crawler` query format
+            concurrency (int, optional): global concurrent requests. Defaults to 16.
+            per_domain (int, optional): concurrent requests per domain. Defaults to 4.
+            delay (float, optional): seconds between requests to a domain. Defaults to 0.25.
+            obey_robots (bool, optional): obey robots.txt. Defaults to True.
+            proxies (dict | list, optional): same format as `Crawler`. Defaults to {}.
+            **options: other `Crawler` keyword arguments, e.g. raw_response="gzip".
+        """
+        self.jobs = jobs
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.delay = delay
+        self.obey_robots = obey_robots
+        self.proxies = proxies
+        self.options = options
+
+    def crawl(self) -> list[dict]:
+        """Crawls all the jobs
+
+        Returns:
+            list[dict]: {"job": job, "data": list of data, "error": None or message}
+            for every job, in the order of `jobs`. A failing job does not stop the others.
+        """
+        results = [{"job": job, "data": [], "error": None} for job in self.jobs]
+        output_queue = Queue()
+        process = Process(target=self.run_jobs, args=(output_queue,))
         process.start()
+        remaining = len(self.jobs)
+        while remaining:
+            try:
+                index, kind, payload = output_queue.get(timeout=1)
+            except Empty:
+                if process.is_alive():
+                    continue
+                for result in results:
+                    if result["error"] is None and not result["data"]:
+                        result["error"] = f"Crawler process exited with code {process.exitcode}"
+                break
+            remaining -= 1
+            if kind == "result":
+                results[index]["data"] = payload
+            else:
+                results[index]["error"] = payload
+        process.join()
+        return results
+
+    def apply_settings(self, settings):
+        """Replace the per-crawl throttling of `settings` by the shared budget"""
+        settings["FAIR_SHARE_CONCURRENCY"] = self.concurrency
+        settings["FAIR_SHARE_PER_DOMAIN"] = self.per_domain
+        settings["FAIR_SHARE_DELAY"] = self.delay
+        settings["CONCURRENT_REQUESTS"] = self.concurrency
+        settings["CONCURRENT_REQUESTS_PER_DOMAIN"] = self.per_domain
+        settings["CONCURRENT_REQUESTS_PER_IP"] = 0
+        settings["DOWNLOAD_DELAY"] = 0
+        settings["AUTOTHROTTLE_ENABLED"] = False
+        settings["LATENCY_THROTTLE_ENABLED"] = False
+        settings["DOWNLOADER_MIDDLEWARES"]["newton_scrapping.middlewares.FairShareMiddleware"] = 995
+        settings["SPIDER_MIDDLEWARES"]["newton_scrapping.middlewares.FreshnessPriorityMiddleware"] = 960
+        settings["ROBOTSTXT_OBEY"] = self.obey_robots
+        settings["DOWNLOADER_MIDDLEWARES"][
+            "scrapy.downloadermiddlewares.robotstxt.RobotsTxtMiddleware"
+        ] = None
+        settings["DOWNLOADER_MIDDLEWARES"]["newton_scrapping.middlewares.SharedRobotsTxtMiddleware"] = 100
+
+    def run_jobs(self, output_queue):
+        """Child process target of crawl(), sends (index, "result" | "error", payload) for every job"""
+        reactor_path = project_settings()["TWISTED_REACTOR"]
+        if reactor_path:
+            install_reactor(reactor_path)
+        from twisted.internet import defer, reactor
+
+        def run_job(index, job):
+            delivered = []
+
+            def deliver(data):
+                if not delivered:
+                    delivered.append(True)
+                    output_queue.put((index, "result", data))
+
+            def finish(result):
+                if not delivered:
+                    if isinstance(result, Failure):
+                        delivered.append(True)
+                        output_queue.put((index, "error", result.getTraceback()))
+                    else:
+                        deliver([])
+
+            try:
+                crawler = Crawler(query=job, proxies=self.proxies, **self.options)
+                settings = project_settings()
+                crawler.apply_settings(settings)
+                self.apply_settings(settings)
+                deferred = crawler.schedule(CrawlerRunner(settings), deliver)
+            except Exception:
+                output_queue.put((index, "error", traceback.format_exc()))
+                return defer.succeed(None)
+            return deferred.addBoth(finish)
+
+        def start():
+            deferreds = [run_job(index, job) for index, job in enumerate(self.jobs)]
+            defer.DeferredList(deferreds).addBoth(lambda _: reactor.stop())
+
+        reactor.callWhenRunning(start)
+        reactor.run(installSignalHandlers=False)
+
+
+# crawls of every AsyncCrawler, they all share the reactor thread pool
+_running_async_crawls = set()
+
+
+def _start_asyncio_reactor(loop):
+    """Install the asyncio reactor over `loop` and mark it as running
+
+    The loop is already running and is driven by its owner, so the reactor is
+    only started (startup triggers fired) and never run or stopped here.
+    """
+    if "twisted.internet.reactor" not in sys.modules:
+        asyncioreactor.install(eventloop=loop)
+    from twisted.internet import reactor
+
+    if getattr(reactor, "_asyncioEventloop", None) is not loop:
+        raise CrawlerError(
+            "AsyncCrawler needs the AsyncioSelectorReactor installed on the running event loop"
+        )
+    if not reactor.running:
+        reactor.startRunning(installSignalHandlers=False)
+
+
+def _pool_worker(job_queue, result_queue, proxies, jobs_per_worker, options):
+    """Worker process entry point of CrawlerPool
+
+    Installs the reactor once, then starts a crawl on it for every job read
+    from `job_queue` until a None sentinel is received.
+    """
+    reactor_path = project_settings()["TWISTED_REACTOR"]
+    if reactor_path:
+        install_reactor(reactor_path)
+    from twisted.internet import defer, reactor
+
+    pid = os.getpid()
+    slots = threading.BoundedSemaphore(jobs_per_worker)
+    running = set()
+
+    def run_job(job_id, query, job_options):
+        delivered = []
+
+        def deliver(data):
+            if not delivered:
+                delivered.append(True)
+                result_queue.put((job_id, "result", data))
+
+        def finish(result):
+            running.discard(deferred)
+            if not delivered:
+                if isinstance(result, Failure):
+                    result_queue.put((job_id, "error", result.getTraceback()))
+                else:
+                    deliver([])
+            slots.release()
+
+        result_queue.put((job_id, "started", pid))
+        try:
+            crawler = Crawler(query=query, proxies=proxies, **{**options, **job_options})
+            settings = project_settings()
+            crawler.apply_settings(settings)
+            deferred = crawler.schedule(CrawlerRunner(settings), deliver)
+        except Exception:
+            result_queue.put((job_id, "error", traceback.format_exc()))
+            slots.release()
+            return
+        running.add(deferred)
+        deferred.addBoth(finish)
+
+    def shutdown():
+        defer.DeferredList(list(running)).addBoth(lambda _: reactor.stop())
+
+    def read_jobs():
+        while True:
+            slots.acquire()
+            job = job_queue.get()
+            if job is None:
+                reactor.callFromThread(shutdown)
+                return
+            reactor.callFromThread(run_job, *job)
+
+    threading.Thread(target=read_jobs, daemon=True).start()
+    reactor.run(installSignalHandlers=False)
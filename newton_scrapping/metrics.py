@@ -0,0 +1,209 @@
+"""Crawl instrumentation: histograms, Prometheus export and a timed DNS resolver"""
+
+import bisect
+import os
+import threading
+import time
+import weakref
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scrapy.resolver import CachingThreadedResolver, dnscache
+
+# upper bounds of the buckets, in seconds for the *_seconds histograms
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 131072, 262144, 524288, 1048576, 4194304, 16777216,
+)
+
+_registries = weakref.WeakKeyDictionary()
+
+
+class Histogram:
+    """Counts of observed values per bucket, Prometheus style"""
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower = self.buckets[index - 1] if index else self.min
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+    def to_dict(self) -> dict:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count, "sum": self.sum, "min": self.min, "max": self.max,
+            "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """Histograms of one crawl, by metric name and label value
+
+    Every metric has a single label, e.g. the domain of the request or the
+    name of the spider callback.
+    """
+
+    # metric name: (label name, buckets)
+    METRICS = {
+        "dns_seconds": ("host", TIME_BUCKETS),
+        "queue_seconds": ("domain", TIME_BUCKETS),
+        "download_latency_seconds": ("domain", TIME_BUCKETS),
+        "download_seconds": ("domain", TIME_BUCKETS),
+        "request_bytes": ("domain", SIZE_BUCKETS),
+        "response_bytes": ("domain", SIZE_BUCKETS),
+        "parse_seconds": ("callback", TIME_BUCKETS),
+        "worker_parse_seconds": ("spider", TIME_BUCKETS),
+        "pipeline_seconds": ("spider", TIME_BUCKETS),
+    }
+
+    def __init__(self):
+        self.histograms = {name: {} for name in self.METRICS}
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, label: str, value: float):
+        with self.lock:
+            histograms = self.histograms[name]
+            if label not in histograms:
+                histograms[label] = Histogram(self.METRICS[name][1])
+            histograms[label].observe(value)
+
+    def to_dict(self) -> dict:
+        """Return {metric name: {label value: histogram summary}}"""
+        with self.lock:
+            return {
+                name: {label: histogram.to_dict() for label, histogram in histograms.items()}
+                for name, histograms in self.histograms.items()
+            }
+
+    def to_prometheus(self, prefix: str = "newton_scrapping") -> str:
+        """Return the histograms in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            for name, histograms in self.histograms.items():
+                label_name = self.METRICS[name][0]
+                metric = f"{prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for label, histogram in sorted(histograms.items()):
+                    value = label.replace("\\", "\\\\").replace('"', '\\"')
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{metric}_bucket{{{label_name}="{value}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{label_name}="{value}"}} {histogram.sum}')
+                    lines.append(f'{metric}_count{{{label_name}="{value}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write the Prometheus text file atomically, e.g. for the node_exporter textfile collector"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(path + ".tmp", path)
+
+
+def metrics_for(crawler) -> MetricsRegistry:
+    """Return the MetricsRegistry of a scrapy crawler, created on first use"""
+    if crawler not in _registries:
+        _registries[crawler] = MetricsRegistry()
+    return _registries[crawler]
+
+
+class MetricsServer:
+    """Serves the Prometheus text of a registry on http://host:port/metrics while a crawl runs"""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "127.0.0.1"):
+        self.registry = registry
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class InstrumentedResolver(CachingThreadedResolver):
+    """Scrapy's default resolver, recording the time of every uncached lookup in `dns_seconds`
+
+    The resolver is installed once per reactor by CrawlerProcess, so the
+    lookups are recorded in the registry of the CrawlerProcess, not of a crawler.
+    """
+
+    @classmethod
+    def from_crawler(cls, crawler, reactor):
+        resolver = super().from_crawler(crawler, reactor)
+        resolver.metrics = metrics_for(crawler)
+        return resolver
+
+    def getHostByName(self, name, timeout=()):
+        if name in dnscache:
+            return super().getHostByName(name, timeout)
+        started = time.perf_counter()
+
+        def observe(result):
+            self.metrics.observe("dns_seconds", name, time.perf_counter() - started)
+            return result
+
+        return super().getHostByName(name, timeout).addBoth(observe)
@@ -3,11 +3,302 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import json
+import logging
+import os
+import socket
+import sqlite3
+
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet import defer, task
+from twisted.internet.threads import deferToThread
+from twisted.python.failure import Failure
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
 
+from newton_scrapping.dedup import SIMHASH_BANDS, STRIP_PARAMS, DedupIndex, item_url, normalize_url, simhash
+from newton_scrapping.export import ArrowSink, ParquetSink
+from newton_scrapping.utils import compact_raw_response
+
+logger = logging.getLogger(__name__)
+
 
 class NewtonScrappingPipeline:
     def process_item(self, item, spider):
         return item
+
+
+class JsonLinesSink:
+    """Appends items to a JSON lines file"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, items):
+        self.file.write(
+            "".join(json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in items)
+        )
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteSink:
+    """Inserts items as JSON documents into the `items` table of a SQLite file"""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # writes happen in the reactor thread pool, one batch at a time
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+        )
+
+    def write(self, items):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO items (data) VALUES (?)",
+                [(json.dumps(item, ensure_ascii=False, default=str),) for item in items],
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+class UnixSocketSink:
+    """Sends items as JSON lines to a listening Unix socket"""
+
+    def __init__(self, path):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+
+    def write(self, items):
+        self.socket.sendall(
+            "".join(json.dumps(item, ensure_ascii=False, default=str) + "\n" for item in items)
+            .encode("utf-8")
+        )
+
+    def close(self):
+        self.socket.close()
+
+
+SINKS = {
+    "jsonl": JsonLinesSink,
+    "sqlite": SQLiteSink,
+    "unix": UnixSocketSink,
+    "parquet": ParquetSink,
+    "arrow": ArrowSink,
+}
+
+
+def open_sink(uri, blob_dir=None, **options):
+    """Open the sink of an ITEM_SINK uri
+
+    Args:
+        uri (str): "<kind>:<path>", e.g. "jsonl:output/items.jsonl",
+            "sqlite:output/items.sqlite3", "unix:/run/newton/items.sock",
+            "parquet:output/articles.parquet" or "arrow:output/articles.arrow"
+        blob_dir (str, optional): RAW_BLOB_DIR, where the parquet and arrow sinks
+            read the raw_response="blob" files back. Defaults to None.
+        **options: ITEM_SINK_OPTIONS, keyword arguments of the sink, e.g.
+            row_group_size and raw_html of the parquet and arrow sinks
+
+    Raises:
+        Exception: Raised exception for unknown sink kind
+
+    Returns:
+        sink with write(items) and close() methods
+    """
+    kind, _, path = uri.partition(":")
+    if kind not in SINKS or not path:
+        raise Exception(f"Invalid Sink: {uri}")
+    if blob_dir and kind in ("parquet", "arrow"):
+        options = {"blob_dir": blob_dir, **options}
+    return SINKS[kind](path, **options)
+
+
+class BatchingPipeline:
+    """Buffers items and writes them to the ITEM_SINK in batches
+
+    A batch is written when ITEM_BATCH_SIZE items are buffered or every
+    ITEM_BATCH_INTERVAL seconds, in the reactor thread pool and one batch
+    at a time so the sink keeps the order of the items. Once
+    ITEM_BATCH_MAX_PENDING items are buffered or being written, the buffer
+    is written at once and process_item waits for the writes, which slows
+    the spider down instead of growing the buffer. The raw_response of the items is
+    written as per RAW_RESPONSE_MODE, see utils.compact_raw_response, the
+    parquet and arrow sinks find the blob files in RAW_BLOB_DIR.
+    """
+
+    def __init__(
+        self, sink_uri, batch_size, interval, max_pending, raw_response_mode="full", blob_dir="raw_blobs",
+        sink_options=None,
+    ):
+        self.sink_uri = sink_uri
+        self.sink_options = sink_options or {}
+        self.raw_response_mode = raw_response_mode
+        self.blob_dir = blob_dir
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.sink = None
+        self.buffer = []
+        self.writing = 0
+        self.last_write = defer.succeed(None)
+        self.timer = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.get("ITEM_SINK"):
+            raise NotConfigured
+        return cls(
+            settings.get("ITEM_SINK"),
+            settings.getint("ITEM_BATCH_SIZE", 100),
+            settings.getfloat("ITEM_BATCH_INTERVAL", 5.0),
+            settings.getint("ITEM_BATCH_MAX_PENDING", 1000),
+            settings.get("RAW_RESPONSE_MODE", "full"),
+            settings.get("RAW_BLOB_DIR", "raw_blobs"),
+            settings.getdict("ITEM_SINK_OPTIONS"),
+        )
+
+    def open_spider(self, spider):
+        self.sink = open_sink(self.sink_uri, self.blob_dir, **self.sink_options)
+        self.timer = task.LoopingCall(self.flush)
+        self.timer.start(self.interval, now=False)
+
+    def process_item(self, item, spider):
+        self.buffer.append(
+            compact_raw_response(ItemAdapter(item).asdict(), self.raw_response_mode, self.blob_dir)
+        )
+        pending = len(self.buffer) + self.writing
+        if len(self.buffer) >= self.batch_size or pending >= self.max_pending:
+            self.flush()
+        if pending >= self.max_pending:
+            waiting = defer.Deferred()
+            self.last_write.addBoth(lambda result: waiting.callback(item) or result)
+            return waiting
+        return item
+
+    def flush(self):
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        self.writing += len(batch)
+
+        def write(_):
+            return deferToThread(self.sink.write, batch)
+
+        def written(result):
+            self.writing -= len(batch)
+            if isinstance(result, Failure):
+                # keep the chain alive for the next batches
+                logger.error(
+                    "Failed to write %d items to %s: %s",
+                    len(batch), self.sink_uri, result.getErrorMessage(),
+                )
+
+        self.last_write = self.last_write.addCallback(write).addBoth(written)
+
+    def close_spider(self, spider):
+        if self.timer and self.timer.running:
+            self.timer.stop()
+        self.flush()
+        return self.last_write.addBoth(lambda result: self.sink.close() or result)
+
+
+class DedupPipeline:
+    """Drops the articles already emitted by this or a previous run
+
+    An article is a duplicate when its normalized URL (see dedup.normalize_url)
+    is indexed, or when the SimHash of its parsed_data text is within
+    DEDUP_SIMHASH_DISTANCE bits of an indexed one (at most SIMHASH_BANDS - 1,
+    the distance the band lookup of DedupIndex finds), e.g. the same story under
+    another category path. The URL an article was downloaded from, its own
+    URL and the URLs of its duplicates are all merged into one indexed
+    article, so the next runs filter their requests before downloading them
+    (see dedup.CanonicalDupeFilter). Items without parsed_data, e.g. sitemap
+    entries, are passed through.
+    """
+
+    def __init__(self, index_path, max_entries=1000000, distance=3, strip_params=STRIP_PARAMS, stats=None):
+        self.index_path = index_path
+        self.max_entries = max_entries
+        self.distance = distance
+        self.strip_params = strip_params
+        self.stats = stats
+        self.index = None
+        # {id(item): indexed article}, until the item is scraped or dropped
+        self.documents = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.get("DEDUP_INDEX_PATH"):
+            raise NotConfigured
+        distance = settings.getint("DEDUP_SIMHASH_DISTANCE", 3)
+        if not 0 <= distance < SIMHASH_BANDS:
+            raise Exception(f"Invalid DEDUP_SIMHASH_DISTANCE: {distance}, must be between 0 and {SIMHASH_BANDS - 1}")
+        pipeline = cls(
+            settings.get("DEDUP_INDEX_PATH"),
+            settings.getint("DEDUP_INDEX_MAX_ENTRIES", 1000000),
+            distance,
+            STRIP_PARAMS | {name.lower() for name in settings.getlist("DEDUP_STRIP_PARAMS")},
+            crawler.stats,
+        )
+        crawler.signals.connect(pipeline.index_response_urls, signal=signals.item_scraped)
+        crawler.signals.connect(pipeline.index_response_urls, signal=signals.item_dropped)
+        return pipeline
+
+    def open_spider(self, spider):
+        self.index = DedupIndex(self.index_path, self.max_entries)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        parsed_data = adapter.get("parsed_data")
+        if not parsed_data:
+            return item
+
+        url = item_url(adapter)
+        urls = [normalize_url(url, self.strip_params)] if url else []
+        document = self.index.find_url(urls[0]) if urls else None
+        if document is not None:
+            self.documents[id(item)] = document
+            self.inc_stats("dedup/url_duplicates")
+            raise DropItem(f"Duplicate article {url}")
+
+        fingerprint = simhash(" ".join(str(text) for text in parsed_data.get("text") or []))
+        if fingerprint is not None:
+            document = self.index.find_similar(fingerprint, self.distance)
+            if document is not None:
+                self.index.add_urls(document, urls)
+                self.documents[id(item)] = document
+                self.inc_stats("dedup/near_duplicates")
+                raise DropItem(f"Near duplicate article {url}")
+
+        self.documents[id(item)] = self.index.add(urls, fingerprint)
+        self.inc_stats("dedup/articles")
+        return item
+
+    def index_response_urls(self, item, response):
+        """Merge the URL an article was downloaded (or redirected) from into its indexed article"""
+        document = self.documents.pop(id(item), None)
+        if document is None or response is None:
+            return
+        urls = [response.url] + response.meta.get("redirect_urls", [])
+        self.index.add_urls(document, {normalize_url(url, self.strip_params) for url in urls})
+
+    def inc_stats(self, key):
+        if self.stats:
+            self.stats.inc_value(key)
+
+    def close_spider(self, spider):
+        self.index.close()
@@ -0,0 +1,64 @@
+"""Named throughput profiles for the Crawler
+
+A profile is a group of scrapy settings that are applied together, so the
+concurrency, per-domain limits, delay and throttling of a crawl stay
+consistent with each other.
+"""
+
+PROFILES = {
+    # Behaviour of the Crawler before profiles existed, one request every 0.25s per domain.
+    "default": {
+        "DOWNLOAD_DELAY": 0.25,
+    },
+    # Sites that block easily, AutoThrottle keeps about one request in flight per domain.
+    "polite": {
+        "DOWNLOAD_DELAY": 1.0,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 2,
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_START_DELAY": 1.0,
+        "AUTOTHROTTLE_MAX_DELAY": 30.0,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 1.0,
+    },
+    # Daily sitemap and article crawls.
+    "balanced": {
+        "DOWNLOAD_DELAY": 0,
+        "CONCURRENT_REQUESTS": 32,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 8,
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_START_DELAY": 0.25,
+        "AUTOTHROTTLE_MAX_DELAY": 10.0,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 4.0,
+    },
+    # Backfills, concurrency starts at 8 per domain and is raised by
+    # LatencyFeedbackThrottle as long as the response times stay flat.
+    "bulk": {
+        "DOWNLOAD_DELAY": 0,
+        "CONCURRENT_REQUESTS": 128,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 8,
+        "AUTOTHROTTLE_ENABLED": False,
+        "LATENCY_THROTTLE_ENABLED": True,
+        "LATENCY_THROTTLE_MIN_CONCURRENCY": 2,
+        "LATENCY_THROTTLE_MAX_CONCURRENCY": 64,
+        "REACTOR_THREADPOOL_MAXSIZE": 20,
+    },
+}
+
+
+def get_profile(profile) -> dict:
+    """Return the settings of a throughput profile
+
+    Args:
+        profile (str | dict): name of one of PROFILES, or a dict of scrapy settings
+            which is applied on top of the "default" profile
+
+    Raises:
+        Exception: Raised exception for unknown profile name
+
+    Returns:
+        dict: scrapy settings of the profile
+    """
+    if isinstance(profile, dict):
+        return {**PROFILES["default"], **profile}
+    if profile not in PROFILES:
+        raise Exception(f"Invalid Profile: {profile}")
+    return dict(PROFILES[profile])
@@ -0,0 +1,72 @@
+"""Spider registry, keyed by the domain of the website each spider crawls"""
+
+import importlib
+from urllib.parse import urlparse
+
+# TODO: Add the domain and the dotted path of every spider here
+SPIDERS = {
+    "sueddeutsche.de": "crwsueddeutsche.spiders.sueddeutsche.SueddeutscheSpider",
+}
+# spider of the queries without a domain or whose domain is not registered, None to refuse them
+# TODO: Change path and spider name here
+DEFAULT_SPIDER = "crwsueddeutsche.spiders.sueddeutsche.SueddeutscheSpider"
+
+_loaded = {}
+
+
+def register_spider(domain: str, spider: str):
+    """Register the spider of a domain
+
+    Args:
+        domain (str): domain or URL of the website, e.g. "example.com", subdomains included
+        spider (str): dotted path of the spider class, imported on first use
+    """
+    SPIDERS[_normalize(domain)] = spider
+
+
+def _normalize(domain: str) -> str:
+    host = urlparse(domain).hostname if "//" in domain else domain.split("/")[0].split(":")[0]
+    host = (host or "").lower().rstrip(".")
+    return host[4:] if host.startswith("www.") else host
+
+
+def query_domain(query: dict) -> str:
+    """Return the domain of a query, from its "domain", "link" or first of its "links"
+
+    Returns:
+        str: e.g. "example.com", None if the query has no domain
+    """
+    url = query.get("domain") or query.get("link") or next(iter(query.get("links") or []), None)
+    return _normalize(url) if url else None
+
+
+def spider_path(query: dict) -> str:
+    """Return the dotted path of the spider of a query, without importing it
+
+    The most specific registered domain wins, so "news.example.com" can have
+    its own spider while other subdomains use the one of "example.com".
+
+    Raises:
+        Exception: Raised exception when no spider is registered for the domain
+    """
+    domain = query_domain(query)
+    while domain:
+        if domain in SPIDERS:
+            return SPIDERS[domain]
+        domain = domain.partition(".")[2]
+    if DEFAULT_SPIDER:
+        return DEFAULT_SPIDER
+    raise Exception(f"No spider registered for domain: {query_domain(query)}")
+
+
+def load_spider(path: str):
+    """Return a spider class from its dotted path, e.g. "package.spiders.module.Spider", importing it on first use"""
+    if path not in _loaded:
+        module_name, _, class_name = path.rpartition(".")
+        _loaded[path] = getattr(importlib.import_module(module_name), class_name)
+    return _loaded[path]
+
+
+def get_spider(query: dict):
+    """Return the spider class of a query, importing its module on first use"""
+    return load_spider(spider_path(query))
@@ -0,0 +1,327 @@
+"""Streaming sitemap parsing and incremental sitemap crawling state"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import zlib
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from lxml import etree
+
+from newton_scrapping.items import NewtonScrappingLinkItem
+
+GZIP_MAGIC = b"\x1f\x8b"
+# bytes handed to the XML parser at once when parsing a complete body
+PARSE_CHUNK_SIZE = 65536
+
+
+def url_fingerprint(url: str) -> int:
+    """Return a signed 64 bit fingerprint of an URL, stored instead of the URL itself
+
+    Args:
+        url (str): article link
+
+    Returns:
+        int: fingerprint that fits in a SQLite INTEGER
+    """
+    digest = hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def parse_date(value: str):
+    """Return a UTC datetime from an ISO 8601 or RFC 2822 date, None when it is neither
+
+    Dates without a timezone are taken as UTC.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed is None:
+        return None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _utc_lastmod(value):
+    # "lastmod" as a UTC ISO 8601 timestamp, comparable as a string; None when it is not a date
+    parsed = parse_date(value)
+    return parsed.isoformat() if parsed else None
+
+
+def _localname(tag) -> str:
+    return tag.rpartition("}")[2] if isinstance(tag, str) else ""
+
+
+class SitemapStreamParser:
+    """
+    Incremental parser of sitemaps and sitemap indexes, fed with raw bytes.
+    ...
+
+    Gzip compressed sitemaps (.xml.gz or Content-Encoding: gzip) are
+    decompressed on the fly. Every <url> element is turned into an entry as
+    soon as its closing tag is parsed and then removed from the tree, so
+    the parser does not grow with the size of the sitemap. Entries whose
+    `lastmod` (or news `publication_date`), as a UTC day, is outside
+    since/until are skipped, so are the child sitemaps of an index last
+    modified before since.
+
+    Usage:
+        parser = SitemapStreamParser(since="2023-03-01", until="2023-03-31")
+        for chunk in chunks:
+            entries = parser.feed(chunk)  # [NewtonScrappingLinkItem(link, title, lastmod), ...]
+        entries = parser.close()
+        child_sitemaps = parser.sitemaps  # [{"link", "lastmod"}, ...] of a sitemap index
+    """
+
+    def __init__(self, since: str = None, until: str = None):
+        """
+        Args:
+            since (str, optional): first day of the window, "YYYY-MM-DD". Defaults to None.
+            until (str, optional): last day of the window, "YYYY-MM-DD". Defaults to None.
+        """
+        self.since = date.fromisoformat(since[:10]) if since else None
+        self.until = date.fromisoformat(until[:10]) if until else None
+        self.sitemaps = []
+        self.count = 0
+        self.skipped = 0
+        self.head = b""
+        self.decompressor = None
+        # only the end of the <url> and <sitemap> elements come back to python
+        self.parser = etree.XMLPullParser(
+            events=("end",), tag=("{*}url", "{*}sitemap"),
+            recover=True, resolve_entities=False, no_network=True, huge_tree=True,
+        )
+
+    def feed(self, data: bytes) -> list[NewtonScrappingLinkItem]:
+        """Parse the next bytes of the sitemap and return the entries they completed"""
+        if self.head is not None:
+            # the first two bytes tell whether the body is gzip compressed
+            self.head += data
+            if len(self.head) < len(GZIP_MAGIC):
+                return []
+            data, self.head = self.head, None
+            if data.startswith(GZIP_MAGIC):
+                self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if self.decompressor:
+            data = self.decompressor.decompress(data)
+        self.parser.feed(data)
+        return self.read_events()
+
+    def close(self) -> list[NewtonScrappingLinkItem]:
+        """Parse the end of the sitemap and return the last entries"""
+        if self.head:
+            self.feed(b"")
+        if self.decompressor:
+            self.parser.feed(self.decompressor.flush())
+        entries = self.read_events()
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            # empty or truncated document, the entries read so far are kept
+            pass
+        return entries + self.read_events()
+
+    def read_events(self) -> list[NewtonScrappingLinkItem]:
+        entries = []
+        for _, element in self.parser.read_events():
+            name = _localname(element.tag)
+            fields = {}
+            for child in element.iter("{*}loc", "{*}lastmod", "{*}title", "{*}publication_date"):
+                child_name = _localname(child.tag)
+                # <image:title> and <video:title> are not the title of the article
+                if child_name in fields or child_name == "title" and _localname(child.getparent().tag) != "news":
+                    continue
+                fields[child_name] = (child.text or "").strip()
+            self.release(element)
+            link = fields.get("loc")
+            if not link:
+                continue
+            lastmod = fields.get("lastmod") or fields.get("publication_date") or None
+            # UTC day of the date, ISO 8601 or RFC 2822; undated entries are kept
+            parsed = parse_date(lastmod)
+            day = parsed.date() if parsed else None
+            if name == "sitemap":
+                if not (day and self.since and day < self.since):
+                    self.sitemaps.append({"link": link, "lastmod": lastmod})
+                continue
+            if day and ((self.since and day < self.since) or (self.until and day > self.until)):
+                self.skipped += 1
+                continue
+            self.count += 1
+            entries.append(NewtonScrappingLinkItem(link=link, title=fields.get("title"), lastmod=lastmod))
+        return entries
+
+    @staticmethod
+    def release(element):
+        element.clear(keep_tail=True)
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
+
+
+def parse_sitemap(response, since: str = None, until: str = None) -> tuple:
+    """Return the entries and child sitemaps of a sitemap response
+
+    Uses the result of StreamingSitemapMiddleware when the sitemap was parsed
+    while it was downloaded, else parses the body in chunks.
+
+    Args:
+        response (Response): sitemap or sitemap index
+        since (str, optional): first day of the window, "YYYY-MM-DD". Defaults to None.
+        until (str, optional): last day of the window, "YYYY-MM-DD". Defaults to None.
+
+    Returns:
+        tuple: (entries, sitemaps), see SitemapStreamParser
+    """
+    streamed = response.meta.get("sitemap_stream_result") if response.request is not None else None
+    if streamed is not None:
+        return streamed
+    parser = SitemapStreamParser(since, until)
+    body = memoryview(response.body)
+    entries = []
+    for start in range(0, len(body), PARSE_CHUNK_SIZE):
+        entries.extend(parser.feed(bytes(body[start:start + PARSE_CHUNK_SIZE])))
+    entries.extend(parser.close())
+    return entries, parser.sitemaps
+
+
+class SitemapState:
+    """
+    On-disk state of the incremental sitemap crawls of one domain.
+    ...
+
+    Stored in one SQLite file per domain with:
+    - the `lastmod` watermark of the last emitted link
+    - the ETag/Last-Modified validators of every child sitemap
+    - the fingerprint and `lastmod` of every emitted link
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path (str): SQLite file, created with its parent directory if missing
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS sitemaps (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT
+            );
+            CREATE TABLE IF NOT EXISTS seen (
+                fingerprint INTEGER PRIMARY KEY, lastmod TEXT
+            ) WITHOUT ROWID;
+            """
+        )
+
+    @staticmethod
+    def path_for_domain(state_dir: str, domain: str) -> str:
+        """Return the state file of a domain
+
+        Args:
+            state_dir (str): directory of the state files
+            domain (str): domain or URL of the website, e.g. "https://example.com"
+
+        Returns:
+            str: path of the SQLite file
+        """
+        netloc = urlparse(domain).netloc or domain
+        return os.path.join(state_dir, re.sub(r"[^A-Za-z0-9.-]", "_", netloc) + ".sqlite3")
+
+    @property
+    def watermark(self):
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'watermark'"
+        ).fetchone()
+        return row[0] if row else None
+
+    @watermark.setter
+    def watermark(self, value):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)", (value,)
+            )
+
+    def validators(self, url: str) -> tuple:
+        """Return the (etag, last_modified) stored for a child sitemap, (None, None) if unknown"""
+        row = self.connection.execute(
+            "SELECT etag, last_modified FROM sitemaps WHERE url = ?", (url,)
+        ).fetchone()
+        return row if row else (None, None)
+
+    def set_validators(self, validators: dict):
+        """Store the validators of child sitemaps
+
+        Args:
+            validators (dict): {url: (etag, last_modified)}
+        """
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO sitemaps (url, etag, last_modified) VALUES (?, ?, ?)",
+                [(url, etag, last_modified) for url, (etag, last_modified) in validators.items()],
+            )
+
+    def filter_new(self, entries: list[dict]) -> list[dict]:
+        """Keep the sitemap entries that are new or updated since the last run and record them
+
+        An entry is new when its link was never emitted, and updated when its
+        `lastmod` is newer than the one stored for the link. The watermark is
+        moved to the most recent `lastmod` emitted. Dates are compared and
+        stored in UTC, whatever the timezone of the sitemap.
+
+        Args:
+            entries (list[dict]): sitemap entries with "link" and optionally "lastmod"
+
+        Returns:
+            list[dict]: entries to emit
+        """
+        new_entries = []
+        seen = {}
+        watermark = _utc_lastmod(self.watermark)
+        for entry in entries:
+            fingerprint = url_fingerprint(entry["link"])
+            lastmod = _utc_lastmod(entry.get("lastmod"))
+            if fingerprint in seen:
+                stored = seen[fingerprint]
+            else:
+                row = self.connection.execute(
+                    "SELECT lastmod FROM seen WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+                # states written before the dates were normalized hold them as found in the sitemap
+                stored = _utc_lastmod(row[0]) if row else False
+            if stored is not False and (not lastmod or (stored and lastmod <= stored)):
+                continue
+            seen[fingerprint] = lastmod
+            new_entries.append(entry)
+            if lastmod and (not watermark or lastmod > watermark):
+                watermark = lastmod
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO seen (fingerprint, lastmod) VALUES (?, ?)",
+                list(seen.items()),
+            )
+            if watermark:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('watermark', ?)",
+                    (watermark,),
+                )
+        return new_entries
+
+    def close(self):
+        self.connection.close()
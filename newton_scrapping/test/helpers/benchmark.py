@@ -0,0 +1,228 @@
+"""Offline replay benchmark of the article parsing path
+
+Replays the stored fixtures through a spider's `parse` method, without network,
+and reports the parsing throughput, latency and memory usage. The pages are
+parsed in a child process, so its peak memory is the one of this parse only.
+Results can be saved as a baseline, later runs fail when they regress beyond a
+tolerance.
+
+Usage:
+    python -m newton_scrapping.test.helpers.benchmark \\
+        newton_scrapping.spiders.indian_express.IndianExpressSpider --pages 5000 --save-baseline
+"""
+
+import argparse
+import asyncio
+import gc
+import glob
+import inspect
+import json
+import os
+import resource
+import sys
+import time
+import traceback
+from multiprocessing import Process, Queue
+
+from scrapy import Request
+from scrapy.utils.spider import iterate_spider_output
+
+from newton_scrapping.registry import load_spider
+from newton_scrapping.test.helpers.constant import TEST_ARTICLES
+from newton_scrapping.test.helpers.utils import offline_response_from_fixture
+
+FIXTURE_PATTERNS = ("newton_scrapping/test/data/test_article_*.json", "Article/t-*.json")
+BASELINE_PATH = "newton_scrapping/test/data/benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.25
+
+
+def load_fixture_responses(patterns: tuple = FIXTURE_PATTERNS) -> list:
+    """Build the responses of every stored article fixture
+
+    Fixtures listed in TEST_ARTICLES get their original URL.
+
+    Args:
+        patterns (tuple, optional): glob patterns of the JSON fixtures
+
+    Returns:
+        list: TextResponse objects
+    """
+    urls = {os.path.normpath(article["test_data_path"]): article["url"] for article in TEST_ARTICLES}
+    responses = []
+    for pattern in patterns:
+        for file_name in sorted(glob.glob(pattern)):
+            url = urls.get(os.path.normpath(file_name))
+            responses.append(offline_response_from_fixture(file_name, url))
+    return responses
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _percentile(values: list, percent: float) -> float:
+    index = min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def _collect(output) -> list:
+    return [result async for result in output]
+
+
+def _parse(spider, response, loop) -> list:
+    """Run spider.parse(response) to the end, be it a function, generator, coroutine or async generator"""
+    output = spider.parse(response)
+    if inspect.isawaitable(output):
+        output = loop.run_until_complete(output)
+    if hasattr(output, "__aiter__"):
+        return loop.run_until_complete(_collect(output))
+    return list(iterate_spider_output(output))
+
+
+def run_benchmark(spidercls, responses: list, pages: int = 2000) -> dict:
+    """Parse `pages` replayed responses, cycling over the fixtures
+
+    Every page is parsed by a new spider instance and a copy of the fixture
+    response, so that no selector or spider state is reused between pages.
+    Only the `parse` call and the consumption of its output are timed; an
+    async `parse` runs on an asyncio loop, without the Twisted reactor. The
+    pages are parsed in a forked child process, whose peak RSS does not
+    include the memory used before by the caller.
+
+    Args:
+        spidercls: spider class, instantiated with type="article" and the page URL
+        responses (list): fixture responses to replay
+        pages (int, optional): number of pages to parse. Defaults to 2000.
+
+    Raises:
+        ValueError: if there is no response to replay
+        Exception: if the parse fails
+
+    Returns:
+        dict: pages, articles, seconds, articles_per_sec, p50_ms, p99_ms and peak_rss_mb
+    """
+    if not responses:
+        raise ValueError("No fixture response to replay")
+
+    output_queue = Queue()
+    process = Process(target=_replay, args=(spidercls, responses, pages, output_queue))
+    process.start()
+    result = output_queue.get()
+    process.join()
+    if isinstance(result, str):
+        raise Exception(f"Benchmark failed: {result}")
+    return result
+
+
+def _replay(spidercls, responses: list, pages: int, output_queue):
+    # child process target of run_benchmark, puts the result or the traceback of the failure
+    try:
+        output_queue.put(_measure(spidercls, responses, pages))
+    except Exception:
+        output_queue.put(traceback.format_exc())
+
+
+def _measure(spidercls, responses: list, pages: int) -> dict:
+    latencies = []
+    articles = 0
+    loop = asyncio.new_event_loop()
+    gc.collect()
+    for index in range(pages):
+        fixture = responses[index % len(responses)]
+        response = fixture.replace()
+        spider = spidercls(type="article", url=response.url)
+
+        started = time.perf_counter()
+        output = _parse(spider, response, loop)
+        latencies.append(time.perf_counter() - started)
+
+        articles += sum(1 for result in output if not isinstance(result, Request))
+    loop.close()
+
+    seconds = sum(latencies)
+    latencies.sort()
+    return {
+        "pages": pages,
+        "articles": articles,
+        "seconds": round(seconds, 4),
+        "articles_per_sec": round(articles / seconds, 2) if seconds else 0.0,
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 4),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def load_baseline(name: str, path: str = BASELINE_PATH) -> dict:
+    """Return the saved baseline of a spider, None if there is none"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f).get(name)
+
+
+def save_baseline(name: str, result: dict, path: str = BASELINE_PATH):
+    """Save the result of a spider as its baseline, keeping the other spiders'"""
+    baselines = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            baselines = json.load(f)
+    baselines[name] = result
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=4, sort_keys=True)
+        f.write("\n")
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Return the regressions of a result compared to its baseline
+
+    Args:
+        result (dict): output of run_benchmark
+        baseline (dict): saved output of run_benchmark
+        tolerance (float, optional): allowed relative regression. Defaults to 0.25.
+
+    Returns:
+        list: one message per regressed metric, empty if there is no regression
+    """
+    regressions = []
+    if result["articles"] != baseline["articles"] and result["pages"] == baseline["pages"]:
+        regressions.append(f"articles: {result['articles']} parsed, {baseline['articles']} expected")
+    if result["articles_per_sec"] < baseline["articles_per_sec"] * (1 - tolerance):
+        regressions.append(
+            f"articles_per_sec: {result['articles_per_sec']} < {baseline['articles_per_sec']}"
+        )
+    for metric in ("p50_ms", "p99_ms", "peak_rss_mb"):
+        if result[metric] > baseline[metric] * (1 + tolerance):
+            regressions.append(f"{metric}: {result[metric]} > {baseline[metric]}")
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spider", help="dotted path of the spider class")
+    parser.add_argument("--pages", type=int, default=2000, help="number of replayed pages")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="save the result as baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(load_spider(args.spider), load_fixture_responses(), args.pages)
+    print(json.dumps(result, indent=4))
+
+    if args.save_baseline:
+        save_baseline(args.spider, result, args.baseline)
+        return 0
+    baseline = load_baseline(args.spider, args.baseline)
+    if baseline is None:
+        print("No baseline saved, run with --save-baseline")
+        return 0
+    regressions = compare_with_baseline(result, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
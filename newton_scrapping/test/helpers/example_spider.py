@@ -0,0 +1,5 @@
+from scrapy import Spider
+
+
+class ExampleSpider(Spider):
+    name = "example"
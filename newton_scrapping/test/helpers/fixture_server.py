@@ -0,0 +1,104 @@
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FixtureServer:
+    """Local HTTP server serving in-memory pages, for offline tests
+
+    Every page is served with an ETag, and conditional requests
+    (If-None-Match) of an unchanged page get a 304 response. For load tests,
+    every response can be delayed by `latency` +/- `jitter` seconds and a
+    share `error_rate` of them answered with a 503, with a Retry-After header
+    when `retry_after` is given.
+
+    Usage:
+        with FixtureServer({"/sitemap.xml": b"<urlset>...</urlset>"}) as server:
+            url = server.url("/sitemap.xml")
+    """
+
+    def __init__(
+        self, pages: dict, content_type: str = "application/xml",
+        latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = None,
+        retry_after: str = None,
+    ):
+        """
+        Args:
+            pages (dict): {path: body bytes} or {path: (body bytes, content type)}, can be updated\n
+                while the server runs
+            content_type (str, optional): Content-Type of the pages given as bytes. Defaults to "application/xml".
+            latency (float, optional): seconds before every response. Defaults to 0.0.
+            jitter (float, optional): random seconds added to or removed from the latency. Defaults to 0.0.
+            error_rate (float, optional): share of the requests answered with a 503. Defaults to 0.0.
+            seed (int, optional): seed of the jitter and errors, for repeatable runs. Defaults to None.
+            retry_after (str, optional): Retry-After header of the 503 responses. Defaults to None.
+        """
+        self.pages = pages
+        self.content_type = content_type
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def url(self, path: str) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}{path}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append((self.path, dict(self.headers)))
+                with server.lock:
+                    delay = max(0.0, server.latency + server.random.uniform(-server.jitter, server.jitter))
+                    failed = server.random.random() < server.error_rate
+                if delay:
+                    time.sleep(delay)
+                if failed:
+                    self.send_response(503)
+                    if server.retry_after is not None:
+                        self.send_header("Retry-After", server.retry_after)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = server.pages.get(self.path)
+                content_type = server.content_type
+                if isinstance(body, tuple):
+                    body, content_type = body
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,42 @@
+import unittest
+
+from newton_scrapping.registry import register_spider
+from newton_scrapping.test.helpers.fixture_server import FixtureServer
+from newton_scrapping.test.helpers.load_test import HTML, REPLAY_SPIDER
+from newton_scrapping.test.helpers.utils import get_article_content
+
+# page HTML of the article fixtures
+ARTICLES = [
+    get_article_content(f"newton_scrapping/test/data/test_article_{number}.json")[0]["raw_response"]["content"]
+    for number in (1, 2)
+]
+ARTICLE = ARTICLES[0]
+
+
+def article_pages(count: int, article: str = ARTICLE) -> dict:
+    """Return the FixtureServer pages of `count` copies of an article, "/article-0.html" to "/article-<count - 1>.html" """
+    return {f"/article-{number}.html": (article.encode("utf-8"), HTML) for number in range(count)}
+
+
+class FixtureSiteTestCase(unittest.TestCase):
+    """Crawls of a local site, whose pages are parsed by the ReplaySpider of the load test
+
+    Usage:
+        site = self.serve(article_pages(4))
+        data = Crawler({"type": "article", "link": site.url("/article-0.html")}).crawl()
+    """
+
+    def serve(self, pages: dict, **options) -> FixtureServer:
+        """Start a FixtureServer of `pages` until the end of the test and register its spider
+
+        Args:
+            pages (dict): pages of the FixtureServer
+            **options: other FixtureServer keyword arguments, e.g. latency
+
+        Returns:
+            FixtureServer: the running server
+        """
+        site = FixtureServer(pages, **options).__enter__()
+        self.addCleanup(site.__exit__)
+        register_spider(site.url(""), REPLAY_SPIDER)
+        return site
@@ -0,0 +1,243 @@
+"""End-to-end load test of the Crawler against a local fixture web server
+
+Serves a synthetic sitemap index, its gzip compressed child sitemaps and one
+article page per sitemap link (the stored article fixtures, cycled) from a
+FixtureServer with configurable latency, jitter and error rate. For every
+concurrency setting, the Crawler crawls the sitemap and then the articles of
+its links, and the run reports for both queries the pages per second, the CPU
+time per page of the crawl processes, the time requests waited for a download
+slot and the peak memory of the crawl.
+
+No production site is requested: the sitemap query is crawled by the
+ReplaySpider below, and a project spider given with --spider only crawls the
+local article links.
+
+Usage:
+    python -m newton_scrapping.test.helpers.load_test --pages 2000 --concurrency 8 32 128 \\
+        --latency 0.05 --jitter 0.02 --error-rate 0.01
+"""
+
+import argparse
+import json
+import resource
+import sys
+import time
+from datetime import timedelta
+
+from scrapy import Request, Spider
+from scrapy.utils.defer import maybe_deferred_to_future
+
+from newton_scrapping.executor import parse_executor_for
+from newton_scrapping.main import Crawler
+from newton_scrapping.profiles import get_profile
+from newton_scrapping.registry import register_spider
+from newton_scrapping.sitemap import parse_sitemap
+from newton_scrapping.test.helpers.benchmark import load_fixture_responses
+from newton_scrapping.test.helpers.fixture_server import FixtureServer
+from newton_scrapping.test.helpers.sitemap_benchmark import DAYS, FIRST_DAY, synthetic_sitemap
+
+REPLAY_SPIDER = "newton_scrapping.test.helpers.load_test.ReplaySpider"
+HTML = "text/html; charset=utf-8"
+SITEMAP_SIZE = 1000
+
+
+class ReplaySpider(Spider):
+    """Spider of the load test site, following the interface of the project spiders
+
+    Sitemap queries start from LOAD_TEST_SERVER/sitemap.xml, articles are built
+    with executor.build_article, through the parse executor when it is enabled.
+    """
+
+    name = "replay"
+
+    def __init__(self, *args, type=None, url=None, start_date=None, end_date=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.output_callback = kwargs.get("args", {}).get("callback", None)
+        self.type = type
+        self.url = url
+        self.start_date = start_date
+        self.end_date = end_date
+        self.articles = []
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        if self.type == "sitemap":
+            yield self.sitemap_request(self.settings["LOAD_TEST_SERVER"] + "/sitemap.xml")
+        else:
+            yield Request(self.url)
+
+    def sitemap_request(self, url):
+        return Request(
+            url, callback=self.parse_sitemap,
+            meta={"sitemap_stream": {"since": self.start_date, "until": self.end_date}},
+        )
+
+    def parse_sitemap(self, response):
+        entries, sitemaps = parse_sitemap(response, self.start_date, self.end_date)
+        for sitemap in sitemaps:
+            yield self.sitemap_request(sitemap["link"])
+        for entry in entries:
+            self.articles.append(entry)
+            yield entry
+
+    async def parse(self, response):
+        record = await maybe_deferred_to_future(parse_executor_for(self.crawler).parse(response))
+        self.articles.append(record)
+        yield record
+
+    def closed(self, reason):
+        if self.output_callback is not None:
+            self.output_callback(self.articles)
+
+
+def site_pages(base_url: str, pages: int, bodies: list) -> dict:
+    """Return the FixtureServer pages of a site of `pages` articles
+
+    Returns:
+        dict: {path: (body, content type)} of /sitemap.xml, its child sitemaps and the articles
+    """
+    site = {}
+    children = []
+    for first in range(0, pages, SITEMAP_SIZE):
+        path = f"/sitemap-{first // SITEMAP_SIZE}.xml.gz"
+        site[path] = (synthetic_sitemap(min(SITEMAP_SIZE, pages - first), base_url=base_url, first=first),
+                      "application/x-gzip")
+        children.append(f"<sitemap><loc>{base_url}{path}</loc></sitemap>")
+    site["/sitemap.xml"] = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        + "".join(children) + "</sitemapindex>"
+    ).encode("utf-8"), "application/xml"
+    for index in range(pages):
+        day = (FIRST_DAY + timedelta(days=index % DAYS)).isoformat()
+        site[f"/{day}/article-{index}.html"] = (bodies[index % len(bodies)], HTML)
+    return site
+
+
+def _children_cpu_seconds() -> float:
+    # crawl processes are joined by Crawler.crawl(), so their CPU time is added to RUSAGE_CHILDREN
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure_crawl(crawler: Crawler) -> dict:
+    """Run crawler.crawl() and summarize its throughput, CPU, queue wait and memory
+
+    Returns:
+        dict: query, pages, records, server_errors (5xx responses, retried or not), seconds, pages_per_sec, cpu_ms_per_page,
+        queue_wait_p50_ms, queue_wait_p99_ms and peak_memory_mb
+    """
+    cpu = _children_cpu_seconds()
+    started = time.perf_counter()
+    data = crawler.crawl()
+    seconds = time.perf_counter() - started
+    cpu = _children_cpu_seconds() - cpu
+
+    stats = crawler.stats or {}
+    pages = stats.get("downloader/response_count", 0)
+    queue = next(iter((stats.get("histograms") or {}).get("queue_seconds", {}).values()), {})
+    memory = stats.get("memusage/max")
+    if crawler.query["type"] == "articles":
+        records = sum(len(result["data"]) for result in data)
+    else:
+        records = len(data)
+    return {
+        "query": crawler.query["type"],
+        "pages": pages,
+        "records": records,
+        "server_errors": sum(
+            value for name, value in stats.items() if name.startswith("downloader/response_status_count/5")
+        ),
+        "seconds": round(seconds, 3),
+        # the crawl's own duration, without the start of its process
+        "pages_per_sec": round(pages / stats["elapsed_time_seconds"], 2) if stats.get("elapsed_time_seconds") else 0.0,
+        "cpu_ms_per_page": round(cpu / pages * 1000, 3) if pages else None,
+        "queue_wait_p50_ms": round(queue["p50"] * 1000, 3) if queue.get("p50") is not None else None,
+        "queue_wait_p99_ms": round(queue["p99"] * 1000, 3) if queue.get("p99") is not None else None,
+        "peak_memory_mb": round(memory / (1024 * 1024), 1) if memory else None,
+        "error": crawler.error,
+    }
+
+
+def run_load_test(
+    pages: int = 500, concurrency: tuple = (8, 32), latency: float = 0.0, jitter: float = 0.0,
+    error_rate: float = 0.0, profile: str = None, parse_workers: int = None, spider: str = None,
+    seed: int = 1,
+) -> list:
+    """Crawl the local load test site once per concurrency setting
+
+    Args:
+        pages (int, optional): articles of the site. Defaults to 500.
+        concurrency (tuple, optional): CONCURRENT_REQUESTS values to compare, also used as the\n
+            per-domain limit. Defaults to (8, 32).
+        latency (float, optional): seconds before every response. Defaults to 0.0.
+        jitter (float, optional): random seconds added to or removed from the latency. Defaults to 0.0.
+        error_rate (float, optional): share of the requests answered with a 503. Defaults to 0.0.
+        profile (str, optional): throughput profile the concurrency is applied to, None for a fixed\n
+            concurrency without download delay or throttling. Defaults to None.
+        parse_workers (int, optional): Crawler parse_workers. Defaults to None.
+        spider (str, optional): dotted path of the spider of the articles query. Defaults to ReplaySpider.
+        seed (int, optional): seed of the jitter and errors. Defaults to 1.
+
+    Returns:
+        list: one measure_crawl() result per concurrency and query, with its "concurrency"
+    """
+    bodies = [response.body for response in load_fixture_responses()]
+    if not bodies:
+        raise ValueError("No article fixture to serve")
+
+    results = []
+    with FixtureServer({}, latency=latency, jitter=jitter, error_rate=error_rate, seed=seed) as server:
+        base_url = server.url("")
+        server.pages.update(site_pages(base_url, pages, bodies))
+        register_spider(base_url, REPLAY_SPIDER)
+        for value in concurrency:
+            settings = {
+                **(get_profile(profile) if profile else {"DOWNLOAD_DELAY": 0}),
+                "CONCURRENT_REQUESTS": value,
+                "CONCURRENT_REQUESTS_PER_DOMAIN": value,
+                "CONCURRENT_REQUESTS_PER_IP": 0,
+                "LOAD_TEST_SERVER": base_url,
+                "LOG_LEVEL": "WARNING",
+            }
+            sitemap = Crawler(
+                {"type": "sitemap", "domain": base_url, "since": FIRST_DAY.isoformat(),
+                 "until": (FIRST_DAY + timedelta(days=DAYS - 1)).isoformat()},
+                profile=settings,
+            )
+            result = measure_crawl(sitemap)
+            results.append({"concurrency": value, **result})
+
+            links = [server.url(path) for path in server.pages if path.endswith(".html")]
+            if spider:
+                register_spider(base_url, spider)
+            articles = Crawler({"type": "articles", "links": links}, profile=settings, parse_workers=parse_workers)
+            results.append({"concurrency": value, **measure_crawl(articles)})
+            register_spider(base_url, REPLAY_SPIDER)
+    return results
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500, help="articles of the local site")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32], help="CONCURRENT_REQUESTS values")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random seconds added to or removed from the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of the requests answered with a 503")
+    parser.add_argument("--profile", default=None, help="throughput profile the concurrency is applied to")
+    parser.add_argument("--parse-workers", type=int, default=None, help="Crawler parse_workers")
+    parser.add_argument("--spider", default=None, help="dotted path of the spider of the articles query")
+    args = parser.parse_args(argv)
+    results = run_load_test(
+        args.pages, tuple(args.concurrency), args.latency, args.jitter, args.error_rate,
+        args.profile, args.parse_workers, args.spider,
+    )
+    print(json.dumps(results, indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
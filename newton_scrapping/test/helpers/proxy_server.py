@@ -0,0 +1,80 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import ProxyHandler, build_opener
+
+
+class ProxyServer:
+    """Local forward HTTP proxy, for offline tests of proxy handling
+
+    Forwards the absolute-URI GET requests it receives, optionally after a
+    delay or answering a fixed error status instead. Keeps the client
+    connections alive, and counts them in `connections`.
+
+    Usage:
+        with ProxyServer(delay=0.2) as proxy:
+            settings = {"PROXY_POOL": [proxy.url]}
+    """
+
+    def __init__(self, delay: float = 0.0, status: int = None):
+        """
+        Args:
+            delay (float, optional): seconds to wait before answering. Defaults to 0.0.
+            status (int, optional): answer this status instead of forwarding. Defaults to None.
+        """
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.connections = 0
+        self.opener = build_opener(ProxyHandler({}))
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                server.connections += 1
+
+            def do_GET(self):
+                server.requests.append(self.path)
+                time.sleep(server.delay)
+                if server.status:
+                    self._send(server.status, b"", {})
+                    return
+                try:
+                    with server.opener.open(self.path, timeout=10) as response:
+                        self._send(response.status, response.read(), response.headers)
+                except HTTPError as error:
+                    self._send(error.code, error.read(), error.headers)
+
+            def _send(self, status, body, headers):
+                self.send_response(status)
+                if headers.get("Content-Type"):
+                    self.send_header("Content-Type", headers["Content-Type"])
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,184 @@
+import socketserver
+import threading
+import time
+
+
+class RespServer:
+    """Local server of the Redis protocol (RESP2), for offline tests of the RedisFrontier
+
+    Keeps its data in memory and implements the commands used by the
+    frontier, every command being atomic like on a Redis server: PING, AUTH,
+    SELECT, DEL, EXPIRE, GET, INCRBY, SADD, SMEMBERS, HSET, HGET, HDEL, HINCRBY,
+    HGETALL, ZADD (NX), ZREM, ZCARD and ZRANGEBYSCORE (LIMIT).
+
+    Usage:
+        with RespServer() as server:
+            frontier = RedisFrontier(server.url)
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.commands = []
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address
+        return f"redis://{host}:{port}/0"
+
+    def execute(self, command: list):
+        """Return the reply of one command, an Exception for an error reply"""
+        name, args = command[0].upper(), command[1:]
+        handler = getattr(self, "cmd_" + name.lower(), None)
+        if handler is None:
+            return Exception(f"ERR unknown command '{name}'")
+        with self.lock:
+            self.commands.append(name)
+            for key in [key for key, deadline in self.expires.items() if deadline <= time.monotonic()]:
+                self.data.pop(key, None)
+                del self.expires[key]
+            try:
+                return handler(*args)
+            except (TypeError, ValueError) as error:
+                return Exception(f"ERR {error}")
+
+    def _get(self, key, kind):
+        value = self.data.get(key)
+        if value is None:
+            value = self.data[key] = kind()
+        return value
+
+    def cmd_ping(self):
+        return "PONG"
+
+    def cmd_auth(self, *args):
+        return "OK"
+
+    def cmd_select(self, db):
+        return "OK"
+
+    def cmd_del(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def cmd_expire(self, key, seconds):
+        if key not in self.data:
+            return 0
+        self.expires[key] = time.monotonic() + int(seconds)
+        return 1
+
+    def cmd_get(self, key):
+        return self.data.get(key)
+
+    def cmd_incrby(self, key, increment):
+        self.data[key] = int(self.data.get(key, 0)) + int(increment)
+        return self.data[key]
+
+    def cmd_sadd(self, key, *members):
+        values = self._get(key, set)
+        added = len(set(members) - values)
+        values.update(members)
+        return added
+
+    def cmd_smembers(self, key):
+        return sorted(self.data.get(key, ()))
+
+    def cmd_hset(self, key, *pairs):
+        values = self._get(key, dict)
+        added = sum(field not in values for field in pairs[::2])
+        values.update(zip(pairs[::2], pairs[1::2]))
+        return added
+
+    def cmd_hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def cmd_hdel(self, key, *fields):
+        values = self.data.get(key, {})
+        return sum(values.pop(field, None) is not None for field in fields)
+
+    def cmd_hincrby(self, key, field, increment):
+        values = self._get(key, dict)
+        values[field] = str(int(values.get(field, 0)) + int(increment))
+        return int(values[field])
+
+    def cmd_hgetall(self, key):
+        return [value for pair in self.data.get(key, {}).items() for value in pair]
+
+    def cmd_zadd(self, key, *args):
+        nx = args[0].upper() == "NX"
+        if nx:
+            args = args[1:]
+        values = self._get(key, dict)
+        added = 0
+        for score, member in zip(args[::2], args[1::2]):
+            if member in values and nx:
+                continue
+            added += member not in values
+            values[member] = float(score)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        values = self.data.get(key, {})
+        return sum(values.pop(member, None) is not None for member in members)
+
+    def cmd_zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    def cmd_zrangebyscore(self, key, minimum, maximum, *args):
+        offset, count = 0, None
+        if args and args[0].upper() == "LIMIT":
+            offset, count = int(args[1]), int(args[2])
+        minimum, maximum = float(minimum), float(maximum)
+        members = sorted(
+            (score, member) for member, score in self.data.get(key, {}).items() if minimum <= score <= maximum
+        )
+        members = [member for _, member in members][offset:]
+        return members if count is None or count < 0 else members[:count]
+
+    def _handler(self):
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    command = self.read_command()
+                    if command is None:
+                        return
+                    self.wfile.write(self.encode(server.execute(command)))
+
+            def read_command(self):
+                line = self.rfile.readline()
+                if not line:
+                    return None
+                command = []
+                for _ in range(int(line[1:])):
+                    length = int(self.rfile.readline()[1:])
+                    command.append(self.rfile.read(length + 2)[:-2].decode("utf-8"))
+                return command
+
+            def encode(self, reply) -> bytes:
+                if isinstance(reply, Exception):
+                    return f"-{reply}\r\n".encode("utf-8")
+                if reply is None:
+                    return b"$-1\r\n"
+                if isinstance(reply, int):
+                    return b":%d\r\n" % reply
+                if isinstance(reply, list):
+                    return b"*%d\r\n" % len(reply) + b"".join(self.encode(value) for value in reply)
+                if reply in ("OK", "PONG"):
+                    return f"+{reply}\r\n".encode("utf-8")
+                reply = str(reply).encode("utf-8")
+                return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+        return Handler
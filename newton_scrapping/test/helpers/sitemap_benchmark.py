@@ -0,0 +1,136 @@
+"""Benchmark of the streaming sitemap parser against Scrapy's sitemap parsing
+
+Generates a large synthetic news sitemap, gzip compressed like the .xml.gz
+sitemaps of news sites, and parses it with sitemap.SitemapStreamParser and
+with scrapy.utils.sitemap.Sitemap (gunzip, then the whole DOM). Every parser
+runs in a fresh process and reports its time and the growth of the peak RSS
+while parsing.
+
+Usage:
+    python -m newton_scrapping.test.helpers.sitemap_benchmark --entries 500000
+"""
+
+import argparse
+import gzip
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from newton_scrapping.sitemap import PARSE_CHUNK_SIZE, SitemapStreamParser
+
+FIRST_DAY = date(2023, 1, 1)
+DAYS = 90
+
+
+def synthetic_sitemap(entries: int, compress: bool = True, base_url: str = "https://example.com", first: int = 0) -> bytes:
+    """Return a news sitemap of `entries` links spread over DAYS days from FIRST_DAY
+
+    The links are `base_url`/<day>/article-<index>.html, indexes from `first`.
+    """
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+        'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">\n'
+    ]
+    for index in range(first, first + entries):
+        day = (FIRST_DAY + timedelta(days=index % DAYS)).isoformat()
+        lines.append(
+            f"<url><loc>{base_url}/{day}/article-{index}.html</loc>"
+            f"<lastmod>{day}T10:00:00+00:00</lastmod><news:news>"
+            f"<news:publication><news:name>Example</news:name><news:language>en</news:language></news:publication>"
+            f"<news:publication_date>{day}T09:00:00+00:00</news:publication_date>"
+            f"<news:title>Article {index} of {day}</news:title></news:news></url>\n"
+        )
+    lines.append("</urlset>\n")
+    body = "".join(lines).encode("utf-8")
+    return gzip.compress(body, compresslevel=5) if compress else body
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss keeps the peak of the parent process across fork and exec on
+    # Linux, the VmHWM of the process itself is read instead
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def parse_streaming(body: bytes, since: str, until: str) -> int:
+    parser = SitemapStreamParser(since, until)
+    count = 0
+    for start in range(0, len(body), PARSE_CHUNK_SIZE):
+        count += len(parser.feed(body[start:start + PARSE_CHUNK_SIZE]))
+    return count + len(parser.close())
+
+
+def parse_scrapy(body: bytes, since: str, until: str) -> int:
+    from scrapy.utils.gz import gunzip
+    from scrapy.utils.sitemap import Sitemap
+
+    count = 0
+    for entry in Sitemap(gunzip(body)):
+        day = entry.get("lastmod", "")[:10]
+        if since <= day <= until:
+            count += 1
+    return count
+
+
+PARSERS = {"streaming": parse_streaming, "scrapy": parse_scrapy}
+
+
+def _measure(name, path, since, until, results):
+    with open(path, "rb") as f:
+        body = f.read()
+    baseline = _peak_rss_mb()
+    started = time.perf_counter()
+    count = PARSERS[name](body, since, until)
+    results.put({
+        "parser": name,
+        "entries": count,
+        "seconds": round(time.perf_counter() - started, 3),
+        "peak_rss_growth_mb": round(_peak_rss_mb() - baseline, 1),
+    })
+
+
+def run_sitemap_benchmark(entries: int = 200000, since: str = "2023-02-01", until: str = "2023-02-28") -> list:
+    """Parse a synthetic sitemap of `entries` links with every parser, each in a fresh process
+
+    Returns:
+        list: {"parser", "entries", "seconds", "peak_rss_growth_mb"} of every parser
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    with tempfile.NamedTemporaryFile(suffix=".xml.gz") as f:
+        f.write(synthetic_sitemap(entries))
+        f.flush()
+        for name in PARSERS:
+            queue = context.Queue()
+            process = context.Process(target=_measure, args=(name, f.name, since, until, queue))
+            process.start()
+            results.append(queue.get())
+            process.join()
+    return results
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200000, help="links in the synthetic sitemap")
+    parser.add_argument("--since", default="2023-02-01", help="first day of the window")
+    parser.add_argument("--until", default="2023-02-28", help="last day of the window")
+    args = parser.parse_args(argv)
+    print(json.dumps(run_sitemap_benchmark(args.entries, args.since, args.until), indent=4))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
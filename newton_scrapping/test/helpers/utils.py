@@ -1,5 +1,6 @@
 import requests
 import json
+import os
 from scrapy.http import Request, TextResponse
 
 
@@ -35,3 +36,24 @@ def get_article_content(file_name: str) -> dict:
         data = json.load(f)
 
     return data
+
+
+def offline_response_from_fixture(file_name: str, url: str = None) -> TextResponse:
+    """Rebuild the scrapy Response of an article from its stored `raw_response`
+
+    Args:
+        file_name (str): JSON fixture path, e.g. test/data/test_article_1.json
+        url (str, optional): web address of article. Defaults to the fixture file URL.
+
+    Returns:
+        TextResponse: Converted Response object
+    """
+    record = get_article_content(file_name)[0]
+    raw_response = record["raw_response"]
+    url = url or "file://" + os.path.abspath(file_name)
+
+    request = Request(url=url)
+    response = TextResponse(url=url, request=request,
+                            headers={"Content-Type": raw_response.get("content_type", "text/html")},
+                            body=raw_response["content"], encoding='utf-8')
+    return response
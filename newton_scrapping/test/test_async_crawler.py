@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+from multiprocessing import Process, Queue
+
+from newton_scrapping.test.helpers.fixture_site import ARTICLE, FixtureSiteTestCase, article_pages
+
+
+async def crawl(links):
+    # imported here, the reactor is installed on the event loop of this process only
+    from newton_scrapping.main import AsyncCrawler, CrawlerError
+
+    async with AsyncCrawler(profile={"DOWNLOAD_DELAY": 0}) as crawler:
+        first, second = await asyncio.gather(
+            crawler.crawl({"type": "article", "link": links[0]}),
+            crawler.crawl({"type": "article", "link": links[1]}),
+        )
+        streamed = [result async for result in crawler.stream({"type": "articles", "links": links})]
+        try:
+            await crawler.crawl({"type": "unknown", "link": links[0]})
+            error = None
+        except CrawlerError as exception:
+            error = str(exception)
+    return first, second, streamed, error
+
+
+def run(links, output_queue):
+    output_queue.put(asyncio.run(crawl(links)))
+
+
+class TestAsyncCrawler(FixtureSiteTestCase):
+    def test_queries_share_the_reactor(self):
+        pages = article_pages(2)
+        site = self.serve(pages)
+        links = [site.url(path) for path in pages]
+        output_queue = Queue()
+        process = Process(target=run, args=(links, output_queue))
+        process.start()
+        first, second, streamed, error = output_queue.get(timeout=60)
+        process.join()
+
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual([len(first), len(second)], [1, 1])
+        self.assertEqual(first[0]["raw_response"]["content"], ARTICLE)
+        self.assertEqual(sorted(result["link"] for result in streamed), links)
+        self.assertTrue(all(result["data"] for result in streamed))
+        self.assertIn("Invalid Type", error)
+        # the project settings of the other crawls
+        self.assertNotIn("/robots.txt", [path for path, _ in site.requests])
+
+
+if __name__ == "__main__":
+    unittest.main()
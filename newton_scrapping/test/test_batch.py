@@ -0,0 +1,53 @@
+import tempfile
+import unittest
+
+from newton_scrapping.main import Crawler
+from newton_scrapping.test.helpers.fixture_site import ARTICLES, FixtureSiteTestCase
+from newton_scrapping.test.helpers.load_test import HTML
+
+PROFILE = {"DOWNLOAD_DELAY": 0}
+
+
+class TestArticlesQuery(FixtureSiteTestCase):
+    def setUp(self):
+        pages = {
+            "/first.html": (ARTICLES[0].encode("utf-8"), HTML),
+            "/second.html": (ARTICLES[1].encode("utf-8"), HTML),
+            # the first article under another path
+            "/copy.html": (ARTICLES[0].encode("utf-8"), HTML),
+        }
+        self.site = self.serve(pages)
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.state_dir.cleanup)
+
+    def test_mixed_links(self):
+        links = [self.site.url("/first.html"), self.site.url("/missing.html"), self.site.url("/second.html")]
+        results = Crawler({"type": "articles", "links": links}, profile=PROFILE).crawl()
+        self.assertEqual([result["link"] for result in results], links)
+        first, missing, second = results
+        self.assertEqual((len(first["data"]), first["error"]), (1, None))
+        self.assertEqual(first["data"][0]["raw_response"]["content"], ARTICLES[0])
+        self.assertEqual(missing["data"], [])
+        self.assertEqual(missing["error"], "Ignoring non-200 response")
+        self.assertEqual(second["data"][0]["raw_response"]["content"], ARTICLES[1])
+
+    def test_duplicates_are_emptied(self):
+        links = [self.site.url("/first.html"), self.site.url("/second.html"), self.site.url("/copy.html")]
+        crawler = Crawler(
+            {"type": "articles", "links": links}, profile={**PROFILE, "CONCURRENT_REQUESTS": 1},
+            dedup=True, state_dir=self.state_dir.name,
+        )
+        results = crawler.crawl()
+        self.assertEqual([len(result["data"]) for result in results], [1, 1, 0])
+        self.assertEqual([result["error"] for result in results], [None, None, None])
+        self.assertEqual(crawler.stats["dedup/url_duplicates"], 1)
+
+        # a later single article query of the same article is left out too
+        self.assertEqual(Crawler(
+            {"type": "article", "link": self.site.url("/copy.html")}, profile=PROFILE,
+            dedup=True, state_dir=self.state_dir.name,
+        ).crawl(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
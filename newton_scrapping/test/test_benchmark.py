@@ -0,0 +1,84 @@
+import asyncio
+import os
+import unittest
+
+from scrapy import Spider
+
+from newton_scrapping.registry import load_spider
+from newton_scrapping.test.helpers.benchmark import (BASELINE_PATH,
+                                                     compare_with_baseline,
+                                                     load_baseline,
+                                                     load_fixture_responses,
+                                                     run_benchmark)
+
+# TODO: Set to the spider of your project, e.g. newton_scrapping.spiders.indian_express.IndianExpressSpider
+BENCHMARK_SPIDER = os.environ.get("BENCHMARK_SPIDER")
+
+
+class TitleSpider(Spider):
+    name = "title"
+
+    def parse(self, response):
+        yield {"title": response.css("title::text").get()}
+
+
+class AsyncTitleSpider(Spider):
+    name = "async_title"
+
+    async def parse(self, response):
+        await asyncio.sleep(0)
+        yield {"title": response.css("title::text").get()}
+
+
+class FailingSpider(Spider):
+    name = "failing"
+
+    def parse(self, response):
+        raise ValueError("no title")
+
+
+class TestParseBenchmark(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.responses = load_fixture_responses()
+
+    def test_replay_fixtures(self):
+        self.assertGreaterEqual(len(self.responses), 7)
+        result = run_benchmark(TitleSpider, self.responses, pages=20)
+        self.assertEqual(result["pages"], 20)
+        self.assertEqual(result["articles"], 20)
+        self.assertGreater(result["articles_per_sec"], 0)
+        self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertGreater(result["peak_rss_mb"], 0)
+
+    def test_async_parse(self):
+        result = run_benchmark(AsyncTitleSpider, self.responses, pages=10)
+        self.assertEqual(result["articles"], 10)
+
+    def test_peak_rss_of_the_parse_only(self):
+        # memory used by the caller before the benchmark
+        ballast = bytearray(256 * 1024 * 1024)
+        ballast[::4096] = b"x" * len(ballast[::4096])
+        del ballast
+        result = run_benchmark(TitleSpider, self.responses, pages=5)
+        self.assertLess(result["peak_rss_mb"], 256)
+
+    def test_failed_parse(self):
+        with self.assertRaisesRegex(Exception, "ValueError: no title"):
+            run_benchmark(FailingSpider, self.responses, pages=1)
+
+    def test_compare_with_baseline(self):
+        baseline = {"pages": 100, "articles": 100, "articles_per_sec": 500.0,
+                    "p50_ms": 2.0, "p99_ms": 4.0, "peak_rss_mb": 100.0}
+        self.assertEqual(compare_with_baseline(dict(baseline, articles_per_sec=400.0), baseline), [])
+        regressions = compare_with_baseline(dict(baseline, articles_per_sec=300.0, p99_ms=6.0), baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertEqual(len(compare_with_baseline(dict(baseline, articles=90), baseline)), 1)
+
+    @unittest.skipUnless(BENCHMARK_SPIDER, "BENCHMARK_SPIDER is not set")
+    def test_spider_against_baseline(self):
+        baseline = load_baseline(BENCHMARK_SPIDER)
+        if baseline is None:
+            self.skipTest(f"No baseline of {BENCHMARK_SPIDER} in {BASELINE_PATH}")
+        result = run_benchmark(load_spider(BENCHMARK_SPIDER), self.responses, baseline["pages"])
+        self.assertEqual(compare_with_baseline(result, baseline), [])
@@ -0,0 +1,72 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from scrapy import Spider
+from scrapy.http import Request
+from twisted.internet.task import Clock
+
+from newton_scrapping.budget import DomainBudget
+from newton_scrapping.middlewares import FreshnessPriorityMiddleware
+
+
+class TestDomainBudget(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.started = []
+
+    def acquire(self, budget, domain, priority=0):
+        budget.acquire(domain, priority).addCallback(lambda _: self.started.append((domain, priority)))
+
+    def test_fair_split(self):
+        budget = DomainBudget(concurrency=4, per_domain=4, delay=0, clock=self.clock)
+        for _ in range(6):
+            self.acquire(budget, "a.com")
+        for _ in range(2):
+            self.acquire(budget, "b.com")
+        # a.com got the first slots, b.com is still served as soon as it asks
+        self.assertEqual([domain for domain, _ in self.started], ["a.com"] * 4)
+        budget.release("a.com")
+        budget.release("a.com")
+        self.assertEqual([domain for domain, _ in self.started[4:]], ["b.com", "b.com"])
+        budget.release("b.com")
+        self.assertEqual(self.started[-1][0], "a.com")
+        self.assertEqual(budget.total, 4)
+
+    def test_per_domain_limit_and_delay(self):
+        budget = DomainBudget(concurrency=10, per_domain=2, delay=1.0, clock=self.clock)
+        for _ in range(3):
+            self.acquire(budget, "a.com")
+        self.assertEqual(len(self.started), 1)
+        self.clock.advance(1)
+        self.assertEqual(len(self.started), 2)
+        self.clock.advance(1)
+        # the per-domain limit is reached
+        self.assertEqual(len(self.started), 2)
+        budget.release("a.com")
+        self.assertEqual(len(self.started), 3)
+
+    def test_priority(self):
+        budget = DomainBudget(concurrency=1, per_domain=1, delay=0, clock=self.clock)
+        self.acquire(budget, "a.com", 0)
+        self.acquire(budget, "a.com", 0)
+        self.acquire(budget, "a.com", 10)
+        budget.release("a.com")
+        self.assertEqual(self.started, [("a.com", 0), ("a.com", 10)])
+
+
+class TestFreshnessPriorityMiddleware(unittest.TestCase):
+    def test_boost(self):
+        middleware = FreshnessPriorityMiddleware(max_boost=48)
+        now = datetime.now(timezone.utc)
+        requests = [
+            Request("https://example.com/new", meta={"lastmod": now.isoformat()}),
+            Request("https://example.com/day", meta={"lastmod": (now - timedelta(hours=24, minutes=1)).isoformat()}),
+            Request("https://example.com/old", meta={"lastmod": "2020-01-01"}),
+            Request("https://example.com/none"),
+        ]
+        output = list(middleware.process_spider_output(None, requests, Spider("fresh")))
+        self.assertEqual([request.priority for request in output], [48, 24, 0, 0])
+
+
+if __name__ == "__main__":
+    unittest.main()
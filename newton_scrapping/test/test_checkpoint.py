@@ -0,0 +1,189 @@
+import os
+import signal
+import sys
+import tempfile
+import time
+import unittest
+from multiprocessing import Process, Queue
+from unittest import mock
+
+from newton_scrapping import main
+from newton_scrapping.checkpoint import CLOSED, FINISHED, RUNNING, JobCheckpoint
+from newton_scrapping.main import CRAWL_STATS, Crawler, CrawlerError, ProcessWatcher
+from newton_scrapping.test.helpers.fixture_site import ARTICLES, FixtureSiteTestCase
+from newton_scrapping.test.helpers.load_test import HTML
+
+
+def hand_over_on_sigterm(output_queue):
+    # stands for a crawler process closing its spider on SIGTERM
+    signal.signal(signal.SIGTERM, lambda signum, frame: (output_queue.put(["partial"]), sys.exit(0)))
+    while True:
+        time.sleep(0.1)
+
+
+def ignore_sigterm(output_queue):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    while True:
+        time.sleep(0.1)
+
+
+def crash(output_queue):
+    os._exit(3)
+
+
+def stream_until_sigterm(output_queue):
+    # stands for a crawler process streaming records without a pause
+    signal.signal(signal.SIGTERM, lambda signum, frame: (output_queue.put("closed"), sys.exit(0)))
+    while True:
+        output_queue.put("record")
+        time.sleep(0.01)
+
+
+class StatsOnlyCrawler(Crawler):
+    # a spider that never hands over its data, the process only sends its stats
+    def start_crawler(self, query, output_queue):
+        output_queue.put((CRAWL_STATS, {"finish_reason": "finished"}))
+
+
+class TestJobCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.job_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.job_dir.name, "backfill")
+        self.query = {"type": "sitemap", "domain": "https://example.com"}
+
+    def tearDown(self):
+        self.job_dir.cleanup()
+
+    def test_resume(self):
+        checkpoint = JobCheckpoint(self.path)
+        self.assertIsNone(checkpoint.status)
+        checkpoint.open(self.query)
+        self.assertEqual(checkpoint.status, RUNNING)
+        checkpoint.add({"link": "https://example.com/a.html"})
+        checkpoint.close("shutdown", self.query)
+        self.assertEqual(checkpoint.status, CLOSED)
+
+        checkpoint = JobCheckpoint(self.path)
+        checkpoint.open(self.query)
+        self.assertEqual(checkpoint.records, [{"link": "https://example.com/a.html"}])
+        checkpoint.add({"link": "https://example.com/b.html"})
+        checkpoint.close("finished", self.query)
+        self.assertEqual(checkpoint.status, FINISHED)
+        self.assertEqual(len(checkpoint.results(self.query)), 2)
+
+    def test_killed_run(self):
+        checkpoint = JobCheckpoint(self.path)
+        checkpoint.open(self.query)
+        checkpoint.add({"link": "https://example.com/a.html"})
+        checkpoint.file.write('{"link": "https://exa')
+        checkpoint.file.flush()
+        os.makedirs(os.path.join(self.path, "requests.queue"))
+        with open(os.path.join(self.path, "requests.seen"), "wb") as f:
+            f.write(b"fingerprint")
+
+        # never closed: the records are kept, scrapy's state is dropped
+        checkpoint = JobCheckpoint(self.path)
+        checkpoint.open(self.query)
+        self.assertEqual(checkpoint.records, [{"link": "https://example.com/a.html"}])
+        self.assertFalse(os.path.exists(os.path.join(self.path, "requests.queue")))
+        self.assertFalse(os.path.exists(os.path.join(self.path, "requests.seen")))
+        checkpoint.add({"link": "https://example.com/b.html"})
+        checkpoint.close("finished")
+        self.assertEqual(len(JobCheckpoint(self.path).load()), 2)
+
+    def test_articles_results(self):
+        query = {"type": "articles", "links": ["https://example.com/a.html", "https://example.com/b.html"]}
+        checkpoint = JobCheckpoint(self.path)
+        checkpoint.open(query)
+        checkpoint.add({"link": "https://example.com/a.html", "data": [], "error": "timeout"})
+        checkpoint.add({"link": "https://example.com/a.html", "data": [{"title": "A"}], "error": None})
+        results = checkpoint.results(query)
+        self.assertEqual(results[0]["data"], [{"title": "A"}])
+        self.assertEqual(results[1]["link"], "https://example.com/b.html")
+        self.assertTrue(results[1]["error"])
+        checkpoint.close("finished")
+
+    def test_other_query_starts_over(self):
+        checkpoint = JobCheckpoint(self.path)
+        checkpoint.open(self.query)
+        checkpoint.add({"link": "https://example.com/a.html"})
+        checkpoint.close("finished", self.query)
+        with open(os.path.join(self.path, "requests.seen"), "wb") as f:
+            f.write(b"fingerprint")
+
+        other = {**self.query, "domain": "https://example.org"}
+        checkpoint = JobCheckpoint(self.path)
+        self.assertTrue(checkpoint.has_query(self.query))
+        self.assertFalse(checkpoint.has_query(other))
+        checkpoint.open(other)
+        self.assertEqual(checkpoint.records, [])
+        self.assertFalse(os.path.exists(os.path.join(self.path, "requests.seen")))
+        checkpoint.close("finished", other)
+        self.assertEqual(checkpoint.results(other), [])
+
+
+class TestProcessWatcher(unittest.TestCase):
+    def watch(self, target, timeout):
+        output_queue = Queue()
+        process = Process(target=target, args=(output_queue,))
+        process.start()
+        self.addCleanup(process.join)
+        self.addCleanup(lambda: process.is_alive() and process.kill())
+        return ProcessWatcher(process, output_queue, timeout)
+
+    def test_timeout_hands_over_partial_data(self):
+        watcher = self.watch(hand_over_on_sigterm, 0.5)
+        self.assertEqual(watcher.get(), ["partial"])
+        self.assertTrue(watcher.timed_out)
+
+    def test_killed_after_grace(self):
+        watcher = self.watch(ignore_sigterm, 0.5)
+        with mock.patch.object(main, "SHUTDOWN_GRACE", 0.5), self.assertRaises(CrawlerError):
+            watcher.get()
+        self.assertEqual(watcher.process.exitcode, -signal.SIGKILL)
+
+    def test_crash(self):
+        watcher = self.watch(crash, None)
+        with self.assertRaisesRegex(CrawlerError, "exited with code 3"):
+            watcher.get()
+
+    def test_timeout_while_streaming(self):
+        watcher = self.watch(stream_until_sigterm, 0.5)
+        started = time.monotonic()
+        while watcher.get() != "closed":
+            self.assertLess(time.monotonic() - started, 10)
+        self.assertTrue(watcher.timed_out)
+
+
+class TestCrawlerJob(FixtureSiteTestCase):
+    def setUp(self):
+        self.site = self.serve({
+            f"/article-{number}.html": (article.encode("utf-8"), HTML) for number, article in enumerate(ARTICLES)
+        })
+        self.job_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.job_dir.cleanup)
+        self.options = {"profile": {"DOWNLOAD_DELAY": 0}, "job_dir": self.job_dir.name}
+
+    def test_finished_job_of_another_query(self):
+        query = {"type": "article", "link": self.site.url("/article-0.html")}
+        data = Crawler(query, job_id="daily", **self.options).crawl()
+        self.assertEqual(data[0]["raw_response"]["content"], ARTICLES[0])
+        # finished, returned without crawling
+        self.assertEqual(Crawler(query, job_id="daily", **self.options).crawl(), data)
+        self.assertEqual(len(self.site.requests), 1)
+
+        other = {"type": "article", "link": self.site.url("/article-1.html")}
+        data = Crawler(other, job_id="daily", **self.options).crawl()
+        self.assertEqual([record["raw_response"]["content"] for record in data], [ARTICLES[1]])
+        self.assertEqual(len(self.site.requests), 2)
+
+    def test_data_never_handed_over(self):
+        query = {"type": "article", "link": self.site.url("/article-0.html")}
+        crawler = StatsOnlyCrawler(query, **self.options)
+        self.assertEqual(crawler.crawl(), [])
+        self.assertEqual(crawler.stats, {"finish_reason": "finished"})
+        self.assertIsNone(crawler.error)
+
+
+if __name__ == "__main__":
+    unittest.main()
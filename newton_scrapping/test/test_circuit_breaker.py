@@ -0,0 +1,203 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from multiprocessing import Process, Queue
+
+from scrapy import Spider, signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import TCPTimedOutError
+from twisted.internet.task import Clock
+
+from newton_scrapping.main import circuits_given_up
+from newton_scrapping.middlewares import CircuitBreakerMiddleware, CircuitOpen, retry_after_seconds
+from newton_scrapping.test.helpers.fixture_server import FixtureServer
+
+PAGES = 20
+
+
+class Engine:
+    """ExecutionEngine.crawl() with its request_scheduled signal"""
+
+    def __init__(self, middleware, spider):
+        self.middleware = middleware
+        self.spider = spider
+        self.scheduled = []
+
+    def crawl(self, request):
+        try:
+            self.middleware.request_scheduled(request, self.spider)
+        except IgnoreRequest:
+            return
+        self.scheduled.append(request)
+
+
+class TestCircuitBreakerMiddleware(unittest.TestCase):
+    def middleware(self, **settings):
+        self.clock = Clock()
+        self.crawler = get_crawler(settings_dict={
+            "CIRCUIT_BREAKER_ENABLED": True,
+            "CIRCUIT_BREAKER_WINDOW": 4,
+            "CIRCUIT_BREAKER_MIN_REQUESTS": 4,
+            "CIRCUIT_BREAKER_OPEN_SECONDS": 10,
+            **settings,
+        })
+        self.spider = Spider("circuits")
+        self.spider.crawler = self.crawler
+        middleware = CircuitBreakerMiddleware(self.crawler, clock=self.clock)
+        self.crawler.engine = self.engine = Engine(middleware, self.spider)
+        return middleware
+
+    def download(self, middleware, url="https://a.com/", status=200, headers=None, exception=None, request=None):
+        """Return the output of the middleware for one download of `url`"""
+        request = request or Request(url)
+        self.assertIsNone(middleware.process_request(request, self.spider))
+        if exception:
+            return middleware.process_exception(request, exception, self.spider)
+        request.meta["download_latency"] = 0.1
+        return middleware.process_response(request, Response(request.url, status=status, headers=headers), self.spider)
+
+    def test_trip_park_and_close(self):
+        middleware = self.middleware(RETRY_ENABLED=False)
+        for _ in range(3):
+            self.assertIsInstance(self.download(middleware, status=503), Response)
+        self.download(middleware, exception=TCPTimedOutError())
+        self.assertEqual(self.crawler.stats.get_value("circuit_breaker/trips"), 1)
+
+        # new requests of a.com are parked, requests scheduled before are sent back to the engine
+        self.engine.crawl(Request("https://a.com/new"))
+        scheduled = Request("https://a.com/scheduled")
+        self.assertTrue(middleware.process_request(scheduled, self.spider).dont_filter)
+        self.engine.crawl(middleware.process_request(scheduled, self.spider))
+        self.assertEqual(self.engine.scheduled, [])
+        with self.assertRaises(DontCloseSpider):
+            middleware.spider_idle(self.spider)
+        # other domains are not held back
+        self.assertIsInstance(self.download(middleware, "https://b.com/"), Response)
+
+        # half open: one probe, the other requests stay parked until it succeeds
+        self.clock.advance(10)
+        probe = self.engine.scheduled.pop()
+        self.assertEqual(probe.url, "https://a.com/new")
+        self.assertIsNone(middleware.process_request(probe, self.spider))
+        self.engine.crawl(Request("https://a.com/later"))
+        self.assertEqual(self.engine.scheduled, [])
+        middleware.process_response(probe, Response(probe.url), self.spider)
+        self.assertEqual([request.url for request in self.engine.scheduled], ["https://a.com/scheduled", "https://a.com/later"])
+        middleware.spider_idle(self.spider)
+
+    def test_give_up(self):
+        middleware = self.middleware(RETRY_ENABLED=False, CIRCUIT_BREAKER_MAX_TRIPS=1)
+        for _ in range(4):
+            self.download(middleware, status=500)
+        self.engine.crawl(Request("https://a.com/parked"))
+        self.clock.advance(10)
+        probe = self.engine.scheduled.pop()
+        self.download(middleware, status=500, request=probe)
+        # the parked requests go to their errback
+        self.engine.crawl(Request("https://a.com/parked"))
+        with self.assertRaises(CircuitOpen):
+            middleware.process_request(self.engine.scheduled.pop(), self.spider)
+
+        middleware.spider_closed(self.spider)
+        stats = self.crawler.stats.get_stats()
+        self.assertEqual(stats["circuit_breaker/a.com/state"], "dead")
+        self.assertEqual(stats["circuit_breaker/a.com/error_rate"], 1.0)
+        self.assertEqual(circuits_given_up(stats), ["a.com"])
+
+    def test_retry_after(self):
+        middleware = self.middleware()
+        retry = self.download(middleware, status=503, headers={"Retry-After": "120"})
+        self.assertEqual(retry.meta["retry_times"], 1)
+        # the retry waits for the end of the pause
+        self.engine.crawl(retry)
+        self.clock.advance(119)
+        self.assertEqual(self.engine.scheduled, [])
+        self.clock.advance(1)
+        self.assertEqual(self.engine.scheduled, [retry])
+        # a pause is not a trip
+        self.assertIsNone(self.crawler.stats.get_value("circuit_breaker/trips"))
+
+        now = datetime(2023, 3, 22, 9, 0, tzinfo=timezone.utc)
+        self.assertEqual(retry_after_seconds(format_datetime(now + timedelta(minutes=2), usegmt=True), now), 120)
+        self.assertEqual(retry_after_seconds(b"30"), 30)
+        self.assertIsNone(retry_after_seconds("soon"))
+
+    def test_retry_budget(self):
+        middleware = self.middleware(
+            CIRCUIT_BREAKER_MIN_REQUESTS=100, RETRY_BUDGET_MIN=2, RETRY_BUDGET_RATIO=0,
+        )
+        outputs = [self.download(middleware, f"https://a.com/{number}", status=503) for number in range(3)]
+        self.assertEqual([type(output) for output in outputs], [Request, Request, Response])
+        self.assertEqual(self.crawler.stats.get_value("retry_budget/retries"), 2)
+        self.assertEqual(self.crawler.stats.get_value("retry_budget/exhausted"), 1)
+
+
+class PagesSpider(Spider):
+    name = "pages"
+
+    def __init__(self, urls=(), failures=None, **kwargs):
+        super().__init__(**kwargs)
+        self.urls = urls
+        self.failures = failures
+
+    async def start(self):
+        for url in self.urls:
+            yield Request(url, errback=self.failed)
+
+    def parse(self, response):
+        yield {"url": response.url}
+
+    def failed(self, failure):
+        self.failures.append(failure.type.__name__)
+
+
+def crawl(urls, output_queue):
+    items = []
+    failures = []
+    process = CrawlerProcess(settings={
+        "LOG_ENABLED": False,
+        "CONCURRENT_REQUESTS": 4,
+        "CIRCUIT_BREAKER_ENABLED": True,
+        "CIRCUIT_BREAKER_WINDOW": 4,
+        "CIRCUIT_BREAKER_MIN_REQUESTS": 4,
+        "CIRCUIT_BREAKER_OPEN_SECONDS": 0.5,
+        "CIRCUIT_BREAKER_MAX_TRIPS": 1,
+        "DOWNLOADER_MIDDLEWARES": {
+            "scrapy.downloadermiddlewares.retry.RetryMiddleware": None,
+            "newton_scrapping.middlewares.CircuitBreakerMiddleware": 550,
+        },
+    })
+    crawler = process.create_crawler(PagesSpider)
+    crawler.signals.connect(lambda item: items.append(item), signal=signals.item_scraped, weak=False)
+    process.crawl(crawler, urls=urls, failures=failures)
+    process.start()
+    output_queue.put((items, failures, crawler.stats.get_stats()))
+
+
+class TestCircuitBreakerCrawl(unittest.TestCase):
+    def test_failing_domain_is_given_up(self):
+        pages = {f"/page/{number}": b"<html>page</html>" for number in range(PAGES)}
+        with FixtureServer(pages) as healthy, FixtureServer(pages, error_rate=1.0) as failing:
+            urls = []
+            for path in pages:
+                urls += [healthy.url(path), failing.url(path).replace("127.0.0.1", "localhost")]
+            output_queue = Queue()
+            process = Process(target=crawl, args=(urls, output_queue))
+            process.start()
+            items, failures, stats = output_queue.get(timeout=60)
+            process.join()
+
+            self.assertEqual(len(items), PAGES)
+            self.assertEqual(len(failures), PAGES)
+            self.assertIn("CircuitOpen", failures)
+            # without the breaker: every page and its 2 retries
+            self.assertLess(len(failing.requests), PAGES)
+            self.assertEqual(stats["circuit_breaker/localhost/state"], "dead")
+            self.assertNotIn("circuit_breaker/127.0.0.1/state", stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import tempfile
+import time
+import unittest
+
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.main import Crawler
+from newton_scrapping.middlewares import ConditionalCacheMiddleware
+from newton_scrapping.test.helpers.fixture_site import ARTICLE, FixtureSiteTestCase
+from newton_scrapping.test.helpers.load_test import HTML
+
+URL = "https://example.com/article.html"
+BODY = b"<html><body>article</body></html>"
+
+
+class TestConditionalCacheMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def middleware(self, **settings):
+        self.crawler = get_crawler(settings_dict={
+            "CONDITIONAL_CACHE_ENABLED": True, "CONDITIONAL_CACHE_DIR": self.cache_dir.name, **settings,
+        })
+        middleware = ConditionalCacheMiddleware.from_crawler(self.crawler)
+        self.addCleanup(middleware.connection.close)
+        return middleware
+
+    def download(self, middleware, status=200, headers=None, body=BODY, request=None):
+        """Return the request as sent and the response the middleware hands over"""
+        request = request or Request(URL)
+        self.assertIsNone(middleware.process_request(request, None))
+        response = HtmlResponse(request.url, status=status, headers=headers, body=body, request=request)
+        return request, middleware.process_response(request, response, None)
+
+    def stat(self, name):
+        return self.crawler.stats.get_value(f"conditional_cache/{name}")
+
+    def test_not_modified_is_served_from_the_cache(self):
+        middleware = self.middleware()
+        first, _ = self.download(middleware, headers={"ETag": '"v1"', "Last-Modified": "Wed, 22 Mar 2023 09:00:00 GMT"})
+        self.assertNotIn(b"If-None-Match", first.headers)
+
+        request, response = self.download(middleware, status=304, headers={"ETag": '"v1"'}, body=b"")
+        self.assertEqual(request.headers["If-None-Match"], b'"v1"')
+        self.assertEqual(request.headers["If-Modified-Since"], b"Wed, 22 Mar 2023 09:00:00 GMT")
+        self.assertEqual((response.status, response.body), (200, BODY))
+        self.assertIn("cached", response.flags)
+        self.assertEqual((self.stat("hit"), self.stat("miss"), self.stat("bytes_saved")), (1, 1, len(BODY)))
+
+    def test_not_modified_revalidates(self):
+        middleware = self.middleware(CONDITIONAL_CACHE_MAX_AGE=100)
+        self.download(middleware, headers={"ETag": '"v1"'})
+        with middleware.connection:
+            middleware.connection.execute("UPDATE pages SET stored_at = ?", (time.time() - 90,))
+        # new validators of the 304 are kept, and the page for another max age
+        self.download(middleware, status=304, headers={"ETag": '"v2"'}, body=b"")
+        with middleware.connection:
+            middleware.connection.execute("UPDATE pages SET stored_at = stored_at - 20")
+        request, response = self.download(middleware, status=304, body=b"")
+        self.assertEqual(request.headers["If-None-Match"], b'"v2"')
+        self.assertEqual(response.body, BODY)
+
+    def test_expired(self):
+        middleware = self.middleware(CONDITIONAL_CACHE_MAX_AGE=100)
+        self.download(middleware, headers={"ETag": '"v1"'})
+        with middleware.connection:
+            middleware.connection.execute("UPDATE pages SET stored_at = ?", (time.time() - 101,))
+        request, _ = self.download(middleware, headers={"ETag": '"v1"'})
+        self.assertNotIn(b"If-None-Match", request.headers)
+        self.assertEqual(self.stat("miss"), 2)
+
+    def test_evicted_before_the_not_modified(self):
+        middleware = self.middleware()
+        self.download(middleware, headers={"ETag": '"v1"'})
+        request = Request(URL)
+        middleware.process_request(request, None)
+        with middleware.connection:
+            middleware.connection.execute("DELETE FROM pages")
+        retry = middleware.process_response(request, Response(URL, status=304, request=request), None)
+        self.assertIsInstance(retry, Request)
+        self.assertNotIn(b"If-None-Match", retry.headers)
+
+    def test_least_recently_used_are_evicted(self):
+        # room for about two compressed pages
+        middleware = self.middleware(CONDITIONAL_CACHE_MAX_BYTES=80)
+        for path in ("/a", "/b"):
+            self.download(middleware, headers={"ETag": '"v1"'}, request=Request(URL + path))
+        # /a is read again, /b is the least recently used
+        self.download(middleware, status=304, body=b"", request=Request(URL + "/a"))
+        self.download(middleware, headers={"ETag": '"v1"'}, request=Request(URL + "/c"))
+        urls = [url for url, in middleware.connection.execute("SELECT url FROM pages ORDER BY url")]
+        self.assertEqual(urls, [URL + "/a", URL + "/c"])
+        self.assertEqual(self.stat("evicted"), 1)
+
+    def test_misses_are_cacheable_requests(self):
+        middleware = self.middleware()
+        self.download(middleware, headers={"ETag": '"v1"'}, request=Request(URL, method="POST"))
+        self.download(middleware, headers={"ETag": '"v1"'}, request=Request(URL, meta={"dont_cache": True}))
+        self.download(middleware, status=404, headers={"ETag": '"v1"'})
+        self.download(middleware, headers={"ETag": '"v1"'}, request=Request(URL, headers={"If-None-Match": '"v0"'}))
+        self.assertIsNone(self.stat("miss"))
+        self.assertIsNone(self.stat("store"))
+        # not even a validator, still a miss
+        self.download(middleware)
+        self.assertEqual(self.stat("miss"), 1)
+
+
+class TestConditionalCacheCrawl(FixtureSiteTestCase):
+    def test_recrawl(self):
+        site = self.serve({"/article.html": (ARTICLE.encode("utf-8"), HTML)})
+        with tempfile.TemporaryDirectory() as cache_dir:
+            profile = {"DOWNLOAD_DELAY": 0, "CONDITIONAL_CACHE_ENABLED": True, "CONDITIONAL_CACHE_DIR": cache_dir}
+            query = {"type": "article", "link": site.url("/article.html")}
+            first = Crawler(query, profile=profile)
+            self.assertEqual(first.crawl()[0]["raw_response"]["content"], ARTICLE)
+            second = Crawler(query, profile=profile)
+            self.assertEqual(second.crawl()[0]["raw_response"]["content"], ARTICLE)
+
+            (_, headers), (_, conditional) = site.requests
+            self.assertNotIn("If-None-Match", headers)
+            self.assertTrue(conditional["If-None-Match"])
+            self.assertEqual(first.stats["conditional_cache/miss"], 1)
+            self.assertEqual(second.stats["downloader/response_status_count/304"], 1)
+            self.assertEqual(second.stats["conditional_cache/hit"], 1)
+            self.assertNotIn("conditional_cache/miss", second.stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
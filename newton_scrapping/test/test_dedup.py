@@ -0,0 +1,206 @@
+import os
+import random
+import tempfile
+import unittest
+
+from scrapy import Spider
+from scrapy.exceptions import DropItem
+from scrapy.http import Request, TextResponse
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.dedup import (
+    CanonicalDupeFilter, DedupIndex, hamming_distance, item_url, normalize_url, simhash,
+)
+from newton_scrapping.main import _exclude_items, _requested_link
+from newton_scrapping.pipelines import DedupPipeline
+from newton_scrapping.test.helpers.utils import get_article_content
+
+random.seed(7)
+WORDS = [f"word{index}" for index in range(500)]
+TEXT = " ".join(random.choice(WORDS) for _ in range(400))
+EDITED = TEXT.replace(TEXT.split()[10], "changed", 1)
+
+
+def article(url, text=TEXT):
+    return {
+        "raw_response": {"content_type": "text/html", "content": f'<link href="{url}" rel="canonical">'},
+        "parsed_data": {"title": ["Title"], "text": [text]},
+    }
+
+
+class TestNormalizeUrl(unittest.TestCase):
+    def test_variants_are_equal(self):
+        url = "https://example.com/politik/story-1"
+        for variant in (
+            "http://www.example.com/politik/story-1/",
+            "https://example.com/politik/story-1?utm_source=feed&utm_medium=rss#comments",
+            "https://amp.example.com/politik/story-1",
+            "https://example.com/amp/politik/story-1",
+            "https://example.com/politik/story-1/amp/",
+            "https://m.example.com/politik/story-1?fbclid=abc&amp",
+        ):
+            self.assertEqual(normalize_url(variant), normalize_url(url), variant)
+
+    def test_other_params_are_kept(self):
+        self.assertEqual(
+            normalize_url("https://example.com/story?page=2&id=1&utm_campaign=x"),
+            "https://example.com/story?id=1&page=2",
+        )
+        self.assertNotEqual(
+            normalize_url("https://example.com/story?id=1"), normalize_url("https://example.com/story?id=2")
+        )
+
+
+class TestSimhash(unittest.TestCase):
+    def test_near_duplicates_are_close(self):
+        other = " ".join(random.choice(WORDS) for _ in range(400))
+        self.assertLessEqual(hamming_distance(simhash(TEXT), simhash(EDITED)), 3)
+        self.assertGreater(hamming_distance(simhash(TEXT), simhash(other)), 10)
+
+    def test_short_text(self):
+        self.assertIsNone(simhash("Too short to tell"))
+
+
+class TestItemUrl(unittest.TestCase):
+    def test_fixture(self):
+        item = get_article_content("newton_scrapping/test/data/test_article_1.json")[0]
+        url = ("https://indianexpress.com/article/education/"
+               "qs-world-university-rankings-by-subject-du-iit-delhi-mumbai-iisc-courses-8512300/")
+        self.assertEqual(item_url(item), url)
+        del item["parsed_json"]
+        self.assertEqual(item_url(item), url)
+
+
+class TestDedupIndex(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.state_dir.name, "dedup.sqlite3")
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def test_find_similar(self):
+        index = DedupIndex(self.path)
+        fingerprint = simhash(TEXT)
+        document = index.add(["https://example.com/a"], fingerprint)
+        self.assertEqual(index.find_similar(fingerprint ^ 0b101), document)
+        self.assertIsNone(index.find_similar(fingerprint ^ 0xF0F0, distance=3))
+        self.assertTrue(index.has_url("https://example.com/a"))
+        index.close()
+
+    def test_bounded(self):
+        index = DedupIndex(self.path, max_entries=2)
+        for name in "abc":
+            index.add([f"https://example.com/{name}"], None)
+        self.assertFalse(index.has_url("https://example.com/a"))
+        self.assertTrue(index.has_url("https://example.com/c"))
+        count = index.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        self.assertEqual(count, 2)
+        index.close()
+
+
+class TestDedupPipeline(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.crawler = get_crawler(settings_dict={
+            "DEDUP_INDEX_PATH": os.path.join(self.state_dir.name, "dedup.sqlite3")
+        })
+        self.spider = Spider("article")
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def test_duplicates_are_dropped_across_runs(self):
+        crawler = self.crawler
+        pipeline = DedupPipeline.from_crawler(crawler)
+        pipeline.open_spider(self.spider)
+        item = article("https://example.com/politik/story-1")
+        self.assertIs(pipeline.process_item(item, self.spider), item)
+        request = Request("https://example.com/s/1", meta={"redirect_urls": ["https://t.co/abc"]})
+        pipeline.index_response_urls(item, TextResponse(request.url, request=request))
+        with self.assertRaises(DropItem):
+            pipeline.process_item(article("https://amp.example.com/politik/story-1?utm_source=x"), self.spider)
+        # same story under another category path
+        with self.assertRaises(DropItem):
+            pipeline.process_item(article("https://example.com/news/story-1", EDITED), self.spider)
+        other = article("https://example.com/politik/story-2", TEXT[::-1])
+        self.assertIs(pipeline.process_item(other, self.spider), other)
+        pipeline.close_spider(self.spider)
+        self.assertEqual(crawler.stats.get_value("dedup/url_duplicates"), 1)
+        self.assertEqual(crawler.stats.get_value("dedup/near_duplicates"), 1)
+
+        # the next run filters the requests of both stories and of the merged URLs
+        dupefilter = CanonicalDupeFilter.from_crawler(crawler)
+        for url in (
+            "http://www.example.com/politik/story-1/",
+            "https://example.com/news/story-1",
+            "https://example.com/politik/story-2",
+            "https://example.com/s/1",
+            "https://t.co/abc",
+        ):
+            self.assertTrue(dupefilter.request_seen(Request(url)), url)
+        self.assertFalse(dupefilter.request_seen(Request("https://example.com/politik/story-3")))
+        self.assertTrue(dupefilter.request_seen(Request("https://example.com/politik/story-3?utm_medium=rss")))
+        dupefilter.close("finished")
+
+    def test_invalid_distance(self):
+        for distance in (-1, 4):
+            crawler = get_crawler(settings_dict={
+                "DEDUP_INDEX_PATH": self.crawler.settings["DEDUP_INDEX_PATH"], "DEDUP_SIMHASH_DISTANCE": distance,
+            })
+            with self.assertRaisesRegex(Exception, "Invalid DEDUP_SIMHASH_DISTANCE"):
+                DedupPipeline.from_crawler(crawler)
+
+    def test_items_without_parsed_data_pass(self):
+        pipeline = DedupPipeline.from_crawler(self.crawler)
+        pipeline.open_spider(self.spider)
+        entry = {"link": "https://example.com/a.html"}
+        self.assertIs(pipeline.process_item(entry, self.spider), entry)
+        self.assertIs(pipeline.process_item(entry, self.spider), entry)
+        pipeline.close_spider(self.spider)
+
+
+class TestDroppedItems(unittest.TestCase):
+    def response(self, url, **meta):
+        request = Request(url, meta=meta)
+        return TextResponse(url, body=b"", request=request)
+
+    def test_requested_link(self):
+        # the link of an "articles" query, then the URL before the redirects, then the page URL
+        response = self.response(
+            "https://example.com/b.html", batch_link="https://example.com/a", redirect_urls=["https://example.com/c"],
+        )
+        self.assertEqual(_requested_link(response), "https://example.com/a")
+        response = self.response("https://example.com/b.html", redirect_urls=["https://example.com/c"])
+        self.assertEqual(_requested_link(response), "https://example.com/c")
+        self.assertEqual(_requested_link(self.response("https://example.com/b.html")), "https://example.com/b.html")
+
+    def test_exclude_results(self):
+        links = {"https://example.com/a"}
+        output = []
+        callback = _exclude_items(output.extend, links)
+        callback([
+            {"link": "https://example.com/a", "data": [article("https://example.com/a")], "error": None},
+            {"link": "https://example.com/b", "data": [article("https://example.com/b")], "error": None},
+        ])
+        # the dropped link keeps its result, without data
+        self.assertEqual([(result["link"], len(result["data"])) for result in output], [
+            ("https://example.com/a", 0), ("https://example.com/b", 1),
+        ])
+
+    def test_exclude_article(self):
+        links = set()
+        output = []
+        callback = _exclude_items(output.append, links, "https://example.com/a", single=True)
+        callback(article("https://example.com/a"))
+        links.add("https://example.com/a")
+        callback(article("https://example.com/a"))
+        self.assertEqual(len(output), 1)
+
+        output = []
+        _exclude_items(output.extend, links, "https://example.com/a")([article("https://example.com/a")])
+        self.assertEqual(output, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
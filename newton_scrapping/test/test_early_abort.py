@@ -0,0 +1,133 @@
+import gzip
+import unittest
+import zlib
+from multiprocessing import Process, Queue
+
+from scrapy import Spider, signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.exceptions import NotConfigured, StopDownload
+from scrapy.http import Headers, HtmlResponse, Request
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.main import Crawler
+
+from newton_scrapping.middlewares import EarlyAbortMiddleware
+from newton_scrapping.test.helpers.fixture_server import FixtureServer
+
+HEAD = b'<html><head><script type="application/ld+json">{"@type": "NewsArticle", "articleBody": "Text"}</script></head>'
+PAGE = HEAD + b"<body><article>" + b"<p>text</p>" * 1000 + b"</article>" + b"<div id=comments>" + b"x" * 100000
+
+
+class TestEarlyAbortMiddleware(unittest.TestCase):
+    def middleware(self, **settings):
+        self.crawler = get_crawler(settings_dict=settings)
+        return EarlyAbortMiddleware.from_crawler(self.crawler)
+
+    def download(self, middleware, body, headers=None, meta=None, chunk_size=100):
+        """Return the bytes received before the download was stopped"""
+        request = Request("https://example.com/article.html", meta=meta or {})
+        spider = Spider("article")
+        middleware.headers_received(Headers(headers or {}), len(body), request, spider)
+        received = 0
+        for start in range(0, len(body), chunk_size):
+            chunk = body[start:start + chunk_size]
+            received += len(chunk)
+            try:
+                middleware.bytes_received(chunk, request, spider)
+            except StopDownload as stop:
+                self.assertFalse(stop.fail)
+                response = HtmlResponse(request.url, body=body[:received], request=request)
+                self.assertIn("truncated", middleware.process_response(request, response, spider).flags)
+                return received
+        middleware.process_response(request, HtmlResponse(request.url, request=request), spider)
+        return received
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(NotConfigured):
+            self.middleware()
+
+    def test_end_marker(self):
+        middleware = self.middleware(EARLY_ABORT_END_MARKERS=["</article>"])
+        received = self.download(middleware, PAGE)
+        self.assertLess(received, PAGE.index(b"</article>") + 200)
+        self.assertGreaterEqual(received, PAGE.index(b"</article>") + len(b"</article>"))
+        self.assertEqual(self.crawler.stats.get_value("early_abort/end_marker"), 1)
+        self.assertEqual(self.crawler.stats.get_value("early_abort/bytes_skipped"), len(PAGE) - received)
+
+    def test_end_marker_in_gzip_body(self):
+        middleware = self.middleware(EARLY_ABORT_END_MARKERS=["</article>"])
+        body = gzip.compress(PAGE)
+        # markers cut between chunks and compressed data are found
+        received = self.download(middleware, body, {"Content-Encoding": "gzip"}, chunk_size=7)
+        self.assertLess(received, len(body))
+        self.assertIn(b"</article>", zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body[:received]))
+
+    def test_json_ld_body(self):
+        middleware = self.middleware(EARLY_ABORT_JSON_LD_BODY=True)
+        self.assertLess(self.download(middleware, PAGE, chunk_size=20), len(HEAD) + 20)
+        self.assertEqual(self.crawler.stats.get_value("early_abort/json_ld"), 1)
+
+    def test_max_bytes_and_meta(self):
+        middleware = self.middleware(EARLY_ABORT_MAX_BYTES=1000)
+        self.assertEqual(self.download(middleware, PAGE), 1000)
+        self.assertEqual(self.download(middleware, PAGE, meta={"early_abort": False}), len(PAGE))
+        self.assertEqual(self.download(middleware, PAGE, meta={"early_abort": {"max_bytes": 5000}}), 5000)
+        self.assertEqual(self.crawler.stats.get_value("early_abort/max_bytes"), 2)
+
+
+class TestCrawlerSettings(unittest.TestCase):
+    def settings(self, query, **options):
+        settings = Settings()
+        Crawler(query, **options).apply_settings(settings)
+        return settings
+
+    def test_limits_by_query_type(self):
+        limits = {"article": 500000, "sitemap": 50000000}
+        settings = self.settings({"type": "articles", "links": []}, max_body_bytes=limits, end_markers=["</article>"])
+        self.assertEqual(settings.getint("EARLY_ABORT_MAX_BYTES"), 500000)
+        self.assertEqual(settings.getlist("EARLY_ABORT_END_MARKERS"), ["</article>"])
+        settings = self.settings({"type": "sitemap"}, max_body_bytes=limits)
+        self.assertEqual(settings.getint("EARLY_ABORT_MAX_BYTES"), 0)
+        self.assertEqual(settings.getint("DOWNLOAD_MAXSIZE"), 50000000)
+
+
+class ArticleSpider(Spider):
+    name = "article"
+    start_urls = []
+
+    def parse(self, response):
+        yield {"size": len(response.body), "flags": response.flags}
+
+
+def crawl(url, output_queue):
+    items = []
+    process = CrawlerProcess(settings={
+        "LOG_ENABLED": False,
+        "EARLY_ABORT_END_MARKERS": ["</article>"],
+        "DOWNLOADER_MIDDLEWARES": {"newton_scrapping.middlewares.EarlyAbortMiddleware": 950},
+    })
+    crawler = process.create_crawler(ArticleSpider)
+    crawler.signals.connect(lambda item: items.append(item), signal=signals.item_scraped, weak=False)
+    process.crawl(crawler, start_urls=[url])
+    process.start()
+    output_queue.put((items, crawler.stats.get_stats()))
+
+
+class TestEarlyAbortCrawl(unittest.TestCase):
+    def test_page_is_cut_after_marker(self):
+        with FixtureServer({"/article.html": PAGE}, "text/html") as server:
+            output_queue = Queue()
+            process = Process(target=crawl, args=(server.url("/article.html"), output_queue))
+            process.start()
+            items, stats = output_queue.get(timeout=60)
+            process.join()
+        self.assertEqual(len(items), 1)
+        self.assertLess(items[0]["size"], len(PAGE))
+        self.assertIn("truncated", items[0]["flags"])
+        self.assertEqual(stats["early_abort/end_marker"], 1)
+        self.assertGreater(stats["early_abort/bytes_skipped"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
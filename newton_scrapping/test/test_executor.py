@@ -0,0 +1,102 @@
+import unittest
+from multiprocessing import Process, Queue
+
+from scrapy import Spider, signals
+from scrapy.crawler import CrawlerProcess
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.executor import ParseExecutor, build_article, parse_executor_for
+from newton_scrapping.items import NewtonScrappingItem
+from newton_scrapping.main import Crawler, project_settings
+from newton_scrapping.test.helpers.fixture_server import FixtureServer
+from newton_scrapping.test.helpers.utils import get_article_content
+
+ARTICLE = get_article_content("newton_scrapping/test/data/test_article_1.json")[0]["raw_response"]["content"]
+PAGES = 12
+
+
+def add_text(response, record):
+    # module level: sent to the worker processes
+    record["parsed_data"]["text"] = [" ".join(response.css("p ::text").getall()[:3])]
+    return record
+
+
+def article_response(url="https://example.com/article.html"):
+    return HtmlResponse(
+        url, body=ARTICLE.encode("utf-8"), headers={"Content-Type": "text/html; charset=utf-8"}
+    )
+
+
+class ArticleSpider(Spider):
+    name = "articles"
+
+    def __init__(self, urls=(), **kwargs):
+        super().__init__(**kwargs)
+        self.urls = urls
+
+    async def start(self):
+        for url in self.urls:
+            yield Request(url, dont_filter=True)
+
+    async def parse(self, response):
+        executor = parse_executor_for(self.crawler)
+        record = await maybe_deferred_to_future(executor.parse(response, finish=add_text))
+        yield {"url": response.url, **record}
+
+
+def crawl_articles(urls, workers, output_queue):
+    items = []
+    process = CrawlerProcess(settings={
+        "LOG_ENABLED": False,
+        "PARSE_EXECUTOR_WORKERS": workers,
+        "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+    })
+    crawler = process.create_crawler(ArticleSpider)
+    crawler.signals.connect(lambda item: items.append(item), signal=signals.item_scraped, weak=False)
+    process.crawl(crawler, urls=urls)
+    process.start()
+    output_queue.put((items, crawler.stats.get_stats()))
+
+
+class TestParseExecutor(unittest.TestCase):
+    def test_worker_record_is_the_inline_record(self):
+        response = article_response()
+        expected = build_article(response, finish=add_text)
+        self.assertIsInstance(expected, NewtonScrappingItem)
+        self.assertTrue(expected["parsed_data"]["title"])
+        executor = ParseExecutor(workers=1)
+        try:
+            record, seconds = executor.submit(response, finish=add_text).result(timeout=60)
+        finally:
+            executor.shutdown()
+        self.assertEqual(record, expected)
+        self.assertGreater(seconds, 0)
+
+    def test_workers_of_the_crawler(self):
+        query = {"type": "article", "link": "https://example.com/article.html"}
+        for parse_workers, workers in ((None, 0), (0, 0), (3, 3)):
+            settings = project_settings()
+            Crawler(query, parse_workers=parse_workers).apply_settings(settings)
+            crawler = get_crawler(settings_dict={"PARSE_EXECUTOR_WORKERS": settings["PARSE_EXECUTOR_WORKERS"]})
+            self.assertEqual(ParseExecutor.from_crawler(crawler).workers, workers)
+
+    def test_crawl(self):
+        pages = {f"/article/{number}.html": ARTICLE.encode("utf-8") for number in range(PAGES)}
+        with FixtureServer(pages, "text/html; charset=utf-8") as site:
+            for workers in (0, 2):
+                output_queue = Queue()
+                process = Process(target=crawl_articles, args=([site.url(path) for path in pages], workers, output_queue))
+                process.start()
+                items, stats = output_queue.get(timeout=120)
+                process.join()
+
+                self.assertEqual(len(items), PAGES)
+                expected = build_article(article_response(items[0]["url"]), finish=add_text)
+                self.assertEqual(items[0]["parsed_data"], expected["parsed_data"])
+                self.assertEqual(stats.get("parse_executor/pages"), PAGES if workers else None)
+
+
+if __name__ == "__main__":
+    unittest.main()
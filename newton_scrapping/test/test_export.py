@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from newton_scrapping.export import article_row, export_articles, parse_timestamp
+from newton_scrapping.pipelines import open_sink
+from newton_scrapping.test.helpers.utils import get_article_content
+from newton_scrapping.utils import compact_raw_response
+
+try:
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ARTICLE = get_article_content("newton_scrapping/test/data/test_article_1.json")[0]
+LINK = "https://example.com/qs-world-university-rankings.html"
+
+
+def article(number):
+    parsed_data = {
+        **ARTICLE["parsed_data"],
+        "title": [f"Article {number}"],
+        "published_at": ["2023-03-22T14:52:00+05:30"],
+        "section": ["News", "Education" if number % 2 else "Sports"],
+    }
+    return {**ARTICLE, "parsed_data": parsed_data}
+
+
+class TestArticleRow(unittest.TestCase):
+    def test_fixture(self):
+        row = article_row(ARTICLE)
+        self.assertTrue(row["url"].startswith("https://indianexpress.com/"))
+        self.assertEqual(row["publisher"], "The Indian Express")
+        self.assertEqual(row["author"], ["Express News Service"])
+        self.assertEqual(row["section"], "News > Education")
+        self.assertEqual(row["source_country"], "India")
+        self.assertTrue(row["images"][0].startswith("https://images.indianexpress.com/"))
+        # not an ISO 8601 date
+        self.assertIsNone(row["published_at"])
+        self.assertEqual(row["raw_html"], ARTICLE["raw_response"]["content"])
+
+    def test_compacted_raw_response(self):
+        record = compact_raw_response(ARTICLE, "gzip")
+        self.assertEqual(article_row(record)["raw_html"], ARTICLE["raw_response"]["content"])
+
+    def test_timestamps(self):
+        utc = datetime(2023, 3, 22, 9, 22, tzinfo=timezone.utc)
+        self.assertEqual(parse_timestamp("2023-03-22T14:52:00+05:30"), utc)
+        self.assertEqual(parse_timestamp("Wed, 22 Mar 2023 09:22:00 GMT"), utc)
+        self.assertEqual(parse_timestamp("2023-03-22T09:22:00"), utc)
+        self.assertIsNone(parse_timestamp("22-03-2023 at 14:52 IST"))
+
+
+@unittest.skipUnless(pyarrow, "pyarrow is not installed")
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def test_parquet_row_groups(self):
+        path = os.path.join(self.output_dir.name, "articles.parquet")
+        results = [{"link": f"{LINK}?{number}", "data": [article(number)], "error": None} for number in range(25)]
+        self.assertEqual(export_articles(results, path, row_group_size=10), 25)
+
+        parquet = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual([parquet.metadata.row_group(index).num_rows for index in range(3)], [10, 10, 5])
+        table = parquet.read()
+        self.assertEqual(str(table.schema.field("publisher").type), "dictionary<values=string, indices=int32, ordered=0>")
+        self.assertEqual(str(table.schema.field("published_at").type), "timestamp[us, tz=UTC]")
+        self.assertEqual(table.column("url")[3].as_py(), f"{LINK}?3")
+        self.assertEqual(table.column("section")[3].as_py(), "News > Education")
+        self.assertEqual(str(table.schema.field("section").type), str(table.schema.field("publisher").type))
+        self.assertEqual(table.column("published_at")[0].as_py(), datetime(2023, 3, 22, 9, 22, tzinfo=timezone.utc))
+
+    def test_arrow_with_separate_raw_html(self):
+        path = os.path.join(self.output_dir.name, "articles.arrow")
+        export_articles([article(number) for number in range(3)], path, raw_html="file")
+        with pyarrow.ipc.open_file(path) as reader:
+            table = reader.read_all()
+        self.assertNotIn("raw_html", table.column_names)
+        self.assertEqual(table.column("title").to_pylist(), ["Article 0", "Article 1", "Article 2"])
+        with pyarrow.ipc.open_file(os.path.join(self.output_dir.name, "articles.raw.arrow")) as reader:
+            raw = reader.read_all()
+        self.assertEqual(raw.column("raw_html")[0].as_py(), ARTICLE["raw_response"]["content"])
+
+    def test_sitemap_entries(self):
+        path = os.path.join(self.output_dir.name, "links.parquet")
+        export_articles([{"link": LINK, "title": "Title", "lastmod": "2023-03-22"}], path, raw_html="omit")
+        row = pyarrow.parquet.read_table(path).to_pylist()[0]
+        self.assertEqual((row["url"], row["title"]), (LINK, "Title"))
+        self.assertEqual(row["modified_at"], datetime(2023, 3, 22, tzinfo=timezone.utc))
+
+    def test_sink(self):
+        path = os.path.join(self.output_dir.name, "items.parquet")
+        sink = open_sink(f"parquet:{path}", row_group_size=4)
+        # batches of the BatchingPipeline, raw_response compacted by RAW_RESPONSE_MODE
+        for first in range(0, 10, 3):
+            sink.write([compact_raw_response(article(number), "gzip") for number in range(first, min(first + 3, 10))])
+        sink.close()
+        parquet = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual([parquet.metadata.row_group(index).num_rows for index in range(3)], [4, 4, 2])
+        self.assertEqual(parquet.read().column("raw_html")[9].as_py(), ARTICLE["raw_response"]["content"])
+
+
+if __name__ == "__main__":
+    unittest.main()
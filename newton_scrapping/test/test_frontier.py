@@ -0,0 +1,202 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.frontier import (
+    DONE, FAILED, LEASED, QUEUED, Frontier, FrontierDupeFilter, RedisFrontier, crawl_frontier, open_frontier,
+)
+from newton_scrapping.test.helpers.fixture_site import FixtureSiteTestCase, article_pages
+from newton_scrapping.test.helpers.resp_server import RespServer
+
+
+def links(domain, count):
+    return [f"https://{domain}/article-{number}.html" for number in range(count)]
+
+
+class FrontierTests:
+    """Tests of every frontier backend, open() returns a new node of the same frontier at `uri`"""
+
+    uri = None
+
+    def open(self, **options):
+        frontier = open_frontier(self.uri, **options)
+        self.addCleanup(frontier.close)
+        return frontier
+
+    def test_add_deduplicates(self):
+        frontier = self.open()
+        self.assertEqual(frontier.add(links("a.com", 3)), 3)
+        # variants of the same article, from another node
+        other = self.open()
+        self.assertEqual(other.add(["https://www.a.com/article-1.html?utm_source=feed", "https://a.com/new.html"]), 1)
+        self.assertEqual(frontier.counts(), {QUEUED: 4, LEASED: 0, DONE: 0, FAILED: 0})
+        self.assertEqual(frontier.mark_seen("requests", [1, 2]), [False, False])
+        self.assertEqual(other.mark_seen("requests", [2, 3]), [True, False])
+
+    def test_seeds(self):
+        frontier = self.open()
+        self.assertEqual(frontier.seed(), 0)
+        frontier.mark_seen(frontier.requests_namespace(0), [1])
+        self.assertEqual(frontier.new_seed(), 1)
+        other = self.open()
+        self.assertEqual(other.seed(), 1)
+        self.assertEqual(other.mark_seen(other.requests_namespace(1), [1, 2]), [False, False])
+        self.assertEqual(other.new_seed(), 2)
+        # the requests of the previous seed are forgotten
+        self.assertEqual(frontier.mark_seen(frontier.requests_namespace(1), [1]), [False])
+
+    def test_dupefilter_of_a_seed(self):
+        def dupefilter():
+            dupefilter = FrontierDupeFilter.from_crawler(get_crawler(settings_dict={"FRONTIER_URI": self.uri}))
+            self.addCleanup(dupefilter.close, "finished")
+            return dupefilter
+
+        request = Request("https://a.com/sitemap-1.xml")
+        self.open().new_seed()
+        self.assertFalse(dupefilter().request_seen(request))
+        # another node of the same seed
+        self.assertTrue(dupefilter().request_seen(request))
+        self.open().new_seed()
+        self.assertFalse(dupefilter().request_seen(request))
+
+    def test_lease_and_ack(self):
+        frontier = self.open(rate=None)
+        frontier.add(links("a.com", 5))
+        lease = frontier.lease(3)
+        self.assertEqual(len(lease), 3)
+        self.assertEqual(len(frontier.lease(10)), 2)
+        self.assertIsNone(frontier.lease(10))
+        frontier.ack(lease)
+        self.assertEqual(frontier.counts(), {QUEUED: 0, LEASED: 2, DONE: 3, FAILED: 0})
+
+    def test_visibility_timeout(self):
+        frontier = self.open(rate=None, lease_seconds=0.2)
+        frontier.add(links("a.com", 2))
+        crashed = frontier.lease(10)
+        time.sleep(0.3)
+        # another node gets the links of the crashed one
+        lease = self.open(rate=None, lease_seconds=0.2).lease(10)
+        self.assertEqual(sorted(lease.links), sorted(crashed.links))
+        frontier.ack(crashed)
+        self.assertEqual(frontier.counts()[DONE], 0)
+        frontier.ack(lease)
+        self.assertEqual(frontier.counts()[DONE], 2)
+
+    def test_fail_and_retry(self):
+        frontier = self.open(rate=None, max_attempts=2, retry_delay=0.2)
+        frontier.add(links("a.com", 2))
+        lease = frontier.lease(10)
+        frontier.ack(lease, lease.links[:1])
+        frontier.fail(lease, {lease.links[1]: "HTTP 500"})
+        self.assertIsNone(frontier.lease(10))
+        time.sleep(0.3)
+        retry = frontier.lease(10)
+        self.assertEqual(retry.links, lease.links[1:])
+        frontier.fail(retry, {retry.links[0]: "HTTP 503"})
+        self.assertEqual(frontier.failures(), {lease.links[1]: "HTTP 503"})
+        self.assertEqual(frontier.counts(), {QUEUED: 0, LEASED: 0, DONE: 1, FAILED: 1})
+
+    def test_rate_limits_across_nodes(self):
+        # 3 links of a.com and 6 of b.com per window of 1000 seconds
+        options = {"rate": 0.003, "rates": {"b.com": 0.006}, "rate_window": 1000}
+        nodes = [self.open(**options), self.open(**options)]
+        nodes[0].add(links("a.com", 10) + links("b.com", 10))
+        leased = []
+        for node in nodes * 3:
+            lease = node.lease(4)
+            leased += lease.links if lease else []
+        domains = [Frontier.domain(link) for link in leased]
+        self.assertEqual((domains.count("a.com"), domains.count("b.com")), (3, 6))
+        self.assertEqual(len(set(leased)), len(leased))
+
+    def test_concurrent_nodes(self):
+        self.open().add(links("a.com", 40) + links("b.com", 40))
+        leased = []
+
+        def node():
+            frontier = self.open(rate=None)
+            while True:
+                lease = frontier.lease(7)
+                if lease is None:
+                    break
+                leased.extend(lease.links)
+                frontier.ack(lease)
+
+        threads = [threading.Thread(target=node) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(leased), 80)
+        self.assertEqual(len(set(leased)), 80)
+        self.assertEqual(self.open().counts()[DONE], 80)
+
+
+class TestSQLiteFrontier(FrontierTests, unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.uri = "sqlite:" + os.path.join(directory.name, "shared", "frontier.sqlite3")
+
+
+class TestRedisFrontier(FrontierTests, unittest.TestCase):
+    def setUp(self):
+        self.server = RespServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.uri = self.server.url + "?name=test"
+
+    def test_keys(self):
+        frontier = self.open()
+        self.assertIsInstance(frontier, RedisFrontier)
+        frontier.add(links("a.com", 1))
+        self.assertEqual(sorted(self.server.data), ["test:domains", "test:queue:a.com", "test:seen:links"])
+
+    def test_rate_counts_the_leased_links(self):
+        # 3 links per window
+        frontier = self.open(rate=0.003, rate_window=1000)
+        frontier.add(links("a.com", 10))
+        self.assertEqual(len(frontier.lease(10)), 3)
+        rate, = [key for key in self.server.data if key.startswith("test:rate:a.com:")]
+        self.assertEqual(self.server.data[rate], 3)
+
+
+class TestCrawlFrontier(FixtureSiteTestCase):
+    def test_nodes_share_the_links(self):
+        pages = article_pages(12)
+        site = self.serve(pages)
+        with RespServer() as store:
+            uri = store.url
+            with open_frontier(uri) as frontier:
+                frontier.add(site.url(path) for path in pages)
+            frontier_options = {"rate": None, "retry_delay": 0}
+            records = []
+            totals = []
+
+            def node():
+                totals.append(crawl_frontier(
+                    uri, batch_size=4, poll_interval=0.1, frontier_options=frontier_options,
+                    profile={"DOWNLOAD_DELAY": 0}, on_results=records.extend,
+                ))
+
+            threads = [threading.Thread(target=node) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            with open_frontier(uri) as frontier:
+                self.assertEqual(frontier.counts(), {QUEUED: 0, LEASED: 0, DONE: 12, FAILED: 0})
+        self.assertEqual(sum(total[DONE] for total in totals), 12)
+        self.assertEqual(len({record["link"] for record in records}), 12)
+        self.assertTrue(all(record["data"] for record in records))
+        # every page was downloaded once
+        self.assertEqual(len(site.requests), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import multiprocessing
+import unittest
+
+from newton_scrapping.main import Crawler, CrawlerError
+from newton_scrapping.test.helpers.fixture_site import FixtureSiteTestCase, article_pages
+
+PAGES = 6
+
+
+class TestIterCrawl(FixtureSiteTestCase):
+    def setUp(self):
+        pages = article_pages(PAGES)
+        # one page at a time, slow enough for the crawl to be running when the first record arrives
+        self.site = self.serve(pages, latency=0.2)
+        self.links = [self.site.url(path) for path in pages]
+        self.profile = {"DOWNLOAD_DELAY": 0, "CONCURRENT_REQUESTS": 1}
+
+    def test_records_are_streamed(self):
+        records = Crawler({"type": "articles", "links": self.links}, profile=self.profile).iter_crawl()
+        first = next(records)
+        self.assertEqual(len(multiprocessing.active_children()), 1)
+        results = [first, *records]
+        self.assertEqual(sorted(result["link"] for result in results), sorted(self.links))
+        self.assertTrue(all(result["data"] and result["error"] is None for result in results))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_early_close_stops_the_crawl(self):
+        records = Crawler({"type": "articles", "links": self.links}, profile=self.profile).iter_crawl()
+        next(records)
+        records.close()
+        self.assertEqual(multiprocessing.active_children(), [])
+        self.assertLess(len(self.site.requests), PAGES)
+
+    def test_error(self):
+        records = Crawler({"type": "unknown", "link": self.links[0]}, profile=self.profile).iter_crawl()
+        with self.assertRaisesRegex(CrawlerError, "Invalid Type"):
+            list(records)
+        self.assertEqual(multiprocessing.active_children(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
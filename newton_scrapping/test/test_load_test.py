@@ -0,0 +1,38 @@
+import time
+import unittest
+
+import requests
+
+from newton_scrapping.test.helpers.fixture_server import FixtureServer
+from newton_scrapping.test.helpers.load_test import run_load_test
+
+PAGES = 40
+
+
+class TestFixtureServerFaults(unittest.TestCase):
+    def test_latency_and_errors(self):
+        with FixtureServer({"/page": b"page"}, latency=0.05, jitter=0.01, error_rate=0.5, seed=3) as server:
+            started = time.perf_counter()
+            statuses = [requests.get(server.url("/page")).status_code for _ in range(20)]
+            self.assertGreaterEqual(time.perf_counter() - started, 20 * 0.04)
+        self.assertEqual(set(statuses), {200, 503})
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_report(self):
+        results = run_load_test(pages=PAGES, concurrency=(2, 8), error_rate=0.05)
+        self.assertEqual([(result["concurrency"], result["query"]) for result in results],
+                         [(2, "sitemap"), (2, "articles"), (8, "sitemap"), (8, "articles")])
+        for result in results:
+            self.assertIsNone(result["error"])
+            # 503s are retried
+            self.assertEqual(result["records"], PAGES)
+            self.assertGreater(result["pages_per_sec"], 0)
+            self.assertIsNotNone(result["queue_wait_p99_ms"])
+        articles = results[1]
+        self.assertEqual(articles["pages"], PAGES + articles["server_errors"])
+        self.assertGreater(articles["cpu_ms_per_page"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+from urllib.request import urlopen
+
+from scrapy import Spider
+from scrapy.http import Request, TextResponse
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.metrics import (TIME_BUCKETS, Histogram, MetricsRegistry,
+                                      MetricsServer, metrics_for)
+from newton_scrapping.middlewares import NewtonScrappingSpiderMiddleware
+
+
+class TestHistogram(unittest.TestCase):
+    def test_quantiles(self):
+        histogram = Histogram(TIME_BUCKETS)
+        for value in [0.002] * 90 + [0.2] * 9 + [3.0]:
+            histogram.observe(value)
+        summary = histogram.to_dict()
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["buckets"]["0.0025"], 90)
+        self.assertEqual(summary["buckets"]["+Inf"], 100)
+        self.assertLessEqual(summary["p50"], 0.0025)
+        self.assertTrue(0.1 < summary["p99"] <= 0.25)
+        self.assertEqual(summary["max"], 3.0)
+
+    def test_prometheus(self):
+        registry = MetricsRegistry()
+        registry.observe("download_seconds", "example.com", 0.3)
+        with MetricsServer(registry, 0) as server:
+            host, port = server.httpd.server_address
+            text = urlopen(f"http://{host}:{port}/metrics").read().decode()
+        self.assertEqual(text, registry.to_prometheus())
+        self.assertIn('newton_scrapping_download_seconds_bucket{domain="example.com",le="0.25"} 0', text)
+        self.assertIn('newton_scrapping_download_seconds_bucket{domain="example.com",le="0.5"} 1', text)
+        self.assertIn('newton_scrapping_download_seconds_count{domain="example.com"} 1', text)
+
+
+class TestSpiderInstrumentation(unittest.TestCase):
+    def test_parse_and_pipeline_time(self):
+        crawler = get_crawler(Spider)
+        spider = Spider("instrumented")
+        middleware = NewtonScrappingSpiderMiddleware.from_crawler(crawler)
+
+        def parse_article(response):
+            yield {"title": "a"}
+            yield Request("https://example.com/b")
+
+        request = Request("https://example.com/a", callback=parse_article)
+        response = TextResponse(request.url, body=b"<html></html>", request=request)
+        output = list(middleware.process_spider_output(response, parse_article(response), spider))
+        self.assertEqual(len(output), 2)
+        middleware.item_done(output[0], spider)
+
+        histograms = metrics_for(crawler).to_dict()
+        self.assertEqual(histograms["parse_seconds"]["parse_article"]["count"], 1)
+        self.assertEqual(histograms["pipeline_seconds"]["instrumented"]["count"], 1)
+        self.assertEqual(middleware.items, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import json
+import os
+import tempfile
+import unittest
+
+from newton_scrapping.main import Crawler, date_partitions, merge_partitions
+from newton_scrapping.test.helpers.fixture_site import ARTICLE, FixtureSiteTestCase
+from newton_scrapping.test.helpers.load_test import site_pages
+
+# 120 articles over 90 days from 2023-01-01, two of them on each of the first 30 days
+SITE_PAGES = 120
+
+
+class TestDatePartitions(unittest.TestCase):
+    def test_weeks(self):
+        self.assertEqual(
+            date_partitions("2023-03-01", "2023-03-20", "week"),
+            [("2023-03-01", "2023-03-07"), ("2023-03-08", "2023-03-14"), ("2023-03-15", "2023-03-20")],
+        )
+
+    def test_days(self):
+        partitions = date_partitions("2023-02-27", "2023-03-02", "day")
+        self.assertEqual([since for since, until in partitions], ["2023-02-27", "2023-02-28", "2023-03-01", "2023-03-02"])
+        self.assertTrue(all(since == until for since, until in partitions))
+        self.assertEqual(date_partitions("2023-03-01", "2023-03-01", 10), [("2023-03-01", "2023-03-01")])
+
+    def test_invalid(self):
+        with self.assertRaises(Exception):
+            date_partitions("2023-03-01", "2023-03-20", "month")
+        with self.assertRaises(Exception):
+            date_partitions("2023-03-20", "2023-03-01", "day")
+
+
+class TestMergePartitions(unittest.TestCase):
+    def test_date_order_and_duplicates(self):
+        merged = merge_partitions([
+            [{"link": "https://example.com/a.html"}, {"link": "https://example.com/b.html"}],
+            [],
+            [{"link": "https://www.example.com/b.html"}, {"link": "https://example.com/c.html"}],
+        ])
+        self.assertEqual(
+            [entry["link"] for entry in merged],
+            ["https://example.com/a.html", "https://example.com/b.html", "https://example.com/c.html"],
+        )
+
+    def test_is_partitioned(self):
+        query = {"type": "sitemap", "domain": "https://example.com", "since": "2023-03-01", "until": "2023-03-31"}
+        self.assertFalse(Crawler(query).is_partitioned())
+        self.assertTrue(Crawler({**query, "partition": "week"}).is_partitioned())
+        self.assertFalse(Crawler({"type": "sitemap", "partition": "week"}).is_partitioned())
+
+
+class TestCrawlPartitions(FixtureSiteTestCase):
+    def setUp(self):
+        self.site = self.serve({})
+        base_url = self.site.url("")
+        self.site.pages.update(site_pages(base_url, SITE_PAGES, [ARTICLE.encode("utf-8")]))
+        self.query = {
+            "type": "sitemap", "domain": base_url, "since": "2023-01-01", "until": "2023-01-10", "partition": 5,
+        }
+        self.profile = {"DOWNLOAD_DELAY": 0, "LOAD_TEST_SERVER": base_url}
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def test_crawl(self):
+        progress = []
+        path = os.path.join(self.output_dir.name, "links.jsonl")
+        crawler = Crawler(
+            self.query, profile=self.profile, workers=2, on_progress=progress.append, sink=f"jsonl:{path}",
+            job_id="links", job_dir=os.path.join(self.output_dir.name, "jobs"),
+        )
+        entries = crawler.crawl()
+        self.assertIsNone(crawler.error)
+        self.assertEqual(len(entries), 20)
+        # merged in the order of the partitions
+        days = [entry["lastmod"][:10] for entry in entries]
+        self.assertTrue(all("2023-01-01" <= day <= "2023-01-05" for day in days[:10]))
+        self.assertTrue(all("2023-01-06" <= day <= "2023-01-10" for day in days[10:]))
+        self.assertEqual(sorted((update["since"], update["entries"]) for update in progress), [
+            ("2023-01-01", 10), ("2023-01-06", 10),
+        ])
+        self.assertEqual(sorted(update["done"] for update in progress), [1, 2])
+        # the partitions share one sink, written once with the merged entries
+        with open(path, encoding="utf-8") as file:
+            self.assertEqual([json.loads(line)["link"] for line in file], [entry["link"] for entry in entries])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.output_dir.name, "jobs"))), [
+            "links-2023-01-01_2023-01-05", "links-2023-01-06_2023-01-10",
+        ])
+
+    def test_timeout(self):
+        self.site.latency = 5
+        crawler = Crawler(self.query, profile=self.profile, workers=2, timeout=1)
+        self.assertEqual(crawler.crawl(), [])
+        self.assertEqual(crawler.error, "Crawl timed out after 1 seconds, 2 of 2 partitions not crawled")
+
+
+if __name__ == "__main__":
+    unittest.main()
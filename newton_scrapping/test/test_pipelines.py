@@ -0,0 +1,197 @@
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from multiprocessing import Process, Queue
+
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping import pipelines
+from newton_scrapping.items import NewtonScrappingItem
+from newton_scrapping.pipelines import BatchingPipeline, JsonLinesSink, open_sink
+from newton_scrapping.test.helpers.utils import get_article_content
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+ITEMS = [{"link": f"https://example.com/{number}", "title": f"Été {number}"} for number in range(5)]
+
+
+class SlowSink(JsonLinesSink):
+    """JSON lines sink taking a while to write every batch, and recording their sizes"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.batches = []
+
+    def write(self, items):
+        time.sleep(0.05)
+        self.batches.append(len(items))
+        super().write(items)
+
+
+def run_pipeline(path, settings, items, output_queue):
+    """Feed `items` to a BatchingPipeline writing to a SlowSink, one at a time as a spider would
+
+    Puts the pending items (buffered or being written) after every item, and the batch sizes.
+    """
+    from twisted.internet import defer, reactor
+
+    pipelines.SINKS["slow"] = SlowSink
+    pipeline = BatchingPipeline.from_crawler(get_crawler(settings_dict={"ITEM_SINK": f"slow:{path}", **settings}))
+    pipeline.open_spider(None)
+    pending = []
+
+    @defer.inlineCallbacks
+    def feed():
+        for item in items:
+            result = pipeline.process_item(item, None)
+            pending.append(len(pipeline.buffer) + pipeline.writing)
+            if isinstance(result, defer.Deferred):
+                yield result
+        yield pipeline.close_spider(None)
+
+    feed().addBoth(lambda _: reactor.stop())
+    reactor.run()
+    output_queue.put((pending, pipeline.sink.batches))
+
+
+def run_export_pipeline(settings, items, output_queue):
+    """Feed `items` to a BatchingPipeline writing to the ITEM_SINK of `settings`, then put True"""
+    from twisted.internet import defer, reactor
+
+    pipeline = BatchingPipeline.from_crawler(get_crawler(settings_dict=settings))
+    pipeline.open_spider(None)
+
+    @defer.inlineCallbacks
+    def feed():
+        for item in items:
+            yield defer.maybeDeferred(pipeline.process_item, item, None)
+        yield pipeline.close_spider(None)
+
+    feed().addBoth(lambda _: reactor.stop())
+    reactor.run()
+    output_queue.put(True)
+
+
+class TestSinks(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.output_dir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.output_dir.name, "output", name)
+
+    def test_jsonl(self):
+        sink = open_sink("jsonl:" + self.path("items.jsonl"))
+        sink.write(ITEMS[:2])
+        sink.write(ITEMS[2:])
+        sink.close()
+        # appended by the next run
+        sink = open_sink("jsonl:" + self.path("items.jsonl"))
+        sink.write(ITEMS[:1])
+        sink.close()
+        with open(self.path("items.jsonl"), encoding="utf-8") as file:
+            self.assertEqual([json.loads(line) for line in file], ITEMS + ITEMS[:1])
+
+    def test_sqlite(self):
+        sink = open_sink("sqlite:" + self.path("items.sqlite3"))
+        sink.write(ITEMS[:3])
+        sink.write(ITEMS[3:])
+        sink.close()
+        connection = sqlite3.connect(self.path("items.sqlite3"))
+        rows = connection.execute("SELECT data FROM items ORDER BY id").fetchall()
+        connection.close()
+        self.assertEqual([json.loads(data) for data, in rows], ITEMS)
+
+    def test_unix_socket(self):
+        path = os.path.join(self.output_dir.name, "items.sock")
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen(1)
+        self.addCleanup(server.close)
+        received = []
+
+        def read():
+            connection, _ = server.accept()
+            with connection, connection.makefile(encoding="utf-8") as lines:
+                received.extend(json.loads(line) for line in lines)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        sink = open_sink("unix:" + path)
+        sink.write(ITEMS[:2])
+        sink.write(ITEMS[2:])
+        sink.close()
+        reader.join(10)
+        self.assertEqual(received, ITEMS)
+
+    def test_invalid(self):
+        for uri in ("csv:items.csv", "jsonl:", "items.jsonl"):
+            with self.assertRaisesRegex(Exception, "Invalid Sink"):
+                open_sink(uri)
+
+
+class TestBatchingPipeline(unittest.TestCase):
+    def run_pipeline(self, settings, items):
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "items.jsonl")
+            output_queue = Queue()
+            process = Process(target=run_pipeline, args=(path, settings, items, output_queue))
+            process.start()
+            pending, batches = output_queue.get(timeout=60)
+            process.join()
+            with open(path, encoding="utf-8") as file:
+                written = [json.loads(line) for line in file]
+        return pending, batches, written
+
+    def test_flush_on_close(self):
+        pending, batches, written = self.run_pipeline(
+            {"ITEM_BATCH_SIZE": 2, "ITEM_BATCH_INTERVAL": 60}, ITEMS,
+        )
+        # two full batches, the last item is written when the spider is closed
+        self.assertEqual(batches, [2, 2, 1])
+        self.assertEqual(written, ITEMS)
+
+    def test_max_pending(self):
+        items = [{"link": f"https://example.com/{number}"} for number in range(20)]
+        pending, batches, written = self.run_pipeline(
+            {"ITEM_BATCH_SIZE": 10, "ITEM_BATCH_INTERVAL": 60, "ITEM_BATCH_MAX_PENDING": 4}, items,
+        )
+        # the buffer is written before it holds a full batch
+        self.assertLessEqual(max(pending), 4)
+        self.assertLessEqual(max(batches), 4)
+        self.assertEqual(written, items)
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_parquet_blob_dir(self):
+        article = get_article_content("newton_scrapping/test/data/test_article_1.json")[0]
+        with tempfile.TemporaryDirectory() as output_dir:
+            path = os.path.join(output_dir, "items.parquet")
+            settings = {
+                "ITEM_SINK": f"parquet:{path}",
+                "RAW_RESPONSE_MODE": "blob",
+                "RAW_BLOB_DIR": os.path.join(output_dir, "blobs"),
+            }
+            output_queue = Queue()
+            process = Process(
+                target=run_export_pipeline, args=(settings, [NewtonScrappingItem(**article)], output_queue),
+            )
+            process.start()
+            self.assertTrue(output_queue.get(timeout=60))
+            process.join()
+            # the page HTML is read back from the blob file of the custom directory
+            self.assertTrue(os.listdir(os.path.join(output_dir, "blobs")))
+            row = pyarrow.parquet.read_table(path).to_pylist()[0]
+        self.assertEqual(row["raw_html"], article["raw_response"]["content"])
+        self.assertEqual(row["publisher"], "The Indian Express")
+
+
+if __name__ == "__main__":
+    unittest.main()
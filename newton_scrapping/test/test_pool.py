@@ -0,0 +1,43 @@
+import unittest
+
+from newton_scrapping.main import CrawlerError, CrawlerPool, project_settings
+from newton_scrapping.test.helpers.fixture_site import ARTICLE, FixtureSiteTestCase, article_pages
+
+
+class TestCrawlerPool(FixtureSiteTestCase):
+    def setUp(self):
+        pages = article_pages(4)
+        self.site = self.serve(pages)
+        self.queries = [{"type": "article", "link": self.site.url(path)} for path in pages]
+
+    def test_map(self):
+        with CrawlerPool(workers=2, jobs_per_worker=2, profile={"DOWNLOAD_DELAY": 0}) as pool:
+            results = pool.map(self.queries, timeout=60)
+            # the workers keep running between jobs
+            self.assertEqual(len(pool.crawl(self.queries[0], timeout=60)), 1)
+        self.assertEqual([len(data) for data in results], [1, 1, 1, 1])
+        self.assertEqual(
+            [data[0]["raw_response"]["content"] for data in results], [ARTICLE] * 4,
+        )
+
+    def test_failed_job(self):
+        with CrawlerPool(workers=1) as pool:
+            failed = pool.submit({"type": "unknown", "link": self.queries[0]["link"]})
+            done = pool.submit(self.queries[0])
+            with self.assertRaisesRegex(CrawlerError, "Invalid Type"):
+                failed.result(60)
+            self.assertEqual(len(done.result(60)), 1)
+
+    def test_project_settings(self):
+        self.assertEqual(project_settings()["BOT_NAME"], "newton_scrapping")
+        with CrawlerPool(workers=1) as pool:
+            pool.crawl(self.queries[0], timeout=60)
+        # not the ROBOTSTXT_OBEY of settings.py
+        self.assertNotIn("/robots.txt", [path for path, _ in self.site.requests])
+        with CrawlerPool(workers=1, profile={"ROBOTSTXT_OBEY": True}) as pool:
+            pool.crawl(self.queries[0], timeout=60)
+        self.assertIn("/robots.txt", [path for path, _ in self.site.requests])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+from types import SimpleNamespace
+
+from scrapy.exceptions import NotConfigured
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.extensions import LatencyFeedbackThrottle
+from newton_scrapping.profiles import PROFILES, get_profile
+
+
+class TestProfiles(unittest.TestCase):
+    def test_get_profile(self):
+        self.assertEqual(get_profile("bulk"), PROFILES["bulk"])
+        self.assertIsNot(get_profile("bulk"), PROFILES["bulk"])
+        # a dict is applied over the default profile
+        self.assertEqual(get_profile({"CONCURRENT_REQUESTS": 4}), {"DOWNLOAD_DELAY": 0.25, "CONCURRENT_REQUESTS": 4})
+        self.assertEqual(get_profile({"DOWNLOAD_DELAY": 0})["DOWNLOAD_DELAY"], 0)
+
+    def test_unknown_profile(self):
+        with self.assertRaisesRegex(Exception, "Invalid Profile: fast"):
+            get_profile("fast")
+
+
+class TestLatencyFeedbackThrottle(unittest.TestCase):
+    def setUp(self):
+        crawler = get_crawler(settings_dict={
+            "LATENCY_THROTTLE_ENABLED": True,
+            "LATENCY_THROTTLE_WINDOW": 4,
+            "LATENCY_THROTTLE_MIN_CONCURRENCY": 2,
+            "LATENCY_THROTTLE_MAX_CONCURRENCY": 10,
+        })
+        self.slot = SimpleNamespace(concurrency=8)
+        crawler.engine = SimpleNamespace(downloader=SimpleNamespace(slots={"a.com": self.slot}))
+        self.throttle = LatencyFeedbackThrottle.from_crawler(crawler)
+
+    def window(self, latencies, status=200):
+        """Send one window of responses with these latencies, return the slot concurrency"""
+        for latency in latencies:
+            request = Request("https://a.com/", meta={"download_slot": "a.com", "download_latency": latency})
+            self.throttle.response_downloaded(Response(request.url, status=status, request=request), request, None)
+        return self.slot.concurrency
+
+    def test_flat_latency_raises_the_concurrency(self):
+        self.assertEqual(self.window([0.1, 0.1, 0.2, 0.1]), 9)
+        self.assertEqual(self.window([0.1, 0.12, 0.11, 0.1]), 10)
+        # up to the maximum
+        self.assertEqual(self.window([0.1, 0.1, 0.1, 0.1]), 10)
+
+    def test_slower_responses_halve_the_concurrency(self):
+        self.window([0.1] * 4)
+        self.assertEqual(self.window([0.2, 0.2, 0.25, 0.2]), 4)
+        # between one and two tolerances above the baseline, the concurrency is kept
+        self.assertEqual(self.window([0.14] * 4), 4)
+        self.assertEqual(self.window([0.5] * 4), 2)
+        # down to the minimum
+        self.assertEqual(self.window([1.0] * 4), 2)
+
+    def test_errors_halve_the_concurrency(self):
+        self.assertEqual(self.window([0.1] * 3), 8)
+        self.assertEqual(self.window([0.1], status=503), 4)
+
+    def test_disabled(self):
+        with self.assertRaises(NotConfigured):
+            LatencyFeedbackThrottle(get_crawler())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import subprocess
+import sys
+import unittest
+
+from newton_scrapping import registry
+
+# cumulative `python -X importtime` budget of the package and its configuration modules
+IMPORT_TIME_BUDGET_US = 50_000
+LIGHT_MODULES = ("newton_scrapping", "newton_scrapping.registry", "newton_scrapping.profiles")
+EXAMPLE_SPIDER = "newton_scrapping.test.helpers.example_spider.ExampleSpider"
+
+
+class TestSpiderRegistry(unittest.TestCase):
+    def setUp(self):
+        self.spiders = dict(registry.SPIDERS)
+        self.default_spider = registry.DEFAULT_SPIDER
+        registry.register_spider("https://www.example.com/", EXAMPLE_SPIDER)
+        registry.register_spider("news.example.org", "newton_scrapping.test.helpers.missing.Spider")
+
+    def tearDown(self):
+        registry.SPIDERS.clear()
+        registry.SPIDERS.update(self.spiders)
+        registry.DEFAULT_SPIDER = self.default_spider
+
+    def test_spider_path(self):
+        self.assertEqual(registry.spider_path({"type": "sitemap", "domain": "https://example.com"}), EXAMPLE_SPIDER)
+        self.assertEqual(
+            registry.spider_path({"type": "article", "link": "https://WWW.Example.com/a.html"}), EXAMPLE_SPIDER
+        )
+        self.assertEqual(
+            registry.spider_path({"type": "articles", "links": ["https://m.example.com/a.html"]}), EXAMPLE_SPIDER
+        )
+        registry.DEFAULT_SPIDER = None
+        with self.assertRaises(Exception):
+            registry.spider_path({"type": "article", "link": "https://example.org/a.html"})
+        with self.assertRaises(Exception):
+            registry.spider_path({"type": "link_feed"})
+
+    def test_lazy_import(self):
+        sys.modules.pop("newton_scrapping.test.helpers.example_spider", None)
+        registry._loaded.clear()
+        registry.spider_path({"type": "sitemap", "domain": "example.com"})
+        self.assertNotIn("newton_scrapping.test.helpers.example_spider", sys.modules)
+        spidercls = registry.get_spider({"type": "sitemap", "domain": "example.com"})
+        self.assertEqual(spidercls.name, "example")
+        # the broken module of another domain is never imported
+        self.assertNotIn("newton_scrapping.test.helpers.missing", sys.modules)
+
+
+class TestImportTime(unittest.TestCase):
+    def test_import_budget(self):
+        code = "import sys, " + ", ".join(LIGHT_MODULES) + "; print(','.join(sys.modules))"
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True
+        )
+        modules = result.stdout.strip().split(",")
+        self.assertFalse([module for module in modules if module.split(".")[0] in ("scrapy", "twisted")])
+
+        cumulative = 0
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].strip() in LIGHT_MODULES and not fields[2].startswith("  "):
+                cumulative += int(fields[1])
+        self.assertGreater(cumulative, 0)
+        self.assertLess(cumulative, IMPORT_TIME_BUDGET_US)
+
+
+if __name__ == "__main__":
+    unittest.main()
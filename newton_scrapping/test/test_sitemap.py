@@ -0,0 +1,229 @@
+import gzip
+import os
+import tempfile
+import unittest
+from urllib.error import HTTPError
+from urllib.request import Request as UrlRequest, urlopen
+
+from scrapy import Spider
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Headers, Request, XmlResponse
+from scrapy.utils.test import get_crawler
+
+from newton_scrapping.middlewares import IncrementalSitemapMiddleware, StreamingSitemapMiddleware
+from newton_scrapping.sitemap import SitemapState, SitemapStreamParser, parse_sitemap
+from newton_scrapping.test.helpers.fixture_server import FixtureServer
+from newton_scrapping.test.helpers.sitemap_benchmark import run_sitemap_benchmark, synthetic_sitemap
+
+CHILD_SITEMAP = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc>https://example.com/a.html</loc><lastmod>2023-03-20T10:00:00+00:00</lastmod></url>
+</urlset>"""
+
+NEWS_SITEMAP = b"""<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"
+        xmlns:news="http://www.google.com/schemas/sitemap-news/0.9"
+        xmlns:image="http://www.google.com/schemas/sitemap-image/1.0">
+  <url>
+    <loc>https://example.com/a.html</loc>
+    <image:image><image:loc>https://example.com/a.jpg</image:loc><image:title>Photo</image:title></image:image>
+    <news:news>
+      <news:publication_date>2023-03-20T10:00:00+00:00</news:publication_date>
+      <news:title>A &amp; B</news:title>
+    </news:news>
+  </url>
+  <url><loc>https://example.com/b.html</loc><lastmod>2023-02-01</lastmod></url>
+  <url><loc>https://example.com/c.html</loc></url>
+</urlset>"""
+
+SITEMAP_INDEX = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>https://example.com/sitemap-2023-02.xml.gz</loc><lastmod>2023-02-28</lastmod></sitemap>
+  <sitemap><loc>https://example.com/sitemap-2023-03.xml.gz</loc><lastmod>2023-03-31</lastmod></sitemap>
+</sitemapindex>"""
+
+
+class TestSitemapState(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.path = SitemapState.path_for_domain(self.state_dir.name, "https://example.com")
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def test_filter_new(self):
+        entries = [
+            {"link": "https://example.com/a.html", "lastmod": "2023-03-20T10:00:00+00:00"},
+            {"link": "https://example.com/b.html", "lastmod": "2023-03-21T10:00:00+00:00"},
+            {"link": "https://example.com/c.html"},
+        ]
+        state = SitemapState(self.path)
+        self.assertEqual(state.filter_new(entries), entries)
+        self.assertEqual(state.watermark, "2023-03-21T10:00:00+00:00")
+        state.close()
+
+        # a later run only gets the updated and the new links
+        state = SitemapState(self.path)
+        updated = dict(entries[0], lastmod="2023-03-22T08:00:00+00:00")
+        new = {"link": "https://example.com/d.html"}
+        self.assertEqual(state.filter_new(entries + [updated, new]), [updated, new])
+        self.assertEqual(state.watermark, "2023-03-22T08:00:00+00:00")
+        state.close()
+
+    def test_lastmod_timezones(self):
+        entry = {"link": "https://example.com/a.html", "lastmod": "2023-03-22T10:00:00+05:30"}
+        state = SitemapState(self.path)
+        self.assertEqual(state.filter_new([entry]), [entry])
+        self.assertEqual(state.watermark, "2023-03-22T04:30:00+00:00")
+        state.close()
+
+        # later in UTC, although earlier as a string
+        updated = dict(entry, lastmod="2023-03-22T06:00:00Z")
+        same = dict(entry, lastmod="Wed, 22 Mar 2023 04:30:00 GMT")
+        state = SitemapState(self.path)
+        self.assertEqual(state.filter_new([same]), [])
+        self.assertEqual(state.filter_new([updated]), [updated])
+        self.assertEqual(state.watermark, "2023-03-22T06:00:00+00:00")
+        state.close()
+
+    def test_path_for_domain(self):
+        self.assertEqual(
+            SitemapState.path_for_domain("state", "https://www.example.com/sitemap.xml"),
+            os.path.join("state", "www.example.com.sqlite3"),
+        )
+
+
+class TestSitemapStreamParser(unittest.TestCase):
+    def parse(self, body, chunk_size=1, **window):
+        parser = SitemapStreamParser(**window)
+        entries = []
+        for start in range(0, len(body), chunk_size):
+            entries.extend(parser.feed(body[start:start + chunk_size]))
+        return entries + parser.close(), parser
+
+    def test_entries(self):
+        expected = [
+            {"link": "https://example.com/a.html", "title": "A & B", "lastmod": "2023-03-20T10:00:00+00:00"},
+            {"link": "https://example.com/b.html", "title": None, "lastmod": "2023-02-01"},
+            {"link": "https://example.com/c.html", "title": None, "lastmod": None},
+        ]
+        for body in (NEWS_SITEMAP, gzip.compress(NEWS_SITEMAP)):
+            self.assertEqual(self.parse(body)[0], expected)
+            self.assertEqual(self.parse(body, chunk_size=100)[0], expected)
+
+    def test_window(self):
+        entries, parser = self.parse(NEWS_SITEMAP, 64, since="2023-03-01", until="2023-03-31")
+        # entries without date are kept
+        self.assertEqual([entry["link"] for entry in entries], ["https://example.com/a.html", "https://example.com/c.html"])
+        self.assertEqual(parser.skipped, 1)
+
+    def test_window_of_utc_days(self):
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            # 2023-02-28 in UTC
+            '<url><loc>https://example.com/a.html</loc><lastmod>2023-03-01T02:00:00+05:30</lastmod></url>'
+            '<url><loc>https://example.com/b.html</loc><lastmod>Wed, 01 Mar 2023 10:00:00 GMT</lastmod></url>'
+            '<url><loc>https://example.com/c.html</loc><lastmod>Sat, 01 Apr 2023 10:00:00 GMT</lastmod></url>'
+            '</urlset>'
+        ).encode("utf-8")
+        entries, parser = self.parse(body, 64, since="2023-03-01", until="2023-03-31")
+        self.assertEqual([entry["link"] for entry in entries], ["https://example.com/b.html"])
+        self.assertEqual(parser.skipped, 2)
+
+    def test_sitemap_index(self):
+        entries, parser = self.parse(SITEMAP_INDEX, 64, since="2023-03-01")
+        self.assertEqual(entries, [])
+        self.assertEqual(parser.sitemaps, [
+            {"link": "https://example.com/sitemap-2023-03.xml.gz", "lastmod": "2023-03-31"},
+        ])
+
+    def test_large_sitemap(self):
+        entries, parser = self.parse(synthetic_sitemap(2000), 4096, since="2023-01-01", until="2023-01-10")
+        self.assertEqual(parser.count, len(entries))
+        self.assertEqual(parser.count + parser.skipped, 2000)
+        self.assertTrue(all("2023-01-01" <= entry["lastmod"][:10] <= "2023-01-10" for entry in entries))
+
+    def test_streaming_middleware(self):
+        crawler = get_crawler()
+        middleware = StreamingSitemapMiddleware.from_crawler(crawler)
+        spider = Spider("sitemap")
+        body = gzip.compress(NEWS_SITEMAP)
+        request = Request("https://example.com/sitemap.xml.gz", meta={"sitemap_stream": {"since": "2023-03-01"}})
+        middleware.headers_received(Headers(), len(body), request, spider)
+        for start in range(0, len(body), 50):
+            middleware.bytes_received(body[start:start + 50], request, spider)
+        response = XmlResponse(request.url, body=body, request=request)
+        self.assertIs(middleware.process_response(request, response, spider), response)
+        entries, sitemaps = parse_sitemap(response)
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(crawler.stats.get_value("sitemap_stream/skipped"), 1)
+
+        # not streamed (no meta), parsed from the body
+        response = XmlResponse(request.url, body=body, request=Request(request.url))
+        self.assertEqual(parse_sitemap(response, since="2023-03-01")[0], entries)
+
+
+class TestSitemapBenchmark(unittest.TestCase):
+    def test_memory_does_not_grow_with_the_dom(self):
+        streaming, scrapy = run_sitemap_benchmark(entries=20000)
+        self.assertEqual(streaming["entries"], scrapy["entries"])
+        self.assertGreater(streaming["entries"], 0)
+        self.assertLess(streaming["peak_rss_growth_mb"], scrapy["peak_rss_growth_mb"])
+
+
+class TestIncrementalSitemapMiddleware(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.crawler = get_crawler(settings_dict={
+            "INCREMENTAL_STATE_PATH": os.path.join(self.state_dir.name, "example.com.sqlite3")
+        })
+        self.spider = Spider("sitemap")
+
+    def tearDown(self):
+        self.state_dir.cleanup()
+
+    def _fetch(self, middleware, url):
+        request = Request(url, meta={"depth": 1})
+        middleware.process_request(request, self.spider)
+        headers = {k.decode(): v[0].decode() for k, v in request.headers.items()}
+        try:
+            with urlopen(UrlRequest(url, headers=headers)) as raw_response:
+                status, raw_headers, body = raw_response.status, raw_response.headers, raw_response.read()
+        except HTTPError as error:
+            status, raw_headers, body = error.code, error.headers, b""
+        response = XmlResponse(url, status=status, headers=dict(raw_headers), body=body, request=request)
+        return middleware.process_response(request, response, self.spider)
+
+    def test_unchanged_child_sitemap_is_skipped(self):
+        with FixtureServer({"/sitemap-1.xml": CHILD_SITEMAP}) as server:
+            url = server.url("/sitemap-1.xml")
+
+            middleware = IncrementalSitemapMiddleware.from_crawler(self.crawler)
+            self.assertEqual(self._fetch(middleware, url).status, 200)
+            middleware.spider_closed(self.spider, "finished")
+
+            middleware = IncrementalSitemapMiddleware.from_crawler(self.crawler)
+            with self.assertRaises(IgnoreRequest):
+                self._fetch(middleware, url)
+            self.assertIn("If-None-Match", server.requests[-1][1])
+
+            # a changed sitemap is downloaded again
+            server.pages["/sitemap-1.xml"] = CHILD_SITEMAP.replace(b"a.html", b"b.html")
+            self.assertEqual(self._fetch(middleware, url).status, 200)
+            middleware.spider_closed(self.spider, "finished")
+
+    def test_validators_not_stored_for_interrupted_crawl(self):
+        with FixtureServer({"/sitemap-1.xml": CHILD_SITEMAP}) as server:
+            url = server.url("/sitemap-1.xml")
+            middleware = IncrementalSitemapMiddleware.from_crawler(self.crawler)
+            self._fetch(middleware, url)
+            middleware.spider_closed(self.spider, "shutdown")
+
+            middleware = IncrementalSitemapMiddleware.from_crawler(self.crawler)
+            self.assertEqual(self._fetch(middleware, url).status, 200)
+            middleware.spider_closed(self.spider, "finished")
+
+
+if __name__ == "__main__":
+    unittest.main()
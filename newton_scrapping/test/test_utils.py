@@ -0,0 +1,129 @@
+import os
+import tempfile
+import unittest
+
+from scrapy.http import TextResponse
+
+from newton_scrapping.test.helpers.utils import (get_article_content,
+                                                 offline_response_from_fixture)
+from newton_scrapping.utils import (compact_raw_response, extract_metadata,
+                                    get_parsed_data, get_parsed_json,
+                                    load_raw_content, map_tags)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PAGE = b"""<html lang="en"><head>
+<title>Fallback title</title>
+<meta property="og:title" content="OG title">
+<meta property="article:tag" content="one"><meta property="article:tag" content="two">
+<script type="application/ld+json">{"@graph": [
+    {"@type": "NewsArticle", "headline": "Headline", "author": "Jane Doe", "datePublished": "2023-03-22"},
+    {"@type": "ImageObject", "url": "https://example.com/a.jpg", "caption": "A"}
+]}</script>
+<script type="application/ld+json">{not json</script>
+</head><body>
+<div itemscope itemtype="https://schema.org/Person"><span itemprop="name">John</span>
+<div itemprop="address" itemscope itemtype="https://schema.org/PostalAddress">
+<meta itemprop="addressLocality" content="Delhi"></div></div>
+</body></html>"""
+
+
+class TestCompactRawResponse(unittest.TestCase):
+    def setUp(self):
+        self.article = get_article_content("newton_scrapping/test/data/test_article_1.json")[0]
+        self.content = self.article["raw_response"]["content"]
+        self.blob_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.blob_dir.cleanup()
+
+    def test_omit(self):
+        article = compact_raw_response(self.article, "omit")
+        self.assertEqual(article["raw_response"], {"content_type": "text/html; charset=UTF-8"})
+        self.assertEqual(article["parsed_data"], self.article["parsed_data"])
+        # the original record is left untouched
+        self.assertEqual(self.article["raw_response"]["content"], self.content)
+
+    def test_gzip(self):
+        article = compact_raw_response(self.article, "gzip")
+        self.assertEqual(article["raw_response"]["content_encoding"], "gzip+base64")
+        self.assertLess(len(article["raw_response"]["content"]), len(self.content) // 3)
+        self.assertEqual(load_raw_content(article["raw_response"]), self.content)
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd(self):
+        article = compact_raw_response(self.article, "zstd")
+        self.assertEqual(article["raw_response"]["content_encoding"], "zstd+base64")
+        self.assertLess(len(article["raw_response"]["content"]), len(self.content) // 3)
+        self.assertEqual(load_raw_content(article["raw_response"]), self.content)
+
+    def test_blob(self):
+        article = compact_raw_response(self.article, "blob", self.blob_dir.name)
+        content_ref = article["raw_response"]["content_ref"]
+        self.assertTrue(content_ref.startswith("sha256:"))
+        self.assertNotIn("content", article["raw_response"])
+        self.assertEqual(load_raw_content(article["raw_response"], self.blob_dir.name), self.content)
+
+        # same content, same blob
+        self.assertEqual(
+            compact_raw_response(self.article, "blob", self.blob_dir.name)["raw_response"]["content_ref"],
+            content_ref,
+        )
+        self.assertEqual(len(os.listdir(self.blob_dir.name)), 1)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(Exception):
+            compact_raw_response(self.article, "brotli")
+
+
+class TestExtractMetadata(unittest.TestCase):
+    def setUp(self):
+        self.response = TextResponse(url="https://example.com/a", body=PAGE, encoding="utf-8")
+
+    def test_single_extraction(self):
+        metadata = extract_metadata(self.response)
+        self.assertIs(extract_metadata(self.response), metadata)
+        self.assertEqual([value["@type"] for value in metadata["json_ld"]], ["NewsArticle", "ImageObject"])
+        self.assertEqual(metadata["meta"]["article:tag"], ["one", "two"])
+        self.assertEqual(metadata["title"], "Fallback title")
+        self.assertEqual(metadata["lang"], "en")
+        self.assertEqual(metadata["microdata"], [{
+            "@type": "Person", "name": "John",
+            "address": {"@type": "PostalAddress", "addressLocality": "Delhi"},
+        }])
+
+    def test_parsed_json_and_data(self):
+        parsed_json = get_parsed_json(self.response)
+        self.assertEqual(parsed_json["main"]["headline"], "Headline")
+        self.assertEqual(len(parsed_json["imageObjects"]), 1)
+        self.assertEqual(len(parsed_json["other"]), 1)
+        self.assertNotIn("misc", parsed_json)
+
+        parsed_data = get_parsed_data(self.response)
+        self.assertEqual(parsed_data["title"], ["Headline"])
+        self.assertEqual(parsed_data["author"], [{"@type": "Person", "name": "Jane Doe"}])
+        self.assertEqual(parsed_data["published_at"], ["2023-03-22"])
+        self.assertEqual(parsed_data["tags"], ["one", "two"])
+        self.assertEqual(parsed_data["images"], [{"link": "https://example.com/a.jpg", "caption": "A"}])
+        self.assertNotIn("description", parsed_data)
+
+    def test_tags_of_json_ld_keywords(self):
+        metadata = {"meta": {}}
+        terms = [{"@type": "DefinedTerm", "name": " x "}, {"@type": "DefinedTerm"}, "y"]
+        self.assertEqual(map_tags(metadata, {"keywords": terms}), ["x", "y"])
+        self.assertEqual(map_tags(metadata, {"keywords": 5}), ["5"])
+        self.assertEqual(map_tags(metadata, {"keywords": "a, b,"}), ["a", "b"])
+
+    def test_fixture(self):
+        response = offline_response_from_fixture("newton_scrapping/test/data/test_article_1.json")
+        parsed_data = get_parsed_data(response)
+        expected = get_article_content("newton_scrapping/test/data/test_article_1.json")[0]["parsed_data"]
+        self.assertEqual(parsed_data["author"][0], expected["author"][0])
+        self.assertEqual(parsed_data["publisher"][0]["name"], expected["publisher"][0]["name"])
+
+
+if __name__ == "__main__":
+    unittest.main()
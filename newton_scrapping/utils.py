@@ -1 +1,377 @@
 """Utility Functions"""
+
+import base64
+import gzip
+import hashlib
+import json
+import os
+import weakref
+
+RAW_RESPONSE_MODES = ("full", "omit", "gzip", "zstd", "blob")
+
+ARTICLE_TYPES = {
+    "Article", "NewsArticle", "ReportageNewsArticle", "AnalysisNewsArticle", "OpinionNewsArticle",
+    "BackgroundNewsArticle", "ReviewNewsArticle", "LiveBlogPosting", "BlogPosting", "WebPage",
+}
+_MICRODATA_URL_ATTRIBUTES = {
+    "a": "href", "area": "href", "link": "href", "img": "src", "audio": "src", "video": "src",
+    "source": "src", "iframe": "src", "embed": "src", "track": "src", "object": "data",
+}
+_extractions = weakref.WeakKeyDictionary()
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise Exception("raw_response mode 'zstd' needs the zstandard package") from None
+    return zstandard
+
+
+def compact_raw_response(record: dict, mode: str, blob_dir: str = "raw_blobs") -> dict:
+    """Shrink the raw page HTML of an article record
+
+    Args:
+        record (dict): article data with a "raw_response" dict
+        mode (str): one of RAW_RESPONSE_MODES\n
+            full:- keep the content as it is\n
+            omit:- drop the content, only "content_type" is kept\n
+            gzip / zstd:- compressed then base64 encoded content, "content_encoding"\n
+            is set to "gzip+base64" / "zstd+base64"\n
+            blob:- the gzip compressed content is written to `blob_dir` under its sha256\n
+            and replaced by "content_ref": "sha256:<hex>"
+        blob_dir (str, optional): directory of the blob files. Defaults to "raw_blobs".
+
+    Raises:
+        Exception: Raised exception for unknown mode
+
+    Returns:
+        dict: the record, with a new "raw_response" dict when it was changed
+    """
+    if mode not in RAW_RESPONSE_MODES:
+        raise Exception(f"Invalid raw_response mode: {mode}")
+    raw_response = record.get("raw_response")
+    if mode == "full" or not isinstance(raw_response, dict) or "content" not in raw_response:
+        return record
+
+    content = raw_response["content"]
+    if isinstance(content, list):
+        content = "".join(content)
+    raw_response = {key: value for key, value in raw_response.items() if key != "content"}
+    data = content.encode("utf-8")
+
+    if mode == "gzip":
+        raw_response["content_encoding"] = "gzip+base64"
+        raw_response["content"] = base64.b64encode(gzip.compress(data)).decode("ascii")
+    elif mode == "zstd":
+        raw_response["content_encoding"] = "zstd+base64"
+        compressed = _zstd().ZstdCompressor().compress(data)
+        raw_response["content"] = base64.b64encode(compressed).decode("ascii")
+    elif mode == "blob":
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(blob_dir, digest[:2], digest + ".gz")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write then rename, so a reader never sees a partial blob
+            with open(path + ".tmp", "wb") as f:
+                f.write(gzip.compress(data))
+            os.replace(path + ".tmp", path)
+        raw_response["content_ref"] = "sha256:" + digest
+    return {**record, "raw_response": raw_response}
+
+
+def load_raw_content(raw_response: dict, blob_dir: str = "raw_blobs"):
+    """Return the page HTML of a raw_response written by compact_raw_response
+
+    Args:
+        raw_response (dict): "raw_response" of an article record
+        blob_dir (str, optional): directory of the blob files. Defaults to "raw_blobs".
+
+    Returns:
+        str | None: the HTML, None when it was omitted
+    """
+    if "content_ref" in raw_response:
+        digest = raw_response["content_ref"].split(":", 1)[1]
+        with open(os.path.join(blob_dir, digest[:2], digest + ".gz"), "rb") as f:
+            return gzip.decompress(f.read()).decode("utf-8")
+    content = raw_response.get("content")
+    encoding = raw_response.get("content_encoding")
+    if encoding == "gzip+base64":
+        return gzip.decompress(base64.b64decode(content)).decode("utf-8")
+    if encoding == "zstd+base64":
+        return _zstd().ZstdDecompressor().decompress(base64.b64decode(content)).decode("utf-8")
+    return content
+
+
+def _load_json_ld(text: str) -> list:
+    text = (text or "").strip()
+    if text.startswith("<!--"):
+        text = text[4:].rsplit("-->", 1)[0]
+    try:
+        data = json.loads(text, strict=False)
+    except ValueError:
+        return []
+    objects = []
+    for value in data if isinstance(data, list) else [data]:
+        if not isinstance(value, dict):
+            continue
+        if "@graph" in value and isinstance(value["@graph"], list):
+            objects.extend(item for item in value["@graph"] if isinstance(item, dict))
+        else:
+            objects.append(value)
+    return objects
+
+
+def _microdata_value(element):
+    if "itemscope" in element.attrib:
+        return {"@type": element.get("itemtype", "").rstrip("/").rsplit("/", 1)[-1]}
+    if element.tag == "meta":
+        return element.get("content")
+    if element.tag in _MICRODATA_URL_ATTRIBUTES:
+        return element.get(_MICRODATA_URL_ATTRIBUTES[element.tag])
+    if element.tag == "time" and element.get("datetime"):
+        return element.get("datetime")
+    if element.tag in ("data", "meter"):
+        return element.get("value")
+    return " ".join(element.text_content().split())
+
+
+def extract_metadata(response) -> dict:
+    """Collect the structured data of a page in one traversal of its tree
+
+    The lxml tree already parsed by `response.selector` is reused, and the
+    result is cached for the lifetime of the response, so every field mapper
+    reads from the same extraction instead of querying the document again.
+
+    Args:
+        response (TextResponse): article page
+
+    Returns:
+        dict: with the keys\n
+            json_ld:- list of every ld+json object, "@graph" lists flattened\n
+            meta:- {name: [contents]} of the meta tags by property, name or itemprop,
+            lowercased, plus "canonical"\n
+            microdata:- list of the top level itemscope items, nested items as values\n
+            title:- text of the <title> tag\n
+            lang:- lang attribute of the <html> tag
+    """
+    try:
+        return _extractions[response]
+    except KeyError:
+        pass
+
+    root = response.selector.root
+    result = {"json_ld": [], "meta": {}, "microdata": [], "title": None, "lang": root.get("lang")}
+    items = {}
+    for element in root.iter():
+        tag = element.tag
+        if not isinstance(tag, str):
+            # comments and processing instructions
+            continue
+        attrib = element.attrib
+        if tag == "script":
+            if attrib.get("type", "").strip().lower() == "application/ld+json":
+                result["json_ld"].extend(_load_json_ld(element.text))
+            continue
+        if tag == "meta":
+            key = attrib.get("property") or attrib.get("name") or attrib.get("itemprop")
+            if key and attrib.get("content") is not None:
+                result["meta"].setdefault(key.lower(), []).append(attrib["content"].strip())
+        elif tag == "link" and attrib.get("rel", "").lower() == "canonical" and attrib.get("href"):
+            result["meta"].setdefault("canonical", []).append(attrib["href"])
+        elif tag == "title" and result["title"] is None:
+            result["title"] = " ".join(element.text_content().split())
+
+        if "itemscope" not in attrib and "itemprop" not in attrib:
+            continue
+        value = _microdata_value(element)
+        if "itemscope" in attrib:
+            items[element] = value
+        if "itemprop" not in attrib:
+            result["microdata"].append(value)
+            continue
+        # the nearest itemscope ancestor owns the property
+        parent = element.getparent()
+        while parent is not None and parent not in items:
+            parent = parent.getparent()
+        if parent is None:
+            continue
+        for name in attrib["itemprop"].split():
+            existing = items[parent].get(name)
+            if existing is None:
+                items[parent][name] = value
+            elif isinstance(existing, list):
+                existing.append(value)
+            else:
+                items[parent][name] = [existing, value]
+
+    _extractions[response] = result
+    return result
+
+
+def _types(value: dict) -> set:
+    types = value.get("@type") or []
+    return set(types if isinstance(types, list) else [types])
+
+
+def _as_list(value) -> list:
+    if value is None or value == "":
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def get_parsed_json(response) -> dict:
+    """Build the "parsed_json" block of an article from extract_metadata
+
+    Returns:
+        dict: "main" the first article ld+json object, "imageObjects" / "videoObjects"
+        the ImageObject / VideoObject ones, "misc" the other ld+json objects
+        and "other" the microdata items. Empty blocks are left out.
+    """
+    metadata = extract_metadata(response)
+    parsed_json = {"main": None, "imageObjects": [], "videoObjects": [], "misc": [], "other": []}
+    for value in metadata["json_ld"]:
+        types = _types(value)
+        if parsed_json["main"] is None and types & ARTICLE_TYPES - {"WebPage"}:
+            parsed_json["main"] = value
+        elif "ImageObject" in types:
+            parsed_json["imageObjects"].append(value)
+        elif "VideoObject" in types:
+            parsed_json["videoObjects"].append(value)
+        else:
+            parsed_json["misc"].append(value)
+    parsed_json["other"] = metadata["microdata"]
+    return {key: value for key, value in parsed_json.items() if value}
+
+
+def _main_object(metadata: dict) -> dict:
+    for value in metadata["json_ld"]:
+        if _types(value) & ARTICLE_TYPES - {"WebPage"}:
+            return value
+    for value in metadata["microdata"]:
+        if _types(value) & ARTICLE_TYPES:
+            return value
+    return {}
+
+
+def _first(*values) -> list:
+    for value in values:
+        value = [item for item in _as_list(value) if item not in (None, "")]
+        if value:
+            return value
+    return []
+
+
+def _entities(values, default_type: str) -> list:
+    entities = []
+    for value in _as_list(values):
+        if isinstance(value, str):
+            value = {"@type": default_type, "name": value}
+        if isinstance(value, dict) and value.get("name"):
+            entities.append({"@type": default_type, **value})
+    return entities
+
+
+def _image_link(value):
+    if isinstance(value, dict):
+        return value.get("url") or value.get("contentUrl") or value.get("@id")
+    return value
+
+
+def map_title(metadata: dict, main: dict) -> list:
+    return _first(main.get("headline"), metadata["meta"].get("og:title"), metadata["title"])
+
+
+def map_description(metadata: dict, main: dict) -> list:
+    return _first(main.get("description"), metadata["meta"].get("og:description"),
+                  metadata["meta"].get("description"))
+
+
+def map_author(metadata: dict, main: dict) -> list:
+    return _entities(_first(main.get("author"), metadata["meta"].get("author")), "Person")
+
+
+def map_publisher(metadata: dict, main: dict) -> list:
+    return _entities(_first(main.get("publisher"), metadata["meta"].get("og:site_name")), "Organization")
+
+
+def map_published_at(metadata: dict, main: dict) -> list:
+    return _first(main.get("datePublished"), metadata["meta"].get("article:published_time"))[:1]
+
+
+def map_modified_at(metadata: dict, main: dict) -> list:
+    return _first(main.get("dateModified"), metadata["meta"].get("article:modified_time"))[:1]
+
+
+def map_section(metadata: dict, main: dict) -> list:
+    return _first(main.get("articleSection"), metadata["meta"].get("article:section"))
+
+
+def map_tags(metadata: dict, main: dict) -> list:
+    keywords = _first(main.get("keywords"), metadata["meta"].get("article:tag"),
+                      metadata["meta"].get("news_keywords"), metadata["meta"].get("keywords"))
+    # JSON-LD keywords can be DefinedTerm objects or numbers
+    keywords = [str(keyword.get("name") or "") if isinstance(keyword, dict) else str(keyword) for keyword in keywords]
+    if len(keywords) == 1 and "," in keywords[0]:
+        keywords = keywords[0].split(",")
+    return [keyword.strip() for keyword in keywords if keyword.strip()]
+
+
+def map_thumbnail_image(metadata: dict, main: dict) -> list:
+    images = [_image_link(image) for image in _as_list(main.get("image")) or _as_list(main.get("thumbnailUrl"))]
+    return _first(images, metadata["meta"].get("og:image"))[:1]
+
+
+def map_images(metadata: dict, main: dict) -> list:
+    images = [image for image in _as_list(main.get("image")) if isinstance(image, dict)]
+    images += [value for value in metadata["json_ld"] if "ImageObject" in _types(value)]
+    return [
+        {"link": _image_link(image), "caption": image.get("caption") or image.get("description") or ""}
+        for image in images if _image_link(image)
+    ]
+
+
+def map_embed_video_link(metadata: dict, main: dict) -> list:
+    videos = [value for value in metadata["json_ld"] if "VideoObject" in _types(value)]
+    videos += [video for video in _as_list(main.get("video")) if isinstance(video, dict)]
+    links = [video.get("contentUrl") or video.get("embedUrl") for video in videos]
+    return _first(links, metadata["meta"].get("og:video:url"), metadata["meta"].get("og:video"))
+
+
+PARSED_DATA_MAPPERS = {
+    "title": map_title,
+    "description": map_description,
+    "author": map_author,
+    "publisher": map_publisher,
+    "published_at": map_published_at,
+    "modified_at": map_modified_at,
+    "section": map_section,
+    "tags": map_tags,
+    "thumbnail_image": map_thumbnail_image,
+    "images": map_images,
+    "embed_video_link": map_embed_video_link,
+}
+
+
+def get_parsed_data(response, mappers: dict = None) -> dict:
+    """Build the "parsed_data" fields of an article from extract_metadata
+
+    Every mapper receives the cached extraction and the main article object
+    (ld+json, else microdata) and returns the list of values of its field,
+    so no mapper queries the document itself.
+
+    Args:
+        response (TextResponse): article page
+        mappers (dict, optional): {field: mapper}, to override or add fields. Defaults to PARSED_DATA_MAPPERS.
+
+    Returns:
+        dict: {field: list of values}, fields without value are left out
+    """
+    metadata = extract_metadata(response)
+    main = _main_object(metadata)
+    parsed_data = {}
+    for field, mapper in {**PARSED_DATA_MAPPERS, **(mappers or {})}.items():
+        values = mapper(metadata, main)
+        if values:
+            parsed_data[field] = values
+    return parsed_data
@@ -6,6 +6,13 @@ setup(
     version='0.1',
     packages=find_packages(),
     install_requires=[
-        'scrapy',
+        # async start(), IgnoreRequest from request_scheduled (circuit breaker)
+        'scrapy>=2.13',
     ],
+    extras_require={
+        # raw_response="zstd"
+        'zstd': ['zstandard'],
+        # export.export_articles, sink="parquet:..." / "arrow:..."
+        'parquet': ['pyarrow'],
+    },
 )